@@ -0,0 +1,45 @@
+-- Offline batch API (/v1/batches)
+
+CREATE TABLE IF NOT EXISTS batches (
+  id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL,
+  endpoint TEXT NOT NULL,
+
+  -- in_progress | completed | cancelled
+  status TEXT NOT NULL,
+
+  total INT NOT NULL DEFAULT 0,
+  completed INT NOT NULL DEFAULT 0,
+  failed INT NOT NULL DEFAULT 0,
+
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  completed_at TIMESTAMPTZ,
+  cancelled_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS batch_jobs (
+  batch_id TEXT NOT NULL REFERENCES batches (id) ON DELETE CASCADE,
+  line_no INT NOT NULL,
+  custom_id TEXT,
+
+  -- pending | running | completed | failed | cancelled
+  status TEXT NOT NULL DEFAULT 'pending',
+  attempts INT NOT NULL DEFAULT 0,
+
+  request_json JSONB NOT NULL,
+  response_json JSONB,
+  error_json JSONB,
+  status_code INT,
+  request_id TEXT,
+
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (batch_id, line_no)
+);
+
+-- the runner only ever scans for claimable work
+CREATE INDEX IF NOT EXISTS idx_batch_jobs_pending
+  ON batch_jobs (batch_id, line_no)
+  WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_batches_tenant_created
+  ON batches (tenant_id, created_at DESC);
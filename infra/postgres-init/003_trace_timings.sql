@@ -0,0 +1,4 @@
+-- Per-request stage timings (policy, normalize, plan, exact_lookup, embed, semantic_lookup,
+-- admission, queue, backend, cache_fill, total). Same values as the Server-Timing header;
+-- trace_write itself is only visible in the header.
+ALTER TABLE request_traces ADD COLUMN IF NOT EXISTS timings_json JSONB;
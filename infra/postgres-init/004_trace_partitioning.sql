@@ -0,0 +1,186 @@
+-- Time-partitioned request_traces + minute rollups.
+--
+-- request_traces becomes RANGE partitioned on created_at. Partitions are named
+-- request_traces_pYYYYMMDD (daily) or request_traces_pYYYYMMDDHH (hourly); the relay creates
+-- them ahead of time and drops whole partitions past retention (no DELETE, no vacuum debt).
+-- Legacy rows are moved into daily partitions; the relay fills the rest of a day it shares
+-- with them with hourly partitions when it runs hourly (app/db/trace_partitions.py).
+-- Postgres requires the partition key in every unique constraint, so the primary key is
+-- (id, created_at) and request_id is indexed but no longer globally UNIQUE.
+
+CREATE OR REPLACE FUNCTION relay_create_trace_partition(p_start TIMESTAMPTZ, p_step INTERVAL)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  fmt  TEXT := CASE WHEN p_step < INTERVAL '1 day' THEN 'YYYYMMDDHH24' ELSE 'YYYYMMDD' END;
+  name TEXT := 'request_traces_p' || to_char(p_start AT TIME ZONE 'UTC', fmt);
+BEGIN
+  EXECUTE format(
+    'CREATE TABLE IF NOT EXISTS %I PARTITION OF request_traces FOR VALUES FROM (%L) TO (%L)',
+    name, p_start, p_start + p_step
+  );
+  RETURN name;
+END;
+$$;
+
+DO $$
+DECLARE
+  d DATE;
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM pg_partitioned_table pt
+    JOIN pg_class c ON c.oid = pt.partrelid
+    WHERE c.relname = 'request_traces'
+  ) THEN
+    RETURN;
+  END IF;
+
+  IF to_regclass('request_traces') IS NOT NULL THEN
+    ALTER TABLE request_traces RENAME TO request_traces_legacy;
+    ALTER INDEX IF EXISTS idx_request_traces_created_at RENAME TO idx_request_traces_legacy_created_at;
+    ALTER INDEX IF EXISTS idx_request_traces_tenant_id RENAME TO idx_request_traces_legacy_tenant_id;
+    ALTER INDEX IF EXISTS idx_request_traces_request_hash RENAME TO idx_request_traces_legacy_request_hash;
+  END IF;
+
+  CREATE TABLE request_traces (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    request_id TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    endpoint TEXT NOT NULL,
+    model TEXT,
+    status_code INT,
+
+    request_hash TEXT,
+
+    -- scheduler lane (NULL for cache hits) and exact_hit | semantic_hit | miss | rejected | queue_full
+    lane TEXT,
+    cache_outcome TEXT,
+
+    latency_ms INT,
+    backend_latency_ms INT,
+    queue_wait_ms INT,
+    backend_ttft_ms INT,
+
+    prompt_tokens INT,
+    completion_tokens INT,
+    total_tokens INT,
+
+    -- payloads are subject to the tenant's payload_capture mode (always | sampled | errors_only | hash_only)
+    payload_capture TEXT,
+    request_json JSONB,
+    response_json JSONB,
+    response_hash TEXT,
+    error_json JSONB,
+
+    policy_version TEXT,
+    plan_json JSONB,
+    decision_trace_json JSONB,
+    cache_json JSONB,
+    timings_json JSONB,
+
+    PRIMARY KEY (id, created_at)
+  ) PARTITION BY RANGE (created_at);
+
+  -- safety net so inserts never fail if maintenance falls behind
+  CREATE TABLE request_traces_default PARTITION OF request_traces DEFAULT;
+
+  -- the admin trace browser pages with a keyset on (created_at, request_id) DESC, optionally
+  -- scoped to a tenant: one B-tree per access path. The global one also serves time-range
+  -- scans, so these three are all the secondary indexes an insert maintains.
+  CREATE INDEX idx_request_traces_keyset ON request_traces (created_at DESC, request_id DESC);
+  CREATE INDEX idx_request_traces_tenant_keyset ON request_traces (tenant_id, created_at DESC, request_id DESC);
+  CREATE INDEX idx_request_traces_request_id ON request_traces (request_id);
+
+  IF to_regclass('request_traces_legacy') IS NOT NULL THEN
+    FOR d IN SELECT DISTINCT (created_at AT TIME ZONE 'UTC')::date FROM request_traces_legacy LOOP
+      PERFORM relay_create_trace_partition((d::timestamp AT TIME ZONE 'UTC'), INTERVAL '1 day');
+    END LOOP;
+
+    INSERT INTO request_traces (
+      id, request_id, tenant_id, created_at, endpoint, model, status_code, request_hash,
+      latency_ms, backend_latency_ms, queue_wait_ms, backend_ttft_ms,
+      prompt_tokens, completion_tokens, total_tokens,
+      payload_capture, request_json, response_json, error_json,
+      policy_version, plan_json, decision_trace_json, cache_json, timings_json
+    )
+    SELECT
+      id, request_id, tenant_id, created_at, endpoint, model, status_code, request_hash,
+      latency_ms, backend_latency_ms, queue_wait_ms, backend_ttft_ms,
+      prompt_tokens, completion_tokens, total_tokens,
+      'always', request_json, response_json, error_json,
+      policy_version, plan_json, decision_trace_json, cache_json, timings_json
+    FROM request_traces_legacy;
+
+    DROP TABLE request_traces_legacy;
+  END IF;
+  -- current and future partitions come from the relay at startup, at TRACE_PARTITION_GRANULARITY;
+  -- rows inserted before that wait in the default partition and are moved out then
+END;
+$$;
+
+
+-- Minute rollups per tenant / lane / cache outcome.
+-- latency_hist holds counts per latency bucket; the bounds below must match
+-- LATENCY_BUCKETS_MS in app/core/rollups.py (last bucket = +inf).
+
+CREATE OR REPLACE FUNCTION relay_hist_add(a BIGINT[], b BIGINT[])
+RETURNS BIGINT[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT array_agg(COALESCE(x, 0) + COALESCE(y, 0) ORDER BY i)
+  FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i)
+$$;
+
+CREATE OR REPLACE FUNCTION relay_hist_quantile(hist BIGINT[], q DOUBLE PRECISION)
+RETURNS INT
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+  bounds INT[] := ARRAY[5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000];
+  total BIGINT := 0;
+  seen BIGINT := 0;
+  i INT;
+BEGIN
+  SELECT COALESCE(sum(x), 0) INTO total FROM unnest(hist) AS x;
+  IF total = 0 THEN
+    RETURN NULL;
+  END IF;
+  FOR i IN 1 .. array_length(hist, 1) LOOP
+    seen := seen + hist[i];
+    IF seen >= q * total THEN
+      RETURN CASE WHEN i <= array_length(bounds, 1) THEN bounds[i] ELSE NULL END;
+    END IF;
+  END LOOP;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS request_trace_rollups_1m (
+  bucket_start TIMESTAMPTZ NOT NULL,
+  tenant_id TEXT NOT NULL,
+  lane TEXT NOT NULL,
+  cache_outcome TEXT NOT NULL,
+
+  requests BIGINT NOT NULL DEFAULT 0,
+  errors BIGINT NOT NULL DEFAULT 0,
+  degraded BIGINT NOT NULL DEFAULT 0,
+  prompt_tokens BIGINT NOT NULL DEFAULT 0,
+  completion_tokens BIGINT NOT NULL DEFAULT 0,
+  latency_sum_ms BIGINT NOT NULL DEFAULT 0,
+  latency_hist BIGINT[] NOT NULL,
+
+  -- bucket upper bounds (NULL = above the last bound)
+  latency_p50_ms INT GENERATED ALWAYS AS (relay_hist_quantile(latency_hist, 0.50)) STORED,
+  latency_p95_ms INT GENERATED ALWAYS AS (relay_hist_quantile(latency_hist, 0.95)) STORED,
+  latency_p99_ms INT GENERATED ALWAYS AS (relay_hist_quantile(latency_hist, 0.99)) STORED,
+
+  PRIMARY KEY (bucket_start, tenant_id, lane, cache_outcome)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rollups_tenant_bucket
+  ON request_trace_rollups_1m (tenant_id, bucket_start DESC);
@@ -0,0 +1,7 @@
+-- Rollup summaries for the admin dashboard.
+
+-- Merge latency histograms across rollup rows: SELECT relay_hist_sum(latency_hist) ...
+CREATE OR REPLACE AGGREGATE relay_hist_sum(BIGINT[]) (
+  SFUNC = relay_hist_add,
+  STYPE = BIGINT[]
+);
@@ -1,17 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import threading
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
 from html import escape
-from typing import Any
+from typing import Any, Optional
+from urllib.parse import urlencode
 
 import orjson
-from fastapi import APIRouter, Query
-from fastapi.responses import HTMLResponse, Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 
-from app.db.traces_read import get_trace, list_traces
+from app.core.profiler import render_collapsed, sample_stacks
+from app.core.rollups import summarize
+from app.core.runtime import get_backend_pool_or_none, get_body_codec, get_cache_admission, get_cache_warmer, get_loop_monitor
+from app.core.settings import settings
+from app.db.trace_export import ExportQuery, stream_csv, stream_ndjson, stream_parquet
+from app.db.trace_rollups import rollup_totals
+from app.db.traces_read import TraceFilters, get_trace, list_traces
 
 admin = APIRouter(prefix="/admin", tags=["admin"])
 
+_profile_lock = asyncio.Lock()
+
 
 def _pretty_json(val: Any) -> str:
     try:
@@ -33,66 +46,162 @@ def _pretty_json(val: Any) -> str:
         return str(val)
 
 
+_PAGE_STYLE = (
+    "<style>body{font-family:ui-sans-serif,system-ui; padding:16px;} "
+    "table{border-collapse:collapse; width:100%;} "
+    "th,td{border:1px solid #ddd; padding:8px; font-size:14px;} "
+    "th{background:#f6f6f6; text-align:left;} "
+    "code{font-family:ui-monospace,Menlo,monospace; font-size:12px;} "
+    "form input{width:110px;} "
+    "</style>"
+)
+
+
+def _trace_filters(
+    tenant_id: Optional[str] = Query(default=None),
+    status_code: Optional[int] = Query(default=None),
+    lane: Optional[str] = Query(default=None),
+    cache_outcome: Optional[str] = Query(default=None),
+    policy_version: Optional[str] = Query(default=None),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+) -> TraceFilters:
+    return TraceFilters(
+        tenant_id=tenant_id or None,
+        status_code=status_code,
+        lane=lane or None,
+        cache_outcome=cache_outcome or None,
+        policy_version=policy_version or None,
+        since=since,
+        until=until,
+    )
+
+
+async def _page(limit: int, filters: TraceFilters, cursor: Optional[str]) -> tuple[list[dict[str, Any]], Optional[str]]:
+    try:
+        return await list_traces(limit=limit, filters=filters, cursor=cursor)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
 @admin.get("/traces", response_class=HTMLResponse)
-async def traces_page(limit: int = Query(default=50, ge=1, le=500)) -> HTMLResponse:
-    rows = await list_traces(limit=limit)
+async def traces_page(
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None),
+    filters: TraceFilters = Depends(_trace_filters),
+) -> HTMLResponse:
+    rows, next_cursor = await _page(limit, filters, cursor)
+    active = {k: v for k, v in asdict(filters).items() if v is not None}
 
-    # Minimal HTML (fast, readable)
-    parts = [
-        "<html><head><title>Relay Traces</title>"
-        "<style>body{font-family:ui-sans-serif,system-ui; padding:16px;} "
-        "table{border-collapse:collapse; width:100%;} "
-        "th,td{border:1px solid #ddd; padding:8px; font-size:14px;} "
-        "th{background:#f6f6f6; text-align:left;} "
-        "code{font-family:ui-monospace,Menlo,monospace; font-size:12px;} "
-        "</style></head><body>"
-    ]
+    # Minimal HTML (fast, readable): one row per trace, details live on the trace page
+    parts = ["<html><head><title>Relay Traces</title>", _PAGE_STYLE, "</head><body>"]
     parts.append(f"<h2>Recent Traces (limit={limit})</h2>")
-    parts.append("<p>Tip: open a trace to see routing, cache provenance, scheduler lane, and timings.</p>")
+    parts.append("<p>Tip: open a trace to see routing, cache provenance, scheduler lane, and timings. "
+                 "Summaries: <a href='/admin/dashboard'>/admin/dashboard</a></p>")
+
+    parts.append("<form method='get' action='/admin/traces'>")
+    for name in ("tenant_id", "status_code", "lane", "cache_outcome", "policy_version", "since", "until"):
+        val = escape(str(active.get(name, "")))
+        parts.append(f"<input name='{name}' placeholder='{name}' value='{val}'> ")
+    parts.append(f"<input type='hidden' name='limit' value='{limit}'><button>Filter</button></form>")
+
     parts.append("<table>")
     parts.append(
-        "<tr><th>created_at</th><th>request_id</th><th>tenant</th><th>status</th>"
-        "<th>latency_ms</th><th>queue_wait_ms</th><th>backend_ms</th><th>cache</th><th>plan</th></tr>"
+        "<tr><th>created_at</th><th>request_id</th><th>tenant</th><th>status</th><th>lane</th>"
+        "<th>cache</th><th>latency_ms</th><th>queue_wait_ms</th><th>backend_ms</th><th>policy</th></tr>"
     )
 
     for r in rows:
         rid = escape(str(r["request_id"]))
-        created_at = escape(str(r["created_at"]))
-        tenant = escape(str(r["tenant_id"]))
-        status = escape(str(r["status_code"]))
-        lat = escape(str(r["latency_ms"]))
-        qwait = escape(str(r.get("queue_wait_ms")))
-        bms = escape(str(r.get("backend_latency_ms")))
-
-        cache = _pretty_json(r.get("cache_json"))
-        plan = _pretty_json(r.get("plan_json"))
-        cache_short = escape(cache[:120] + ("..." if len(cache) > 120 else ""))
-        plan_short = escape(plan[:120] + ("..." if len(plan) > 120 else ""))
-
-        parts.append(
-            "<tr>"
-            f"<td>{created_at}</td>"
-            f"<td><a href='/admin/traces/{rid}'>{rid}</a></td>"
-            f"<td>{tenant}</td>"
-            f"<td>{status}</td>"
-            f"<td>{lat}</td>"
-            f"<td>{qwait}</td>"
-            f"<td>{bms}</td>"
-            f"<td><code>{cache_short}</code></td>"
-            f"<td><code>{plan_short}</code></td>"
-            "</tr>"
-        )
+        cells = [
+            escape(str(r["created_at"])),
+            f"<a href='/admin/traces/{rid}'>{rid}</a>",
+            escape(str(r["tenant_id"])),
+            escape(str(r["status_code"])),
+            escape(str(r.get("lane"))),
+            escape(str(r.get("cache_outcome"))),
+            escape(str(r["latency_ms"])),
+            escape(str(r.get("queue_wait_ms"))),
+            escape(str(r.get("backend_latency_ms"))),
+            escape(str(r.get("policy_version"))),
+        ]
+        parts.append("<tr>" + "".join(f"<td>{c}</td>" for c in cells) + "</tr>")
 
     parts.append("</table>")
-    parts.append("<p>JSON endpoints: <code>/admin/traces.json</code>, <code>/admin/traces/{request_id}.json</code></p>")
+    if next_cursor:
+        qs = urlencode({**{k: str(v) for k, v in active.items()}, "limit": limit, "cursor": next_cursor})
+        parts.append(f"<p><a href='/admin/traces?{escape(qs)}'>Older &rarr;</a></p>")
+    parts.append("<p>JSON endpoints: <code>/admin/traces.json</code>, <code>/admin/traces/{request_id}.json</code>, "
+                 "<code>/admin/summary.json</code></p>")
     parts.append("</body></html>")
     return HTMLResponse("".join(parts))
 
 
 @admin.get("/traces.json")
-async def traces_json(limit: int = Query(default=50, ge=1, le=500)) -> Response:
-    rows = await list_traces(limit=limit)
-    return Response(content=orjson.dumps(rows), media_type="application/json")
+async def traces_json(
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None),
+    filters: TraceFilters = Depends(_trace_filters),
+) -> Response:
+    """A list of traces, newest first; the cursor for the next page, if any, is in X-Next-Cursor."""
+    rows, next_cursor = await _page(limit, filters, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=orjson.dumps(rows), media_type="application/json", headers=headers)
+
+
+async def _summary(window_minutes: int, tenant_id: Optional[str]) -> dict[str, Any]:
+    since = datetime.now(timezone.utc) - timedelta(minutes=window_minutes)
+    rows = await rollup_totals(since=since, tenant_id=tenant_id)
+    return {"window_minutes": window_minutes, "since": since, "tenants": summarize(rows)}
+
+
+@admin.get("/summary.json")
+async def summary_json(
+    window_minutes: int = Query(default=60, ge=1, le=60 * 24 * 31),
+    tenant_id: Optional[str] = Query(default=None),
+) -> Response:
+    """Per-tenant latency quantiles, hit rates and admission outcomes from the minute rollups."""
+    return Response(content=orjson.dumps(await _summary(window_minutes, tenant_id)), media_type="application/json")
+
+
+@admin.get("/dashboard", response_class=HTMLResponse)
+async def dashboard_page(window_minutes: int = Query(default=60, ge=1, le=60 * 24 * 31)) -> HTMLResponse:
+    summary = await _summary(window_minutes, None)
+    parts = ["<html><head><title>Relay Dashboard</title>", _PAGE_STYLE, "</head><body>"]
+    parts.append(f"<h2>Last {window_minutes} minutes</h2>")
+    parts.append("<p>Windows: " + " ".join(
+        f"<a href='/admin/dashboard?window_minutes={m}'>{label}</a>"
+        for m, label in ((15, "15m"), (60, "1h"), (360, "6h"), (1440, "24h"))
+    ) + " &middot; <a href='/admin/traces'>traces</a></p>")
+    parts.append("<table>")
+    parts.append(
+        "<tr><th>tenant</th><th>requests</th><th>errors</th><th>p50_ms</th><th>p95_ms</th><th>p99_ms</th>"
+        "<th>exact_hit</th><th>semantic_hit</th><th>overload_hit</th><th>degraded</th><th>rejected</th><th>queue_full</th><th>backend_error</th>"
+        "<th>prompt_tokens</th><th>completion_tokens</th></tr>"
+    )
+    for tenant, t in sorted(summary["tenants"].items()):
+        cells = [
+            f"<a href='/admin/traces?tenant_id={escape(tenant)}'>{escape(tenant)}</a>",
+            t["requests"],
+            t["errors"],
+            t["latency_ms"]["p50"],
+            t["latency_ms"]["p95"],
+            t["latency_ms"]["p99"],
+            f"{t['exact_hit_rate']:.1%}",
+            f"{t['semantic_hit_rate']:.1%}",
+            t["admission"]["served_from_cache"],
+            t["admission"]["degraded"],
+            t["admission"]["rejected"],
+            t["admission"]["queue_full"],
+            t["admission"]["backend_error"],
+            t["prompt_tokens"],
+            t["completion_tokens"],
+        ]
+        parts.append("<tr>" + "".join(f"<td>{c}</td>" for c in cells) + "</tr>")
+    parts.append("</table>")
+    parts.append("<p>Latency quantiles are histogram bucket upper bounds (None = above the last bucket).</p>")
+    parts.append("</body></html>")
+    return HTMLResponse("".join(parts))
 
 
 @admin.get("/traces/{request_id}", response_class=HTMLResponse)
@@ -120,7 +229,7 @@ async def trace_detail_page(request_id: str) -> HTMLResponse:
 
     # Header summary
     parts.append("<ul>")
-    for k in ["created_at", "tenant_id", "endpoint", "model", "status_code", "latency_ms", "queue_wait_ms", "backend_latency_ms"]:
+    for k in ["created_at", "tenant_id", "endpoint", "model", "status_code", "lane", "cache_outcome", "latency_ms", "queue_wait_ms", "backend_latency_ms"]:
         parts.append(f"<li><b>{escape(k)}</b>: {escape(str(row.get(k)))}</li>")
     parts.append("</ul>")
 
@@ -128,6 +237,7 @@ async def trace_detail_page(request_id: str) -> HTMLResponse:
     parts.append(block("Plan (plan_json)", row.get("plan_json")))
     parts.append(block("Decision Trace (decision_trace_json)", row.get("decision_trace_json")))
     parts.append(block("Cache Provenance (cache_json)", row.get("cache_json")))
+    parts.append(block("Stage Timings ms (timings_json)", row.get("timings_json")))
 
     parts.append(block("Request (request_json)", row.get("request_json")))
     parts.append(block("Response (response_json)", row.get("response_json")))
@@ -144,3 +254,109 @@ async def trace_detail_json(request_id: str) -> Response:
     if not row:
         return Response(content=orjson.dumps({"error": "not_found"}), media_type="application/json", status_code=404)
     return Response(content=orjson.dumps(row), media_type="application/json")
+
+
+@admin.get("/loop.json")
+async def loop_lag_json() -> Response:
+    monitor = get_loop_monitor()
+    if monitor is None:
+        return Response(content=orjson.dumps({"enabled": False}), media_type="application/json")
+    return Response(content=orjson.dumps({"enabled": True, **monitor.snapshot()}), media_type="application/json")
+
+
+@admin.get("/backends.json")
+async def backends_json() -> Response:
+    pool = get_backend_pool_or_none()
+    if pool is None:
+        return Response(content=orjson.dumps({"mode": settings.backend_mode}), media_type="application/json")
+    return Response(content=orjson.dumps({"mode": settings.backend_mode, **pool.snapshot()}), media_type="application/json")
+
+
+@admin.get("/cache_warm.json")
+async def cache_warm_json() -> Response:
+    warmer = get_cache_warmer()
+    if warmer is None:
+        return Response(content=orjson.dumps({"enabled": False}), media_type="application/json")
+    return Response(content=orjson.dumps({"enabled": True, **warmer.snapshot()}), media_type="application/json")
+
+
+@admin.get("/exact_cache.json")
+async def exact_cache_json() -> Response:
+    """Exact-cache storage: body codec and the admission filter's counts (this process)."""
+    gate = get_cache_admission()
+    out = {
+        "codec": get_body_codec().name,
+        "admission": {"enabled": True, **gate.snapshot()} if gate is not None else {"enabled": False},
+    }
+    return Response(content=orjson.dumps(out), media_type="application/json")
+
+
+@admin.post("/cache_warm")
+async def cache_warm_trigger() -> Response:
+    """Start a warm pass now, even if the caches are marked warm for this policy version."""
+    warmer = get_cache_warmer()
+    if warmer is None:
+        raise HTTPException(status_code=404, detail="cache warmer disabled (CACHE_WARM_ENABLED=false)")
+    warmer.trigger()
+    return Response(content=orjson.dumps({"triggered": True, **warmer.snapshot()}), media_type="application/json")
+
+
+@admin.get("/profile")
+async def profile(
+    seconds: float = Query(default=10.0, gt=0),
+    interval_ms: float = Query(default=10.0, ge=1, le=1000),
+    loop_only: bool = Query(default=True, description="only sample the event loop thread"),
+    format: str = Query(default="collapsed", pattern="^(collapsed|json)$"),
+) -> Response:
+    """
+    Time-boxed sampling profile of the running process. `collapsed` output can be fed straight
+    to flamegraph.pl or dropped into speedscope.app to get a flamegraph.
+    """
+    if seconds > settings.profiler_max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {settings.profiler_max_seconds}")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="a profile is already running")
+
+    async with _profile_lock:
+        thread_ids = {threading.get_ident()} if loop_only else None
+        counts = await asyncio.to_thread(
+            sample_stacks, duration_s=seconds, interval_s=interval_ms / 1000.0, thread_ids=thread_ids
+        )
+
+    if format == "json":
+        body = {"seconds": seconds, "interval_ms": interval_ms, "samples": sum(counts.values()), "stacks": dict(counts)}
+        return Response(content=orjson.dumps(body), media_type="application/json")
+    return PlainTextResponse(
+        render_collapsed(counts),
+        headers={"Content-Disposition": "attachment; filename=relay-profile.folded"},
+    )
+
+
+@admin.get("/export/traces")
+async def export_traces(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv|parquet)$"),
+    tenant_id: Optional[str] = Query(default=None),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+    include_payloads: bool = Query(default=False),
+) -> StreamingResponse:
+    """
+    Bulk export of flattened trace columns, streamed straight from a server-side cursor
+    (ndjson, parquet) or COPY TO STDOUT (csv); memory use does not grow with row count.
+    """
+    query = ExportQuery(tenant_id=tenant_id, since=since, until=until, include_payloads=include_payloads)
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="parquet export needs pyarrow (poetry install -E export)")
+        body, media_type = stream_parquet(query), "application/vnd.apache.parquet"
+    elif format == "csv":
+        body, media_type = stream_csv(query), "text/csv"
+    else:
+        body, media_type = stream_ndjson(query), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=request_traces.{format}"},
+    )
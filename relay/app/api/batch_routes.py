@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import uuid
+from typing import Any, AsyncIterator
+
+import orjson
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app.core.logging import get_logger
+from app.db.batches import cancel_batch, create_batch, get_batch, iter_batch_results
+from app.models.openai_batch import BatchInputLine, BatchObject, BatchRequestCounts
+
+batches = APIRouter(prefix="/v1/batches", tags=["batches"])
+log = get_logger(component="batch_api")
+
+SUPPORTED_URL = "/v1/chat/completions"
+MAX_BATCH_LINES = 50_000
+
+
+def _ts(val: Any) -> int | None:
+    return int(val.timestamp()) if val is not None else None
+
+
+def _batch_object(row: dict[str, Any]) -> BatchObject:
+    return BatchObject(
+        id=row["id"],
+        endpoint=row["endpoint"],
+        status=row["status"],
+        tenant_id=row["tenant_id"],
+        request_counts=BatchRequestCounts(
+            total=row["total"], completed=row["completed"], failed=row["failed"]
+        ),
+        created_at=_ts(row["created_at"]) or 0,
+        completed_at=_ts(row.get("completed_at")),
+        cancelled_at=_ts(row.get("cancelled_at")),
+        output_url=f"/v1/batches/{row['id']}/output",
+    )
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buf = b""
+    async for chunk in chunks:
+        *lines, buf = (buf + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    if buf:
+        yield buf
+
+
+async def _parse_jsonl(chunks: AsyncIterator[bytes]) -> list[dict[str, Any]]:
+    """Parses the upload as it streams in, so an oversized batch is refused at the first line past the cap."""
+    jobs: list[dict[str, Any]] = []
+    line_no = -1
+    async for line in _iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        if len(jobs) >= MAX_BATCH_LINES:
+            raise HTTPException(status_code=400, detail=f"batch exceeds {MAX_BATCH_LINES} lines")
+        try:
+            obj = orjson.loads(line)
+            # accept both OpenAI batch lines ({custom_id, method, url, body}) and bare chat requests
+            item = BatchInputLine.model_validate(obj if "body" in obj else {"body": obj})
+        except (orjson.JSONDecodeError, ValidationError, TypeError) as e:
+            raise HTTPException(status_code=400, detail={"line": line_no + 1, "error": str(e)})
+        if item.url != SUPPORTED_URL or item.method.upper() != "POST":
+            raise HTTPException(
+                status_code=400,
+                detail={"line": line_no + 1, "error": f"only POST {SUPPORTED_URL} is supported"},
+            )
+        if item.body.stream:
+            raise HTTPException(status_code=400, detail={"line": line_no + 1, "error": "stream=true is not supported"})
+        jobs.append(
+            {
+                "line_no": line_no,
+                "custom_id": item.custom_id or f"line-{line_no + 1}",
+                "request": item.body.model_dump(),
+            }
+        )
+    return jobs
+
+
+@batches.post("")
+async def create_batch_route(
+    request: Request,
+    x_tenant_id: str = Header(default="default"),
+) -> BatchObject:
+    """Body is a JSONL file: one chat completion request per line."""
+    jobs = await _parse_jsonl(request.stream())
+    if not jobs:
+        raise HTTPException(status_code=400, detail="empty batch")
+
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    await create_batch(batch_id=batch_id, tenant_id=x_tenant_id, endpoint=SUPPORTED_URL, jobs=jobs)
+    log.info("batch_created", batch_id=batch_id, tenant_id=x_tenant_id, total=len(jobs))
+
+    row = await get_batch(batch_id)
+    assert row is not None
+    return _batch_object(row)
+
+
+async def _owned_batch(batch_id: str, tenant_id: str) -> dict[str, Any]:
+    row = await get_batch(batch_id)
+    if row is None or row["tenant_id"] != tenant_id:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return row
+
+
+@batches.get("/{batch_id}")
+async def get_batch_route(batch_id: str, x_tenant_id: str = Header(default="default")) -> BatchObject:
+    return _batch_object(await _owned_batch(batch_id, x_tenant_id))
+
+
+@batches.post("/{batch_id}/cancel")
+async def cancel_batch_route(batch_id: str, x_tenant_id: str = Header(default="default")) -> BatchObject:
+    await _owned_batch(batch_id, x_tenant_id)
+    await cancel_batch(batch_id)
+    return _batch_object(await _owned_batch(batch_id, x_tenant_id))
+
+
+@batches.get("/{batch_id}/output")
+async def batch_output_route(batch_id: str, x_tenant_id: str = Header(default="default")) -> StreamingResponse:
+    """Streams finished results as JSONL (partial while the batch is still in progress)."""
+    await _owned_batch(batch_id, x_tenant_id)
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for r in iter_batch_results(batch_id):
+            out = {
+                "id": f"{batch_id}:{r['line_no']}",
+                "custom_id": r["custom_id"],
+                "response": (
+                    {"status_code": r["status_code"], "request_id": r["request_id"], "body": r["response_json"]}
+                    if r["status"] == "completed"
+                    else None
+                ),
+                "error": r["error_json"] if r["status"] == "failed" else None,
+            }
+            yield orjson.dumps(out) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/jsonl")
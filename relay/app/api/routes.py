@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import hashlib
+import math
 import time
 import uuid
-from typing import Any
+from typing import Any, Awaitable, cast
 
+import numpy as np
+import numpy.typing as npt
 import orjson
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
 
 from app.core.logging import get_logger
 from app.core.settings import settings
@@ -17,144 +21,389 @@ from app.models.openai_chat import (
     ChatMessage,
     Usage,
 )
+from app.utils.cached_response import (
+    RawChatResponse,
+    cacheable_body,
+    decode_entry,
+    encode_entry,
+    render,
+    reusable_for,
+    should_refresh,
+)
 from app.utils.normalize import normalize_messages
-from app.core.ollama_adapter import OllamaAdapter
-from app.core.policy_engine import build_plan
+from app.utils.trace_payload import keep_payloads
+from app.core.cascade import run_cascade
+from app.core.prefix_affinity import prefix_key
+from app.core.context_reuse import (
+    ContextEntry,
+    context_key,
+    conversation_hash,
+    decode_context,
+    encode_context,
+    split_continued_turn,
+)
+from app.core.policy_engine import build_plan, plan_dict, resolve_tier
 
 from app.db.redis_client import get_redis
-from app.utils.cache_keys import exact_cache_key, plan_signature
+from app.utils.cache_keys import cache_signature, exact_cache_key
 
 from app.core.embeddings import embed_text
 from app.db.semantic_cache_pg import semantic_lookup, semantic_store
 
 import asyncio
-from app.core.runtime import get_scheduler
-from app.core.scheduler import QueueFullError
+from app.core.cache_admission import reserve_tenant_bytes
+from app.core.runtime import (
+    get_backend_pool,
+    get_body_codec,
+    get_cache_admission,
+    get_rollups,
+    get_scheduler,
+    get_sim_backend,
+)
+from app.core.scheduler import BATCH_LANE, LANES, AdmissionResult, JobExpiredError, QueueFullError
 from app.core.policy_engine import ExecutionPlan 
-from app.core.backend import GenerationResult
+from app.core.backend import BackendTimeoutError, BackendUnavailableError, GenerationResult
+from app.core.timing import StageTimer
 router = APIRouter()
 log = get_logger(component="api")
 
+# background exact-cache refreshes; referenced here so they are not garbage collected mid-run
+_revalidations: set[asyncio.Task[None]] = set()
+
 
 @router.get("/health")
 async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
-@router.post("/v1/chat/completions")
+@router.post("/v1/chat/completions", response_model=ChatCompletionsResponse)
 async def chat_completions(
     req: ChatCompletionsRequest,
     x_tenant_id: str = Header(default="default"),
-) -> ChatCompletionsResponse:
+) -> Response:
+    timer = StageTimer()
+    try:
+        resp = await run_chat_completion(req, tenant_id=x_tenant_id, timer=timer)
+    except HTTPException as e:
+        e.headers = {**(e.headers or {}), "Server-Timing": timer.server_timing()}
+        raise
+    # body is already JSON; returning a Response skips FastAPI's validate + re-serialize
+    headers = {"Server-Timing": timer.server_timing()}
+    if resp.cache_status is not None:
+        headers["X-Relay-Cache"] = resp.cache_status
+    return Response(content=resp.body, media_type="application/json", headers=headers)
+
+
+# delete the lock only if it still holds our token: once it has expired it may be another's
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+  return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+async def _start_revalidation(req: ChatCompletionsRequest, *, tenant_id: str, key: str, max_tokens: int) -> str:
+    """
+    Regenerate a stale exact-cache entry on the batch lane (idle capacity only), under the budget
+    it was generated under (`max_tokens`), not the hitting request's: the key is shared by every
+    budget, and a refresh cut short at a smaller one would stop serving the larger. A Redis lock per
+    key makes this single-flight across requests and relay processes; it expires by itself if
+    the refresh dies with its process. The batch lane does not drain while interactive work
+    keeps the workers busy, so nothing is queued then, and a queued refresh is dropped if no
+    worker starts it before its lock expires: refreshes never pile up behind a lock that no
+    longer covers them. Returns "started", "in_progress" or "deferred" (no idle capacity; the
+    stale entry keeps serving and a later hit tries again).
+    """
+    if get_scheduler().utilization(LANES) >= 1.0:
+        return "deferred"
+    lock = f"revalidate:{key}"
+    token = uuid.uuid4().hex
+    lock_s = settings.exact_cache_revalidate_lock_s
+    start_by = time.time() + lock_s
+    if not await get_redis().set(lock, token, nx=True, ex=lock_s):
+        return "in_progress"
+
+    async def run() -> None:
+        try:
+            await run_chat_completion(
+                req.model_copy(update={"max_tokens": max_tokens}), tenant_id=tenant_id, endpoint="/internal/revalidate", lane=BATCH_LANE, revalidate=True,
+                start_by=start_by,
+            )
+        except Exception as e:
+            # the stale entry keeps serving until its hard TTL; the next hit past that misses
+            log.warning("exact_revalidate_failed", tenant_id=tenant_id, key=key, error=str(e) or type(e).__name__)
+        finally:
+            # redis-py types eval for both its sync and async clients
+            await cast(Awaitable[int], get_redis().eval(_RELEASE_LOCK, 1, lock, token))
+
+    task = asyncio.create_task(run())
+    _revalidations.add(task)
+    task.add_done_callback(_revalidations.discard)
+    return "started"
+
+
+async def run_chat_completion(
+    req: ChatCompletionsRequest,
+    *,
+    tenant_id: str,
+    endpoint: str = "/v1/chat/completions",
+    lane: str | None = None,
+    timer: StageTimer | None = None,
+    revalidate: bool = False,
+    warm: bool = False,
+    start_by: float | None = None,
+) -> RawChatResponse:
+    """
+    Full relay pipeline: policy -> exact cache -> semantic cache -> admission -> scheduler -> backend.
+    `lane` pins the scheduler lane (e.g. "batch" for offline jobs, which skip admission control).
+    `revalidate` skips both cache lookups and the semantic store: it regenerates the exact-cache
+    entry for a request whose cached answer is stale (see _start_revalidation).
+    `warm` skips both cache lookups, so no hit/miss counters or admission-filter sightings, and
+    fills both caches from a backend generation (see CacheWarmer).
+    `start_by` (a time.time()) drops the backend job with a 503 if no worker has started it by then.
+    Stage durations are recorded on `timer` and persisted in the trace's timings_json.
+    Returns the response already serialized: cache hits never build a pydantic model, and a
+    fresh response is dumped once and shared by the caches, the trace and the HTTP body.
+    """
     if req.stream:
         raise HTTPException(status_code=400, detail="stream=true is not supported yet")
 
     request_id = str(uuid.uuid4())
-    t0 = time.perf_counter()
+    timer = timer or StageTimer()
 
-    policy = settings.load_policy()
-    tenant_policy = policy.tenants.get(x_tenant_id, policy.tenants["default"])
+    with timer.stage("policy"):
+        policy = settings.load_policy()
+        tenant_policy = policy.tenants.get(tenant_id, policy.tenants["default"])
 
     # Normalize request (used for caching later)
-    normalized = normalize_messages(req.messages)
+    with timer.stage("normalize"):
+        normalized = normalize_messages(req.messages, tenant_policy.normalize)
 
     prompt_chars = len(normalized.canonical_text)
 
-    plan_obj, trace_obj = build_plan(
-        policy=policy,
-        tenant_id=x_tenant_id,
-        prompt_chars=prompt_chars,
-        override_temperature=req.temperature,
-        override_max_tokens=req.max_tokens,
-    )
-
-    plan = {
-        "plan_name": plan_obj.plan_name,
-        "tier": plan_obj.tier,
-        "decoding_profile": plan_obj.decoding_profile,
-        "max_tokens": plan_obj.max_tokens,
-        "temperature": plan_obj.temperature,
-        "cache": plan_obj.cache,
-    }
+    with timer.stage("plan"):
+        plan_obj, trace_obj = build_plan(
+            policy=policy,
+            tenant_id=tenant_id,
+            prompt_chars=prompt_chars,
+            override_temperature=req.temperature,
+            override_max_tokens=req.max_tokens,
+        )
 
-    sig = plan_signature(plan)
-    decision_trace = {
+        plan = plan_dict(plan_obj)
+        # answer-shaping fields only: degraded and normal requests share entries (see reusable_for)
+        sig = cache_signature(plan)
+    decision_trace: dict[str, Any] = {
         "reasons": trace_obj.reasons,
         "bucket": trace_obj.bucket,
         "tenant_id": trace_obj.tenant_id,
         "policy_version": trace_obj.policy_version,
     }
-
-    # Getting cachce 
-    redis = get_redis()
     cache_info : dict[str,Any] = {'exact':{'enabled':bool(plan['cache'].get('exact_enabled',True))}}
-    if plan['cache'].get('exact_enabled',True):
-        sig = plan_signature(plan)
-        key = exact_cache_key(tenant_id=x_tenant_id,request_hash = normalized.request_hash,plan_sig=sig )
-        cached = await redis.get(key)
+    if normalized.normalizer_sig is not None:
+        # the tenant's normalizer chain shaped request_hash: keep which steps did, for provenance
+        cache_info['normalize'] = {
+            'sig': normalized.normalizer_sig,
+            'applied': list(normalized.applied),
+            'system_fingerprint': normalized.system_fingerprint,
+        }
 
-        if cached is not None:
-            await redis.incr(f'metrics:cache_exact_hit:{x_tenant_id}')
+    async def record_trace(
+        *,
+        status_code: int,
+        resp: RawChatResponse | None = None,
+        result: GenerationResult | None = None,
+        lane: str | None = None,
+        degraded: bool = False,
+        queue_wait_ms: int | None = None,
+        error: dict[str, Any] | None = None,
+        outcome: str | None = None,
+    ) -> int:
+        latency_ms = int(timer.elapsed_ms())
+        # backend-reported counts (may be None) win over the response's zero-filled usage
+        tokens: tuple[int | None, int | None, int | None] = (None, None, None)
+        if result is not None:
+            tokens = (result.prompt_tokens, result.completion_tokens, result.total_tokens)
+        elif resp is not None:
+            tokens = (resp.prompt_tokens, resp.completion_tokens, resp.total_tokens)
+
+        if outcome is not None:
+            cache_outcome = outcome
+        elif status_code == 429:
+            cache_outcome = "rejected"
+        elif status_code == 503:
+            cache_outcome = "queue_full"
+        elif cache_info["exact"].get("hit"):
+            cache_outcome = "exact_hit"
+        elif cache_info.get("semantic", {}).get("hit"):
+            cache_outcome = "semantic_hit"
+        else:
+            cache_outcome = "miss"
+
+        rollups = get_rollups()
+        if rollups is not None:
+            rollups.record(
+                created_at=time.time(),
+                tenant_id=tenant_id,
+                lane=lane,
+                cache_outcome=cache_outcome,
+                status_code=status_code,
+                latency_ms=latency_ms,
+                degraded=degraded,
+                prompt_tokens=tokens[0],
+                completion_tokens=tokens[1],
+            )
 
-            cached_obj = orjson.loads(cached)
+        capture = tenant_policy.traces
+        response_bytes = resp.body if resp is not None else b"null"
+        if keep_payloads(mode=capture.payload_capture, sample_rate=capture.sample_rate, status_code=status_code):
+            request_json = orjson.dumps(req.model_dump()).decode("utf-8")
+            response_json = response_bytes.decode("utf-8")
+        else:
+            request_json = response_json = "null"
 
-            resp = ChatCompletionsResponse.model_validate(cached_obj)
+        with timer.stage("trace_write"):
+            try:
+                await insert_trace(
+                    {
+                        "request_id": request_id,
+                        "tenant_id": tenant_id,
+                        "endpoint": endpoint,
+                        "model": req.model,
+                        "status_code": status_code,
+                        "request_hash": normalized.request_hash,
+                        "lane": lane,
+                        "cache_outcome": cache_outcome,
+                        "latency_ms": latency_ms,
+                        "backend_latency_ms": result.backend_latency_ms if result is not None else None,
+                        "queue_wait_ms": queue_wait_ms,
+                        "backend_ttft_ms": result.backend_ttft_ms if result is not None else None,
+                        "prompt_tokens": tokens[0],
+                        "completion_tokens": tokens[1],
+                        "total_tokens": tokens[2],
+                        "payload_capture": capture.payload_capture,
+                        "request_json": request_json,
+                        "response_json": response_json,
+                        "response_hash": hashlib.sha256(response_bytes).hexdigest() if resp is not None else None,
+                        "error_json": orjson.dumps(error).decode("utf-8"),
+                        "policy_version": policy.policy_version,
+                        "plan_json": orjson.dumps(plan).decode("utf-8"),
+                        "decision_trace_json": orjson.dumps(decision_trace).decode("utf-8"),
+                        "cache_json": orjson.dumps(cache_info).decode("utf-8"),
+                        "timings_json": orjson.dumps(timer.as_dict()).decode("utf-8"),
+                    }
+                )
+            except TimeoutError:
+                # the response is already decided; a slow trace write must not turn it into a 500
+                log.warning("trace_write_timeout", request_id=request_id, tenant_id=tenant_id)
+        return latency_ms
 
-            latency_ms = int((time.perf_counter()-t0)*1000)
-            cache_info['exact'].update({'hit':True,'key':key,'plan_sig':sig})
+    # Getting cachce 
+    redis = get_redis()
+    held_back: RawChatResponse | None = None  # exact entry for another budget, kept for the degrade check below
+    cache_gate = get_cache_admission()
+    seen = 0  # lookups of this key so far (admission filter), including this one
+    lookups = not (revalidate or warm)
+    if plan['cache'].get('exact_enabled',True) and lookups:
+        key = exact_cache_key(tenant_id=tenant_id,request_hash = normalized.request_hash,plan_sig=sig )
+        with timer.stage("exact_lookup"):
+            cached = await redis.get(key)
+            if cache_gate is not None:
+                seen = cache_gate.record(key)
+                cache_info['exact']['seen'] = seen
+
+        now = time.time()
+        hit = (
+            decode_entry(cached, request_id=request_id, created=int(now), codec=get_body_codec())
+            if cached is not None
+            else None
+        )
+        if hit is not None and not reusable_for(
+            finish_reason=hit.finish_reason,
+            completion_tokens=hit.completion_tokens,
+            max_tokens=plan_obj.max_tokens,
+            generated_max_tokens=hit.max_tokens,
+        ):
+            # cut short under a smaller budget, or longer than this request allows
+            held_back, hit = hit, None
+            cache_info['exact']['incompatible'] = {
+                'max_tokens': held_back.max_tokens,
+                'finish_reason': held_back.finish_reason,
+                'completion_tokens': held_back.completion_tokens,
+            }
+        if hit is not None:
+            await redis.incr(f'metrics:cache_exact_hit:{tenant_id}')
 
-            await insert_trace(
-                {
-                    "request_id": request_id,
-                    "tenant_id": x_tenant_id,
-                    "endpoint": "/v1/chat/completions",
-                    "model": req.model,
-                    "status_code": 200,
-                    "request_hash": normalized.request_hash,
-                    "latency_ms": latency_ms,
-                    "backend_latency_ms": None,
-                    "queue_wait_ms": None,
-                    "backend_ttft_ms": None,
-                    "prompt_tokens": resp.usage.prompt_tokens,
-                    "completion_tokens": resp.usage.completion_tokens,
-                    "total_tokens": resp.usage.total_tokens,
-                    "request_json": orjson.dumps(req.model_dump()).decode("utf-8"),
-                    "response_json": orjson.dumps(resp.model_dump()).decode("utf-8"),
-                    "error_json": "null",
-                    "policy_version": policy.policy_version,
-                    "plan_json": orjson.dumps(plan).decode("utf-8"),
-                    "decision_trace_json": orjson.dumps(decision_trace).decode("utf-8"),
-                    "cache_json": orjson.dumps(cache_info).decode("utf-8"),
+            resp = hit
+
+            cache_info['exact'].update({'hit':True,'key':key,'plan_sig':sig})
+            if hit.max_tokens != plan_obj.max_tokens:
+                # generated under another budget (a degraded request, or another max_tokens override)
+                cache_info['exact']['reuse'] = {
+                    'max_tokens': plan_obj.max_tokens,
+                    'generated_max_tokens': hit.max_tokens,
+                    'finish_reason': hit.finish_reason,
                 }
-            )
+            stale = now >= hit.fresh_until
+            if should_refresh(fresh_until=hit.fresh_until, compute_ms=hit.compute_ms, now=now, beta=settings.exact_cache_xfetch_beta):
+                # stale-while-revalidate: answer now, regenerate once in the background
+                cache_info['exact'].update({
+                    'stale': stale,
+                    'stale_s': round(now - hit.fresh_until, 1) if stale else None,
+                    'early_refresh': not stale,
+                    'revalidate': await _start_revalidation(req, tenant_id=tenant_id, key=key, max_tokens=hit.max_tokens),
+                })
+
+            latency_ms = await record_trace(status_code=200, resp=resp)
 
             log.info(
                 "cache_hit",
                 request_id=request_id,
-                tenant_id=x_tenant_id,
+                tenant_id=tenant_id,
                 latency_ms=latency_ms,
                 request_hash=normalized.request_hash,
             )
             return resp
         else:
-            await redis.incr(f'metrics:cache_exact_miss:{x_tenant_id}')
+            await redis.incr(f'metrics:cache_exact_miss:{tenant_id}')
             cache_info['exact'].update({'hit':False,'key':key,'plan_sig':sig})
 
 
     # Now let's check if we can save time with semantic caching
     sem_cfg = plan['cache'].get('semantic',{})
-    cache_info['semantic'] = {'enabled':bool(sem_cfg.get('enabled',False)), 'plan_sig':sig}
-
-    if sem_cfg.get('enabled',False):
-        qvec = embed_text(normalized.canonical_text)
-        row = await semantic_lookup(tenant_id=x_tenant_id, plan_sig = sig, query_vec = qvec)
+    sem_enabled = bool(sem_cfg.get('enabled',False)) and not revalidate
+    cache_info['semantic'] = {'enabled':sem_enabled, 'plan_sig':sig}
+
+    qvec: npt.NDArray[np.float32] | None = None
+    row: dict[str, Any] | None = None  # best semantic candidate, kept for the overload check below
+    if sem_enabled and lookups:
+        with timer.stage("embed"):
+            qvec = embed_text(normalized.canonical_text)
+        with timer.stage("semantic_lookup"):
+            try:
+                row = await semantic_lookup(tenant_id=tenant_id, plan_sig = sig, query_vec = qvec)
+            except TimeoutError:
+                # a slow lookup costs more than a miss; go to the backend instead
+                log.warning("semantic_lookup_timeout", request_id=request_id, tenant_id=tenant_id)
+                cache_info['semantic']['error'] = 'timeout'
+                row = None
         if row is not None:
             similarity = float(row.get('similarity',0.0))
             threshold = float(sem_cfg.get('threshold',0.90))
-            if similarity>=threshold : 
-                resp = ChatCompletionsResponse.model_validate(row['response_json'])
+            fits = reusable_for(
+                finish_reason=row['finish_reason'], completion_tokens=row['completion_tokens'], max_tokens=plan_obj.max_tokens
+            )
+            if similarity>=threshold and fits:
+                resp = RawChatResponse(
+                    id=request_id,
+                    body=render(row['response_body'], request_id=request_id, created=int(time.time())),
+                    prompt_tokens=row['prompt_tokens'],
+                    completion_tokens=row['completion_tokens'],
+                    total_tokens=row['total_tokens'],
+                    finish_reason=row['finish_reason'],
+                )
 
-                latency_ms = int((time.perft_counter()-t0)*1000)
                 cache_info['semantic'].update(
                                         {
                         "hit": True,
@@ -165,30 +414,7 @@ async def chat_completions(
                     }
 
                 )
-                await insert_trace(
-                    {
-                        "request_id": request_id,
-                        "tenant_id": x_tenant_id,
-                        "endpoint": "/v1/chat/completions",
-                        "model": req.model,
-                        "status_code": 200,
-                        "request_hash": normalized.request_hash,
-                        "latency_ms": latency_ms,
-                        "backend_latency_ms": None,
-                        "queue_wait_ms": None,
-                        "backend_ttft_ms": None,
-                        "prompt_tokens": resp.usage.prompt_tokens,
-                        "completion_tokens": resp.usage.completion_tokens,
-                        "total_tokens": resp.usage.total_tokens,
-                        "request_json": orjson.dumps(req.model_dump()).decode("utf-8"),
-                        "response_json": orjson.dumps(resp.model_dump()).decode("utf-8"),
-                        "error_json": "null",
-                        "policy_version": policy.policy_version,
-                        "plan_json": orjson.dumps(plan).decode("utf-8"),
-                        "decision_trace_json": orjson.dumps(decision_trace).decode("utf-8"),
-                        "cache_json": orjson.dumps(cache_info).decode("utf-8"),
-                    }
-                )
+                await record_trace(status_code=200, resp=resp)
 
                 log.info("semantic_cache_hit_pgvector", request_id=request_id, similarity=similarity)
                 return resp
@@ -202,26 +428,113 @@ async def chat_completions(
                     "verifier": sem_cfg.get("verifier", "off"),
                 }
             )
+            if not fits:
+                cache_info["semantic"]["incompatible"] = {
+                    "finish_reason": row["finish_reason"],
+                    "completion_tokens": row["completion_tokens"],
+                }
         else:
             cache_info["semantic"].update({"hit": False, "best_similarity": None})
 
 
     scheduler = get_scheduler()
-    lane  = scheduler.lane_for_prompt_chars(prompt_chars)
+    with timer.stage("admission"):
+        if lane is None:
+            lane = scheduler.lane_for_prompt_chars(prompt_chars)
+            admission, predicted_wait_ms = scheduler.admission_check(lane=lane, tenant_slo_ms= tenant_policy.latency_slo_ms, prompt_chars=prompt_chars)
+        else:
+            # pinned lanes (batch) only run on idle capacity, so there is no SLO to protect
+            admission, predicted_wait_ms = AdmissionResult(True, False, False, f"pinned_lane:{lane}"), 0
 
-    admission, predicted_wait_ms = scheduler.admission_check(lane=lane, tenant_slo_ms= tenant_policy.latency_slo_ms, prompt_chars=prompt_chars)
 
+    # what degrading cuts max_tokens to; under overload, cached answers at least that long are served instead
+    effective_max_tokens = plan_obj.max_tokens
+    overloaded = admission.degraded or admission.rejected
+    if overloaded:
+        adm = policy.scheduler.admission.degrade
+        scaled = int(effective_max_tokens*float(adm.max_tokens_scale)) # e.g. currently max_token_scale =0.5 so we reduce the effective max token to half
+        effective_max_tokens = max(int(adm.max_tokens_floor),scaled)
+    instead = "rejecting" if admission.rejected else "degrading"
+
+    if overloaded and held_back is not None and reusable_for(
+        finish_reason=held_back.finish_reason,
+        completion_tokens=held_back.completion_tokens,
+        max_tokens=plan_obj.max_tokens,
+        generated_max_tokens=held_back.max_tokens,
+        degraded_to=effective_max_tokens,
+    ):
+        # the exact answer, cut short under an earlier degrade, is no worse than what this request gets now
+        resp = held_back
+        await redis.incr(f'metrics:cache_exact_hit:{tenant_id}')
+        cache_info['exact'].update({
+            'hit': True,
+            'reuse': {
+                'max_tokens': plan_obj.max_tokens,
+                'generated_max_tokens': resp.max_tokens,
+                'finish_reason': resp.finish_reason,
+                'degraded_to': effective_max_tokens,
+            },
+        })
+        cache_info['scheduler'] = {
+            'lane': lane,
+            'admission': admission.reason,
+            'predicted_wait_ms': predicted_wait_ms,
+            'served_from_cache_instead_of': instead,
+        }
+        decision_trace['reasons'].append(
+            f"overload ({admission.reason}): served exact entry truncated at {resp.completion_tokens} tokens "
+            f"(>= degraded max_tokens {effective_max_tokens}) instead of {instead}"
+        )
+        await record_trace(status_code=200, resp=resp, lane=lane)
+        log.info("exact_degraded_hit", request_id=request_id, tenant_id=tenant_id, instead=instead)
+        return resp
+
+    overload_threshold = sem_cfg.get('overload_threshold') if sem_enabled else None
+    if overloaded and row is not None and overload_threshold is not None:
+        similarity = float(row.get('similarity', 0.0))
+        if similarity >= float(overload_threshold) and reusable_for(
+            finish_reason=row['finish_reason'],
+            completion_tokens=row['completion_tokens'],
+            max_tokens=plan_obj.max_tokens,
+            degraded_to=effective_max_tokens,
+        ):
+            # a near-miss cached answer beats a truncated answer or a 429/503
+            resp = RawChatResponse(
+                id=request_id,
+                body=render(row['response_body'], request_id=request_id, created=int(time.time())),
+                prompt_tokens=row['prompt_tokens'],
+                completion_tokens=row['completion_tokens'],
+                total_tokens=row['total_tokens'],
+                finish_reason=row['finish_reason'],
+                cache_status=f"semantic-overload; similarity={similarity:.3f}",
+            )
+            cache_info['semantic'].update({
+                "hit": True,
+                "overload": True,
+                "similarity": similarity,
+                "overload_threshold": float(overload_threshold),
+                "entry_id": row.get("id"),
+            })
+            cache_info['scheduler'] = {
+                'lane': lane,
+                'admission': admission.reason,
+                'predicted_wait_ms': predicted_wait_ms,
+                'served_from_cache_instead_of': instead,
+            }
+            decision_trace['reasons'].append(
+                f"overload ({admission.reason}): served semantic candidate {similarity:.3f} >= "
+                f"overload_threshold {float(overload_threshold)} instead of {instead}"
+            )
+            await record_trace(status_code=200, resp=resp, lane=lane, outcome="overload_hit")
+            log.info("semantic_overload_hit", request_id=request_id, tenant_id=tenant_id, similarity=similarity, instead=instead)
+            return resp
 
     degraded = False
     rejected = False
     rejected_retry_after = False
 
-    effective_max_tokens = plan_obj.max_tokens
     if admission.degraded :
         degraded = True
-        adm = policy.scheduler.admission.degrade
-        scaled = int(effective_max_tokens*float(adm.max_tokens_scale)) # e.g. currently max_token_scale =0.5 so we reduce the effective max token to half
-        effective_max_tokens = max(int(adm.max_tokens_floor),scaled)
         plan['max_tokens'] = effective_max_tokens
         decision_trace['reasons'].append(f'degraded max_tokens to {effective_max_tokens} due to admission control')
 
@@ -235,46 +548,44 @@ async def chat_completions(
             'degraded':degraded,
             'rejected':True
         }
-        latency_ms = int((time.perf_counter()-t0)*1000)
-        await insert_trace(
-            {
-                "request_id": request_id,
-                "tenant_id": x_tenant_id,
-                "endpoint": "/v1/chat/completions",
-                "model": req.model,
-                "status_code": 429,
-                "request_hash": normalized.request_hash,
-                "latency_ms": latency_ms,
-                "backend_latency_ms": None,
-                "queue_wait_ms": predicted_wait_ms,
-                "backend_ttft_ms": None,
-                "prompt_tokens": None,
-                "completion_tokens": None,
-                "total_tokens": None,
-                "request_json": orjson.dumps(req.model_dump()).decode("utf-8"),
-                "response_json": "null",
-                "error_json": orjson.dumps(
-                    {"type": "rate_limited", "detail": "Predicted SLO miss; retry later", "retry_after_seconds": reject_retry_after}
-                ).decode("utf-8"),
-                "policy_version": policy.policy_version,
-                "plan_json": orjson.dumps(plan).decode("utf-8"),
-                "decision_trace_json": orjson.dumps(decision_trace).decode("utf-8"),
-                "cache_json": orjson.dumps(cache_info).decode("utf-8"),
-            }
+        if admission.reason == "backends_unavailable":
+            # every circuit is open: fail fast instead of queueing behind dead backends
+            await record_trace(
+                status_code=503,
+                lane=lane,
+                outcome="backend_error",
+                error={"type": "backends_unavailable", "retry_after_seconds": rejected_retry_after},
+            )
+            raise HTTPException(
+                status_code=503,
+                detail="No backend available, try later",
+                headers={"Retry-After": str(rejected_retry_after)},
+            )
+        await record_trace(
+            status_code=429,
+            lane=lane,
+            degraded=degraded,
+            queue_wait_ms=predicted_wait_ms,
+            error={"type": "rate_limited", "detail": "Predicted SLO miss; retry later", "retry_after_seconds": rejected_retry_after},
         )
-        raise HTTPException(status_code=429, detail={"retry_after_seconds": reject_retry_after})
-
-
-
+        raise HTTPException(status_code=429, detail={"retry_after_seconds": rejected_retry_after})
 
 
 
     
     prompt = normalized.canonical_text + '\n assitance:'
+    # a follow-up turn: the history up to the last answer may already be in a stored ollama context
+    continued = (
+        split_continued_turn(normalized.messages)
+        if settings.context_reuse_enabled and settings.backend_mode == "ollama"
+        else None
+    )
 
-    adapter = OllamaAdapter(base_url = settings.ollama_base_url)
+    affinity_cfg = policy.backends.affinity
+    affinity_key = prefix_key(normalized.messages, affinity_cfg) if affinity_cfg.enabled else None
 
-    async def run_backend()-> object:
+    async def generate_on(tier: str) -> GenerationResult:
+        tier_cfg = resolve_tier(policy, tier)
         ## for github CI
         if settings.backend_mode == 'mock':
             return GenerationResult(
@@ -284,11 +595,52 @@ async def chat_completions(
                     total_tokens=30,
                     backend_latency_ms=50,
                     backend_ttft_ms=None,
+                    backend_meta={"model": tier_cfg.model, "done_reason": "stop"},
             )
-        return await adapter.generate(model=settings.ollama_model,
-                                      prompt=prompt,
-                                      temperature=float(plan['temperature']),
-                                      max_tokens = int(plan['max_tokens']))
+        if settings.backend_mode == 'sim':
+            return await get_sim_backend().generate(model=tier_cfg.model,
+                                                    prompt=prompt,
+                                                    temperature=float(plan['temperature']),
+                                                    max_tokens=int(plan['max_tokens']))
+        stored = None
+        if continued is not None:
+            raw = await redis.get(
+                context_key(tenant_id=tenant_id, model=tier_cfg.model, conversation_hash=continued.prefix_hash)
+            )
+            stored = decode_context(raw) if raw else None
+            # per tier: each cascade step looks up its own model's context
+            cache_info.setdefault("context", {})[tier] = {
+                "hit": stored is not None,
+                "tokens": len(stored.tokens) if stored else 0,
+                "prefix_messages": continued.prefix_messages,
+            }
+        if stored is not None and continued is not None:
+            # same prompt shape as a first turn, just for the new messages
+            new_text = "\n".join(f"{m.role}:{m.content}" for m in continued.new_messages)
+            return await get_backend_pool().generate(model=tier_cfg.model,
+                                                     prompt=new_text + '\n assitance:',
+                                                     temperature=float(plan['temperature']),
+                                                     max_tokens = int(plan['max_tokens']),
+                                                     bucket=trace_obj.bucket,
+                                                     base_urls=tier_cfg.backends,
+                                                     logprobs=bool(plan_obj.cascade) and policy.cascade.min_avg_logprob is not None,
+                                                     context=stored.tokens,
+                                                     prefer_url=stored.base_url,
+                                                     affinity_key=affinity_key)
+        return await get_backend_pool().generate(model=tier_cfg.model,
+                                                 prompt=prompt,
+                                                 temperature=float(plan['temperature']),
+                                                 max_tokens = int(plan['max_tokens']),
+                                                 bucket=trace_obj.bucket,
+                                                 base_urls=tier_cfg.backends,
+                                                 logprobs=bool(plan_obj.cascade) and policy.cascade.min_avg_logprob is not None,
+                                                 affinity_key=affinity_key)
+
+    async def run_backend()-> object:
+        if plan_obj.cascade:
+            return await run_cascade(plan_obj.cascade, generate_on, policy.cascade, decision_trace)
+        return await generate_on(plan_obj.tier)
+
     ## lets use asyncio out event loop to set a future return value
 
     fut : asyncio.Future[object]  = asyncio.get_running_loop().create_future()
@@ -298,20 +650,20 @@ async def chat_completions(
 
     job = ScheduledJob(
         request_id = request_id, 
-        tenant_id  = x_tenant_id,
+        tenant_id  = tenant_id,
         lane=lane,
         created_at = time.time(), 
         slo_ms = tenant_policy.latency_slo_ms,
         plan = plan_obj,
         run = run_backend, 
         fut=fut, 
-        queue_entered_at= queue_entered
+        queue_entered_at= queue_entered,
+        start_by=start_by,
     )
 
     try:
         await scheduler.submit(job)
     except QueueFullError:
-        latency_ms = int((time.perf_counter()-t0)*1000)
         cache_info["scheduler"] = {
             "lane": lane,
             "admission": "queue_full",
@@ -319,37 +671,58 @@ async def chat_completions(
             "degraded": degraded,
             "rejected": True,
         }
-        await insert_trace(
-            {
-                "request_id": request_id,
-                "tenant_id": x_tenant_id,
-                "endpoint": "/v1/chat/completions",
-                "model": req.model,
-                "status_code": 503,
-                "request_hash": normalized.request_hash,
-                "latency_ms": latency_ms,
-                "backend_latency_ms": None,
-                "queue_wait_ms": predicted_wait_ms,
-                "backend_ttft_ms": None,
-                "prompt_tokens": None,
-                "completion_tokens": None,
-                "total_tokens": None,
-                "request_json": orjson.dumps(req.model_dump()).decode("utf-8"),
-                "response_json": "null",
-                "error_json": orjson.dumps({"type": "queue_full", "detail": "Queue full, try later"}).decode("utf-8"),
-                "policy_version": policy.policy_version,
-                "plan_json": orjson.dumps(plan).decode("utf-8"),
-                "decision_trace_json": orjson.dumps(decision_trace).decode("utf-8"),
-                "cache_json": orjson.dumps(cache_info).decode("utf-8"),
-            }
+        await record_trace(
+            status_code=503,
+            lane=lane,
+            degraded=degraded,
+            queue_wait_ms=predicted_wait_ms,
+            error={"type": "queue_full", "detail": "Queue full, try later"},
         )
         raise HTTPException(status_code=503, detail="Queue full, try later")
     
-    result_obj = await fut
-    result = result_obj
-    queue_wait_ms = int((time.perf_counter()-queue_entered)*1000)- (result.backend_latency_ms or 0)
+    try:
+        result = await fut
+    except JobExpiredError as e:
+        # never reached a worker before start_by; nothing ran
+        cache_info["scheduler"] = {"lane": lane, "admission": admission.reason, "expired": True}
+        await record_trace(
+            status_code=503, lane=lane, outcome="expired", error={"type": "job_expired", "detail": str(e)}
+        )
+        raise HTTPException(status_code=503, detail="Not started before its deadline") from e
+    except Exception as e:
+        # breaker/timeout/transport failures from the backend pool become 503/504/502, with a trace
+        if isinstance(e, BackendUnavailableError):
+            status, retry_after = 503, max(1, math.ceil(e.retry_after_s))
+        elif isinstance(e, BackendTimeoutError):
+            status, retry_after = 504, None
+        else:
+            status, retry_after = 502, None
+        cache_info["scheduler"] = {
+            "lane": lane,
+            "admission": admission.reason,
+            "predicted_wait_ms": predicted_wait_ms,
+            "degraded": degraded,
+            "rejected": False,
+        }
+        await record_trace(
+            status_code=status,
+            lane=lane,
+            degraded=degraded,
+            outcome="backend_error",
+            error={"type": type(e).__name__, "detail": str(e)},
+        )
+        log.warning("backend_error", request_id=request_id, tenant_id=tenant_id, status_code=status, error=str(e) or type(e).__name__)
+        raise HTTPException(
+            status_code=status,
+            detail=f"Backend error: {type(e).__name__}",
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
+        ) from e
+    scheduled_ms = int((time.perf_counter()-queue_entered)*1000)
+    queue_wait_ms = scheduled_ms - (result.backend_latency_ms or 0)
     if queue_wait_ms < 0:
-        queue_wait_ms = int((time.perf_counter() - queue_entered)*1000)
+        queue_wait_ms = scheduled_ms
+    timer.add("queue", float(queue_wait_ms))
+    timer.add("backend", float(scheduled_ms - queue_wait_ms))
 
     cache_info["scheduler"] = {
         "lane": lane,
@@ -359,6 +732,11 @@ async def chat_completions(
         "degraded": degraded,
         "rejected": False,
     }
+    if result.backend_meta:
+        # which endpoint served it, and the hedge decision when hedging is on
+        cache_info["backend"] = {
+            k: result.backend_meta[k] for k in ("backend", "model", "tier", "hedge", "retried_after", "affinity") if k in result.backend_meta
+        }
 
 
 
@@ -367,8 +745,12 @@ async def chat_completions(
     #result = await adapter.generate(model=settings.ollama_model, prompt= prompt, temperature=plan['temperature'], max_tokens = plan['max_tokens'])
     assistant_text = result.text or "(empty response)"
     created = int(time.time())
+    # "length": cut at max_tokens, which limits who may reuse it from the caches (see reusable_for);
+    # None when the backend did not say, which limits reuse to this budget
+    done_reason = (result.backend_meta or {}).get("done_reason")
+    finish_reason = done_reason if done_reason in ("stop", "length") else None
 
-    resp = ChatCompletionsResponse(
+    resp_obj = ChatCompletionsResponse(
         id=request_id,
         created=created,
         model=req.model,
@@ -376,7 +758,7 @@ async def chat_completions(
             ChatCompletionsChoice(
                 index=0,
                 message=ChatMessage(role="assistant", content=assistant_text),
-                finish_reason="stop",
+                finish_reason=finish_reason,
             )
         ],
         usage=Usage(
@@ -384,78 +766,110 @@ async def chat_completions(
             completion_tokens=result.completion_tokens or 0,
             total_tokens=result.total_tokens or 0,
         ),
+    ).model_dump()
+    # the only serialization of this response: caches get the body without id/created
+    body = cacheable_body(resp_obj)
+    usage = resp_obj["usage"]
+    resp = RawChatResponse(
+        id=request_id,
+        body=render(body, request_id=request_id, created=created),
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        total_tokens=usage["total_tokens"],
+        finish_reason=finish_reason,
     )
 
     ## let's store the respo (pgvector)
-    if sem_cfg.get('enabled',False):
-        ttl_seconds = int(sem_cfg.get('ttl_seconds',1800))
-        entry_id = await semantic_store(
-            tenant_id = x_tenant_id,
-            plan_sig = sig,
-            request_hash = normalized.request_hash,
-            prompt_text=normalized.canonical_text,
-            embedding = embed_text(normalized.canonical_text),
-            response_obj=resp.model_dump(),
-            ttl_seconds = ttl_seconds,
-        )
-        cache_info['semantic'].update(
-            {
-                                "stored": True,
-                "entry_id": entry_id,
-                "ttl_seconds": ttl_seconds,
-                "threshold": float(sem_cfg.get("threshold", 0.90)),
-                "verifier": sem_cfg.get("verifier", "off"),
-
-            }
-        )
-    else :
-        cache_info['semantic'].update({'stored':False})
-
-    if plan['cache'].get('exact_enabled',True):
-        sig = plan_signature(plan)
-        key = exact_cache_key(tenant_id=x_tenant_id, request_hash=normalized.request_hash,plan_sig=sig)
-        await redis.setex(key,settings.exact_cache_ttl_seconds,orjson.dumps(resp.model_dump()))
-        cache_info['exact'].update({'store':True,'ttl_s':settings.exact_cache_ttl_seconds, 'key':key,'plan_sig':sig})
-    else : 
-        cache_info['exact'].update({'stored':False})
+    with timer.stage("cache_fill"):
+        if sem_enabled and finish_reason is None:
+            # semantic entries do not record the budget, and an unknown finish needs it (see reusable_for)
+            cache_info['semantic'].update({'stored': False, 'skipped': 'finish_reason_unknown'})
+        elif sem_enabled:
+            ttl_seconds = int(sem_cfg.get('ttl_seconds',1800))
+            try:
+                entry_id: str | None = await semantic_store(
+                    tenant_id = tenant_id,
+                    plan_sig = sig,
+                    request_hash = normalized.request_hash,
+                    prompt_text=normalized.canonical_text,
+                    embedding = qvec if qvec is not None else embed_text(normalized.canonical_text),
+                    response_body=body,
+                    ttl_seconds = ttl_seconds,
+                )
+            except TimeoutError:
+                log.warning("semantic_store_timeout", request_id=request_id, tenant_id=tenant_id)
+                entry_id = None
+            cache_info['semantic'].update(
+                {
+                                    "stored": entry_id is not None,
+                    "entry_id": entry_id,
+                    "ttl_seconds": ttl_seconds,
+                    "threshold": float(sem_cfg.get("threshold", 0.90)),
+                    "verifier": sem_cfg.get("verifier", "off"),
 
+                }
+            )
+        else :
+            cache_info['semantic'].update({'stored':False})
+
+        # a revalidation replaces an entry that was already admitted; a warm fill restores one
+        if plan['cache'].get('exact_enabled',True) and lookups and cache_gate is not None and not cache_gate.admit(seen):
+            # first sighting(s) of this request: most are never asked again, keep Redis for those that are
+            cache_info['exact'].update({'store': False, 'skipped': 'admission', 'min_hits': cache_gate.min_hits})
+        elif plan['cache'].get('exact_enabled',True):
+            # same signature as the lookup even when degraded: the entry records the budget instead
+            key = exact_cache_key(tenant_id=tenant_id, request_hash=normalized.request_hash,plan_sig=sig)
+            # soft TTL in the entry, hard TTL (soft + stale window) on the key
+            entry = encode_entry(
+                body,
+                prompt_tokens=resp.prompt_tokens,
+                completion_tokens=resp.completion_tokens,
+                total_tokens=resp.total_tokens,
+                fresh_until=time.time() + settings.exact_cache_ttl_seconds,
+                compute_ms=result.backend_latency_ms or 0,
+                max_tokens=int(plan['max_tokens']),
+                finish_reason=finish_reason,
+                codec=get_body_codec(),
+            )
+            hard_ttl = settings.exact_cache_ttl_seconds + settings.exact_cache_stale_seconds
+            budget = plan['cache'].get('exact_max_bytes')
+            if budget is not None and not await reserve_tenant_bytes(
+                redis, tenant_id=tenant_id, nbytes=len(key) + len(entry), budget=int(budget), window_s=hard_ttl
+            ):
+                cache_info['exact'].update({'store': False, 'skipped': 'tenant_budget', 'budget_bytes': int(budget)})
+            else:
+                await redis.setex(key,hard_ttl,entry)
+                cache_info['exact'].update({'store':True,'ttl_s':settings.exact_cache_ttl_seconds, 'stale_ttl_s':settings.exact_cache_stale_seconds, 'key':key,'plan_sig':sig,
+                                            'bytes': len(entry), 'body_bytes': len(body)})
+        else : 
+            cache_info['exact'].update({'stored':False})
+
+        meta = result.backend_meta or {}
+        if (
+            settings.context_reuse_enabled
+            and result.backend_context
+            and len(result.backend_context) <= settings.context_max_tokens
+            and meta.get("base_url")
+        ):
+            # keyed by the conversation *including* this answer: that is the prefix of the next turn
+            conv = conversation_hash(normalized.messages + (ChatMessage(role="assistant", content=assistant_text),))
+            await redis.setex(
+                context_key(tenant_id=tenant_id, model=meta.get("model") or req.model, conversation_hash=conv),
+                settings.context_ttl_seconds,
+                encode_context(ContextEntry(base_url=meta["base_url"], tokens=result.backend_context)),
+            )
 
-    latency_ms = int((time.perf_counter() - t0) * 1000)
 
     # Store trace (minimal for now)
-    await insert_trace(
-        {
-            "request_id": request_id,
-            "tenant_id": x_tenant_id,
-            "endpoint": "/v1/chat/completions",
-            "model": req.model,
-            "status_code": 200,
-            "request_hash": normalized.request_hash,
-            "latency_ms": latency_ms,
-            "backend_latency_ms": result.backend_latency_ms,
-            "queue_wait_ms": None,
-            "backend_ttft_ms": result.backend_ttft_ms,
-            "prompt_tokens": result.prompt_tokens,
-            "completion_tokens": result.completion_tokens,
-            "total_tokens": result.total_tokens,
-            "request_json": orjson.dumps(req.model_dump()).decode("utf-8"),
-            "response_json": orjson.dumps(resp.model_dump()).decode("utf-8"),
-            "error_json": "null",
-            "policy_version": policy.policy_version,
-            "plan_json": orjson.dumps(plan).decode("utf-8"),
-            "cache_json": orjson.dumps(cache_info).decode("utf-8"),
-            "decision_trace_json": orjson.dumps(decision_trace).decode("utf-8"),
-            "queue_wait_ms": queue_wait_ms,
-
-            "backend_latency_ms": result.backend_latency_ms
-
-        }
+    latency_ms = await record_trace(
+        status_code=200, resp=resp, result=result, lane=lane, degraded=degraded, queue_wait_ms=queue_wait_ms,
+        outcome="revalidate" if revalidate else "warm" if warm else None,
     )
 
     log.info(
         "request_complete",
         request_id=request_id,
-        tenant_id=x_tenant_id,
+        tenant_id=tenant_id,
         latency_ms=latency_ms,
         request_hash=normalized.request_hash,
         policy_version=policy.policy_version,
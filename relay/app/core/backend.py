@@ -13,6 +13,27 @@ class GenerationResult:
     backend_ttft_ms : Optional[int] = None
     backend_name : Optional[str] = None
     backend_meta : Optional[Dict[str,Any]] = None
+    backend_context : Optional[list[int]] = None # ollama `context` (prompt + answer token ids), for reuse
+
+
+@dataclass(frozen=True)
+class BackendTimeouts:
+    connect_s : float
+    first_byte_s : float # until the first streamed token
+    total_s : float # whole generation, from the start of the call
+
+
+class BackendTimeoutError(TimeoutError):
+    def __init__(self, phase : str, after_s : float):
+        super().__init__(f"backend {phase} timeout after {after_s:g}s")
+        self.phase = phase # "connect" | "first_byte" | "total"
+
+
+class BackendUnavailableError(RuntimeError):
+    """No endpoint can take the request (every circuit open); retry after `retry_after_s`."""
+    def __init__(self, retry_after_s : float):
+        super().__init__("no backend available")
+        self.retry_after_s = retry_after_s
 
 
 class BackendAdapter(Protocol):
@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Any, Optional
+
+import httpx
+
+from app.core.backend import BackendTimeoutError, BackendUnavailableError, GenerationResult
+from app.core.circuit_breaker import OPEN, CircuitBreaker
+from app.core.logging import get_logger
+from app.core.ollama_adapter import OllamaAdapter, OllamaError
+from app.core.prefix_affinity import HashRing
+from app.core.settings import BackendsConfig
+
+log = get_logger(component="backend_pool")
+
+
+class LatencyTracker:
+    """
+    Recent backend TTFTs per key (the plan's length bucket), for percentile-based hedge delays.
+    The quantile is recomputed every `refresh_every` observations, not per request.
+    """
+
+    def __init__(self, *, window: int = 512, refresh_every: int = 16):
+        self.window = window
+        self.refresh_every = refresh_every
+        self._samples: dict[str, deque[float]] = {}
+        self._since_refresh: dict[str, int] = {}
+        self._cached: dict[tuple[str, float], float] = {}
+
+    def observe(self, key: str, ms: float) -> None:
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(ms)
+        self._since_refresh[key] = self._since_refresh.get(key, 0) + 1
+
+    def keys(self) -> list[str]:
+        return list(self._samples)
+
+    def count(self, key: str) -> int:
+        return len(self._samples.get(key, ()))
+
+    def quantile(self, key: str, q: float) -> Optional[float]:
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        cached = self._cached.get((key, q))
+        if cached is None or self._since_refresh.get(key, 0) >= self.refresh_every:
+            s = sorted(samples)
+            cached = s[min(len(s) - 1, int(q * len(s)))]
+            self._cached[(key, q)] = cached
+            self._since_refresh[key] = 0
+        return cached
+
+
+class TokenBudget:
+    """
+    Token bucket that caps extra attempts (hedges, retries) to a fraction of primary requests:
+    each primary adds `ratio` tokens (up to `burst`), each extra attempt spends one. A backend
+    slowdown or outage therefore cannot multiply the load that caused it.
+    """
+
+    def __init__(self, *, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    def on_request(self) -> None:
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+# failures worth another endpoint: nothing was generated yet, so a retry costs one prefill
+RETRYABLE = (httpx.TransportError, httpx.HTTPStatusError, BackendTimeoutError, OllamaError)
+
+
+def endpoint_fault(e: BaseException) -> bool:
+    """
+    Whether the endpoint, not the request, is to blame: counted by its breaker and retried
+    elsewhere. An HTTP 4xx other than 429 (unknown model, bad options) fails the same way on
+    every endpoint, so it is neither.
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(e, RETRYABLE)
+
+
+@dataclass
+class Endpoint:
+    adapter: OllamaAdapter
+    breaker: CircuitBreaker
+    in_flight: int = 0
+    stats: dict[str, int] = field(
+        default_factory=lambda: {
+            "requests": 0, "errors": 0, "hedges": 0, "wins": 0, "retries": 0, "affine": 0, "spilled": 0,
+        }
+    )
+
+    @property
+    def name(self) -> str:
+        return self.adapter.name
+
+
+class BackendPool:
+    """
+    Ollama endpoints behind one generate() call. Each request goes to the least-loaded endpoint
+    whose circuit breaker admits it, with connect / first-byte / total deadlines from the plan
+    bucket. A failure before the first token is retried on another endpoint while the retry
+    budget allows. With hedging enabled, a duplicate goes to another endpoint if no first token
+    has arrived after the bucket's recent TTFT quantile; whichever finishes first wins and the
+    other is cancelled. A request with a prefix key goes to that key's home endpoint on a
+    consistent-hash ring unless the home is above its bounded load, so shared system prompts
+    stay in one endpoint's prompt cache.
+    """
+
+    def __init__(self, base_urls: list[str], cfg: BackendsConfig):
+        if not base_urls:
+            raise ValueError("backend pool needs at least one endpoint")
+        self.cfg = cfg
+        self.hedging = cfg.hedging
+        # per-call deadlines come from cfg.timeouts; this is only the backstop
+        self._client = httpx.AsyncClient(
+            timeout=cfg.timeouts.default_total_ms / 1000.0,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=64),
+        )
+        self.endpoints = [
+            Endpoint(
+                OllamaAdapter(base_url=url, name=f"ollama[{i}]", client=self._client),
+                CircuitBreaker(cfg.circuit_breaker),
+            )
+            # settings endpoints plus tier backends named in the policy, first occurrence wins
+            for i, url in enumerate(dict.fromkeys(u.rstrip("/") for u in base_urls))
+        ]
+        self._rr = itertools.count()
+        self._by_url = {e.adapter.base_url: e for e in self.endpoints}
+        self.ring = HashRing(list(self._by_url), vnodes=cfg.affinity.virtual_nodes)
+        self.ttft = LatencyTracker()
+        self.hedge_budget = TokenBudget(ratio=cfg.hedging.budget_ratio, burst=cfg.hedging.budget_burst)
+        self.retry_budget = TokenBudget(ratio=cfg.retries.budget_ratio, burst=cfg.retries.budget_burst)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def pick(self, exclude: tuple[Endpoint, ...] = (), allowed: Optional[frozenset[str]] = None) -> Optional[Endpoint]:
+        """
+        Least in-flight endpoint with a closed (or probing) breaker; ties rotate. `allowed`
+        limits the choice to those base URLs (a tier served by specific endpoints).
+        """
+        candidates = [
+            e for e in self.endpoints
+            if e not in exclude and e.breaker.can_send() and (allowed is None or e.adapter.base_url in allowed)
+        ]
+        if not candidates:
+            return None
+        start = next(self._rr) % len(candidates)
+        rotated = candidates[start:] + candidates[:start]
+        return min(rotated, key=lambda e: e.in_flight)
+
+    def pick_affine(self, key: str, allowed: Optional[frozenset[str]] = None) -> tuple[Optional[Endpoint], dict[str, Any]]:
+        """
+        Consistent hashing with bounded loads: the key's home is the first endpoint clockwise on
+        the ring whose breaker admits it. It takes the request while its in-flight count stays
+        within load_factor x the average over eligible endpoints; otherwise least-loaded does.
+        """
+        eligible = [
+            e for e in self.endpoints
+            if e.breaker.can_send() and (allowed is None or e.adapter.base_url in allowed)
+        ]
+        if not eligible:
+            return None, {}
+        home = next(self._by_url[u] for u in self.ring.walk(key) if self._by_url[u] in eligible)
+        bound = math.ceil(self.cfg.affinity.load_factor * (sum(e.in_flight for e in eligible) + 1) / len(eligible))
+        info: dict[str, Any] = {"key": key, "home": home.name}
+        if home.in_flight + 1 <= bound:
+            home.stats["affine"] += 1
+            return home, {**info, "outcome": "affine"}
+        home.stats["spilled"] += 1
+        return self.pick(allowed=allowed), {**info, "outcome": "spilled", "home_in_flight": home.in_flight, "bound": bound}
+
+    def _sticky(self, url: Optional[str], allowed: Optional[frozenset[str]]) -> Optional[Endpoint]:
+        if url is None or (allowed is not None and url not in allowed):
+            return None
+        for e in self.endpoints:
+            if e.adapter.base_url == url:
+                return e if e.breaker.can_send() else None
+        return None
+
+    def available_fraction(self) -> float:
+        """Share of endpoints not shut off by an open breaker (feeds admission control)."""
+        return sum(1 for e in self.endpoints if e.breaker.state != OPEN) / len(self.endpoints)
+
+    def retry_after_s(self) -> float:
+        return min(e.breaker.retry_after_s() for e in self.endpoints)
+
+    def hedge_delay_ms(self, bucket: str) -> float:
+        h = self.hedging
+        q = self.ttft.quantile(bucket, h.delay_quantile) if self.ttft.count(bucket) >= h.min_samples else None
+        delay = h.default_delay_ms if q is None else q
+        return min(max(delay, h.min_delay_ms), h.max_delay_ms)
+
+    async def _attempt(self, ep: Endpoint, bucket: str, first_token: asyncio.Event, **gen: Any) -> GenerationResult:
+        ep.in_flight += 1
+        ep.stats["requests"] += 1
+        probe = ep.breaker.on_send()
+        try:
+            result = await ep.adapter.generate(
+                first_token=first_token, timeouts=self.cfg.timeouts.for_bucket(bucket), **gen
+            )
+        except asyncio.CancelledError:
+            ep.breaker.on_cancel(probe)
+            raise
+        except Exception as e:
+            ep.stats["errors"] += 1
+            if isinstance(e, httpx.HTTPStatusError) and not endpoint_fault(e):
+                # it answered, so it is up; the request is what it rejected
+                ep.breaker.on_success(ttft_ms=None, probe=probe)
+            else:
+                ep.breaker.on_failure(probe=probe)
+            raise
+        finally:
+            ep.in_flight -= 1
+        ep.breaker.on_success(ttft_ms=result.backend_ttft_ms, probe=probe)
+        if result.backend_ttft_ms is not None:
+            self.ttft.observe(bucket, float(result.backend_ttft_ms))
+        return result
+
+    async def generate(
+        self,
+        *,
+        model: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        bucket: str,
+        base_urls: list[str] | tuple[str, ...] = (),
+        logprobs: bool = False,
+        context: Optional[list[int]] = None,
+        prefer_url: Optional[str] = None,
+        affinity_key: Optional[str] = None,
+    ) -> GenerationResult:
+        """
+        Runs on endpoints in `base_urls` (default: any). `prefer_url` pins the first attempt to
+        that endpoint while its breaker allows (a continued conversation whose KV cache lives
+        there); otherwise `affinity_key` routes by prefix (pick_affine). Retries and hedges
+        still go elsewhere. Raises BackendUnavailableError when every eligible breaker is open,
+        else the last attempt's error.
+        """
+        gen = {
+            "model": model,
+            "prompt": prompt,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "logprobs": logprobs,
+            "context": context,
+        }
+        allowed = frozenset(u.rstrip("/") for u in base_urls) or None
+        self.hedge_budget.on_request()
+        self.retry_budget.on_request()
+        affinity: dict[str, Any] = {}
+        ep = self._sticky(prefer_url, allowed)
+        if ep is None and affinity_key is not None:
+            ep, affinity = self.pick_affine(affinity_key, allowed)
+        if ep is None:
+            ep = self.pick(allowed=allowed)
+        if ep is None:
+            raise BackendUnavailableError(self.retry_after_s())
+        tried: list[Endpoint] = []
+        errors: list[str] = []
+        while True:
+            first = asyncio.Event()
+            try:
+                result = await self._generate_once(ep, first, bucket, gen, allowed)
+            except RETRYABLE as e:
+                if not endpoint_fault(e):
+                    raise
+                tried.append(ep)
+                errors.append(f"{ep.name}: {type(e).__name__}")
+                if first.is_set() or len(tried) >= self.cfg.retries.max_attempts:
+                    raise
+                nxt = self.pick(exclude=tuple(tried), allowed=allowed)
+                if nxt is None or not self.retry_budget.try_spend():
+                    raise
+                nxt.stats["retries"] += 1
+                log.warning("backend_retry", endpoint=ep.name, retry_on=nxt.name, error=str(e) or type(e).__name__, bucket=bucket)
+                ep = nxt
+                continue
+            if errors or affinity:
+                extra: dict[str, Any] = {"affinity": affinity} if affinity else {}
+                if errors:
+                    extra["retried_after"] = errors
+                result = replace(result, backend_meta={**(result.backend_meta or {}), **extra})
+            return result
+
+    async def _generate_once(
+        self,
+        primary: Endpoint,
+        first: asyncio.Event,
+        bucket: str,
+        gen: dict[str, Any],
+        allowed: Optional[frozenset[str]] = None,
+    ) -> GenerationResult:
+        if not self.hedging.enabled or len(self.endpoints) < 2:
+            return self._annotate(await self._attempt(primary, bucket, first, **gen), primary, hedge=None)
+
+        t0 = time.perf_counter()
+        primary_task = asyncio.create_task(self._attempt(primary, bucket, first, **gen))
+        try:
+            return await self._hedged(primary, primary_task, first, bucket, t0, gen, allowed)
+        finally:
+            # caller cancelled (client gone, scheduler stopping): don't leave the primary running
+            if not primary_task.done():
+                primary_task.cancel()
+
+    async def _hedged(
+        self,
+        primary: Endpoint,
+        primary_task: asyncio.Task[GenerationResult],
+        first: asyncio.Event,
+        bucket: str,
+        t0: float,
+        gen: dict[str, Any],
+        allowed: Optional[frozenset[str]],
+    ) -> GenerationResult:
+        delay_ms = self.hedge_delay_ms(bucket)
+        hedge_info: dict[str, Any] = {"fired": False, "delay_ms": round(delay_ms, 1)}
+        first_wait = asyncio.create_task(first.wait())
+        try:
+            await asyncio.wait({primary_task, first_wait}, timeout=delay_ms / 1000.0, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            first_wait.cancel()
+
+        if primary_task.done() or first.is_set():
+            return self._annotate(await primary_task, primary, hedge=hedge_info)
+
+        secondary = self.pick(exclude=(primary,), allowed=allowed)
+        if secondary is None or not self.hedge_budget.try_spend():
+            hedge_info["skipped"] = "budget" if secondary is not None else "no_endpoint"
+            return self._annotate(await primary_task, primary, hedge=hedge_info)
+
+        secondary.stats["hedges"] += 1
+        hedge_info.update({"fired": True, "endpoint": secondary.name})
+        # shares `first`: once either attempt has streamed a token the request is not retried
+        hedge_task = asyncio.create_task(self._attempt(secondary, bucket, first, **gen))
+        owners = {primary_task: primary, hedge_task: secondary}
+        pending: set[asyncio.Task[GenerationResult]] = set(owners)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        # one attempt failing is not the request failing while the other still runs
+                        error = task.exception()
+                        continue
+                    winner = owners[task]
+                    winner.stats["wins"] += 1
+                    hedge_info["winner"] = "hedge" if task is hedge_task else "primary"
+                    hedge_info["win_ms"] = int((time.perf_counter() - t0) * 1000)
+                    log.info("backend_hedge", winner=hedge_info["winner"], delay_ms=hedge_info["delay_ms"], bucket=bucket)
+                    return self._annotate(task.result(), winner, hedge=hedge_info)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        assert error is not None
+        raise error
+
+    @staticmethod
+    def _annotate(result: GenerationResult, ep: Endpoint, *, hedge: Optional[dict[str, Any]]) -> GenerationResult:
+        meta = {**(result.backend_meta or {}), "backend": ep.name}
+        if hedge is not None:
+            meta["hedge"] = hedge
+        return replace(result, backend_name=ep.name, backend_meta=meta)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "config": self.cfg.model_dump(),
+            "hedge_budget_tokens": round(self.hedge_budget.tokens, 2),
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2),
+            "available_fraction": self.available_fraction(),
+            "endpoints": [
+                {
+                    "name": e.name,
+                    "base_url": e.adapter.base_url,
+                    "in_flight": e.in_flight,
+                    **e.stats,
+                    "breaker": e.breaker.snapshot(),
+                }
+                for e in self.endpoints
+            ],
+            "hedge_delay_ms": {k: self.hedge_delay_ms(k) for k in self.ttft.keys()},
+        }
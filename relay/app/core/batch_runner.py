@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+from app.core.logging import get_logger
+from app.core.scheduler import INTERACTIVE_LANES, Scheduler
+from app.core.settings import SchedulerBatch
+from app.db.batches import claim_jobs, finish_job, release_job, renew_leases, requeue_running_jobs
+from app.models.openai_chat import ChatCompletionsRequest
+from app.utils.cached_response import RawChatResponse
+
+log = get_logger(component="batch_runner")
+
+BatchHandler = Callable[..., Awaitable[RawChatResponse]]
+
+
+class BatchRunner:
+    """
+    Feeds durable batch jobs into the scheduler's batch lane, but only while interactive
+    load (running + queued short/long jobs) is below `utilization_threshold` of the workers.
+    The handler is the normal chat pipeline, so batch jobs share the exact/semantic caches.
+
+    Claimed jobs are leases: the runner renews its running jobs every `lease_s / 3`, and every
+    `lease_s` requeues running jobs nobody renewed (their relay process died). A job whose
+    result cannot be recorded is released back to pending.
+    """
+
+    def __init__(self, cfg: SchedulerBatch, scheduler: Scheduler, handler: BatchHandler):
+        self.cfg = cfg
+        self.scheduler = scheduler
+        self.handler = handler
+
+        self._in_flight: set[asyncio.Task[None]] = set()
+        self._running: set[tuple[str, int]] = set()  # (batch_id, line_no) held by this process
+        self._task: Optional[asyncio.Task[None]] = None
+        self._stop = asyncio.Event()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def free_slots(self) -> int:
+        budget = math.floor(self.cfg.utilization_threshold * self.scheduler.workers)
+        interactive = self.scheduler.busy(INTERACTIVE_LANES) + sum(
+            self.scheduler.lane_depth(lane) for lane in INTERACTIVE_LANES
+        )
+        slots = min(budget - interactive, int(self.cfg.max_in_flight)) - self.in_flight
+        return max(0, slots)
+
+    async def _requeue_orphans(self) -> None:
+        try:
+            n = await requeue_running_jobs(lease_s=int(self.cfg.lease_s))
+            if n:
+                log.info("batch_jobs_requeued", count=n)
+        except Exception as e:
+            log.warning("batch_requeue_failed", error=str(e))
+
+    async def _renew(self) -> None:
+        try:
+            await renew_leases(sorted(self._running))
+        except Exception as e:
+            # a missed renewal is fine unless they keep failing for a whole lease
+            log.warning("batch_lease_renew_failed", count=len(self._running), error=str(e))
+
+    async def _loop(self) -> None:
+        lease_s = int(self.cfg.lease_s)
+        next_requeue = next_renew = time.monotonic()
+        poll_s = max(0.01, int(self.cfg.poll_interval_ms) / 1000.0)
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_renew:
+                await self._renew()
+                next_renew = now + lease_s / 3
+            if now >= next_requeue:
+                await self._requeue_orphans()
+                next_requeue = now + lease_s
+            slots = self.free_slots()
+            if slots > 0:
+                try:
+                    jobs = await claim_jobs(slots)
+                except Exception as e:
+                    log.warning("batch_claim_failed", error=str(e))
+                    jobs = []
+                for job in jobs:
+                    t = asyncio.create_task(self._run_job(job))
+                    self._in_flight.add(t)
+                    t.add_done_callback(self._in_flight.discard)
+            await asyncio.sleep(poll_s)
+
+    async def _run_job(self, job: dict[str, Any]) -> None:
+        key = (str(job["batch_id"]), int(job["line_no"]))
+        self._running.add(key)
+        try:
+            await self._execute(job)
+        finally:
+            self._running.discard(key)
+
+    async def _finish(self, *, attempts: int, **result: Any) -> None:
+        try:
+            await finish_job(**result)
+        except Exception as e:
+            # back to pending for another attempt; if that fails too, the lease runs out
+            log.warning("batch_job_finish_failed", batch_id=result["batch_id"], line_no=result["line_no"], error=str(e))
+            try:
+                await release_job(batch_id=result["batch_id"], line_no=result["line_no"], attempts=attempts)
+            except Exception as e2:
+                log.warning("batch_job_release_failed", batch_id=result["batch_id"], line_no=result["line_no"], error=str(e2))
+
+    async def _execute(self, job: dict[str, Any]) -> None:
+        batch_id = str(job["batch_id"])
+        line_no = int(job["line_no"])
+        custom_id = job.get("custom_id")
+        attempts = int(job["attempts"])
+
+        try:
+            req = ChatCompletionsRequest.model_validate(job["request_json"])
+            resp = await self.handler(req, tenant_id=str(job["tenant_id"]))
+        except HTTPException as e:
+            retryable = e.status_code in (429, 503)
+            if retryable and attempts < int(self.cfg.max_attempts):
+                await release_job(batch_id=batch_id, line_no=line_no, attempts=attempts)
+                return
+            await self._finish(
+                attempts=attempts,
+                batch_id=batch_id,
+                line_no=line_no,
+                ok=False,
+                status_code=e.status_code,
+                request_id=None,
+                response_body=None,
+                error_obj={"type": "http_error", "detail": e.detail},
+            )
+            return
+        except Exception as e:
+            log.warning("batch_job_failed", batch_id=batch_id, line_no=line_no, custom_id=custom_id, error=str(e))
+            await self._finish(
+                attempts=attempts,
+                batch_id=batch_id,
+                line_no=line_no,
+                ok=False,
+                status_code=500,
+                request_id=None,
+                response_body=None,
+                error_obj={"type": type(e).__name__, "detail": str(e)},
+            )
+            return
+
+        await self._finish(
+            attempts=attempts,
+            batch_id=batch_id,
+            line_no=line_no,
+            ok=True,
+            status_code=200,
+            request_id=resp.id,
+            response_body=resp.body,
+            error_obj=None,
+        )
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+# Which answers are worth an exact-cache entry. Most prompts are asked once; storing them
+# costs Redis memory that then evicts the entries that do get hit. TinyLFU's idea: keep an
+# approximate frequency of every key seen (a count-min sketch, a few bytes per slot no matter
+# how many keys) and only admit keys that have been seen before. Redis itself evicts, so
+# instead of TinyLFU's candidate-vs-victim duel this is its doorkeeper half: a frequency floor.
+
+_DEPTH = 4
+_MAX_COUNT = 15  # 4-bit counters as in TinyLFU: beyond this, "hot" is all we need to know
+
+
+class FrequencySketch:
+    """
+    Count-min sketch over string keys with periodic aging: after `sample_size` increments every
+    counter is halved, so a prompt that was hot yesterday does not stay admitted forever.
+    Not shared across processes; each relay process learns from the traffic it sees.
+    """
+
+    def __init__(self, *, width: int, sample_size: Optional[int] = None):
+        self.width = 1 << max(4, (width - 1).bit_length())  # power of two: index with a mask
+        self._mask = self.width - 1
+        # bytearrays: per-key reads and writes are plain indexing, ~10x cheaper than numpy scalars
+        self._rows = [bytearray(self.width) for _ in range(_DEPTH)]
+        self.sample_size = sample_size or 10 * self.width
+        self.additions = 0
+        self.resets = 0
+
+    def _slots(self, key: str) -> list[int]:
+        # one 16-byte hash, cut into a 32-bit index per row
+        d = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        return [int.from_bytes(d[4 * i : 4 * i + 4], "little") & self._mask for i in range(_DEPTH)]
+
+    def estimate(self, key: str) -> int:
+        return min(row[s] for row, s in zip(self._rows, self._slots(key)))
+
+    def increment(self, key: str) -> int:
+        """Count one occurrence; returns the new estimate (conservative update: only the minima grow)."""
+        slots = self._slots(key)
+        counts = [row[s] for row, s in zip(self._rows, slots)]
+        est = min(counts)
+        if est < _MAX_COUNT:
+            for row, s, c in zip(self._rows, slots, counts):
+                if c == est:
+                    row[s] = est + 1
+            est += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            for row in self._rows:
+                view = np.frombuffer(row, dtype=np.uint8)
+                np.right_shift(view, 1, out=view)
+            self.additions //= 2
+            self.resets += 1
+        return est
+
+
+class ExactCacheAdmission:
+    """Frequency floor for exact-cache writes: a key is stored once it has been requested `min_hits` times."""
+
+    def __init__(self, *, min_hits: int, width: int):
+        self.min_hits = min_hits
+        self.sketch = FrequencySketch(width=width)
+        self.admitted = 0
+        self.rejected = 0
+
+    def record(self, key: str) -> int:
+        """Count a lookup of `key`; returns how often it has been seen (approximately)."""
+        return self.sketch.increment(key)
+
+    def admit(self, seen: int) -> bool:
+        ok = seen >= self.min_hits
+        if ok:
+            self.admitted += 1
+        else:
+            self.rejected += 1
+        return ok
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "min_hits": self.min_hits,
+            "width": self.sketch.width,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "resets": self.sketch.resets,
+        }
+
+
+def _budget_key(tenant_id: str, bucket: int) -> str:
+    return f"exact_bytes:{tenant_id}:{bucket}"
+
+
+async def reserve_tenant_bytes(redis: Any, *, tenant_id: str, nbytes: int, budget: int, window_s: int) -> bool:
+    """
+    Charge `nbytes` of exact-cache writes to the tenant unless that takes it over `budget`.
+    Entries live for `window_s` (the hard TTL), so what a tenant holds is about what it wrote
+    in the last window: a sliding-window counter over two fixed Redis buckets, the previous
+    one weighted by how much of it is still inside the window. Overwrites count twice, so
+    the estimate errs high, i.e. on the side of the budget.
+    """
+    now = time.time()
+    bucket = int(now // window_s)
+    cur, prev = await redis.mget(_budget_key(tenant_id, bucket), _budget_key(tenant_id, bucket - 1))
+    elapsed = (now % window_s) / window_s
+    held = int(cur or 0) + int(prev or 0) * (1.0 - elapsed)
+    if held + nbytes > budget:
+        return False
+    key = _budget_key(tenant_id, bucket)
+    await redis.incrby(key, nbytes)
+    await redis.expire(key, 2 * window_s)
+    return True
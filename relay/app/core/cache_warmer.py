@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+
+from app.core.cache_admission import reserve_tenant_bytes
+from app.core.embeddings import embed_text
+from app.core.logging import get_logger
+from app.core.policy_engine import build_plan, plan_dict
+from app.core.settings import PolicyConfig, settings
+from app.db.redis_client import get_redis
+from app.db.semantic_cache_pg import semantic_has_entry, semantic_store
+from app.db.traces_read import top_requests
+from app.models.openai_chat import ChatCompletionsRequest
+from app.utils.cache_keys import cache_signature, exact_cache_key
+from app.utils.cached_response import IDENTITY, BodyCodec, RawChatResponse, cacheable_body, encode_entry, reusable_for
+from app.utils.normalize import normalize_messages
+
+log = get_logger(component="cache_warmer")
+
+# policy_version the caches were last warmed for; gone after a Redis flush, stale after a rollout
+MARKER_KEY = "cache_warm:policy_version"
+LOCK_KEY = "cache_warm:lock"
+
+WarmHandler = Callable[[ChatCompletionsRequest, str], Awaitable[RawChatResponse]]
+
+
+@dataclass(frozen=True)
+class WarmCandidate:
+    tenant_id: str
+    request: ChatCompletionsRequest
+    hits: int = 0
+    # from the latest trace of this request, when it kept the payload
+    response_json: Optional[bytes] = None
+    plan_json: Optional[bytes] = None
+    backend_latency_ms: int = 0
+
+
+def _candidate_from_trace(row: dict[str, Any]) -> WarmCandidate:
+    response = row.get("response_json")
+    return WarmCandidate(
+        tenant_id=row["tenant_id"],
+        request=ChatCompletionsRequest.model_validate_json(row["request_json"]),
+        hits=int(row.get("hits") or 0),
+        response_json=response.encode("utf-8") if response and response != "null" else None,
+        plan_json=row["plan_json"].encode("utf-8") if row.get("plan_json") else None,
+        backend_latency_ms=int(row.get("backend_latency_ms") or 0),
+    )
+
+
+def load_candidates_file(path: str) -> list[WarmCandidate]:
+    """JSONL lines of {"tenant_id": ..., "request": <chat completion request>} (tenant defaults to "default")."""
+    out: list[WarmCandidate] = []
+    for line in Path(path).read_text().splitlines():
+        if not line.strip():
+            continue
+        obj = orjson.loads(line)
+        out.append(
+            WarmCandidate(
+                tenant_id=obj.get("tenant_id") or "default",
+                request=ChatCompletionsRequest.model_validate(obj["request"]),
+            )
+        )
+    return out
+
+
+class CacheWarmer:
+    """
+    Refills the exact and semantic caches with the most requested prompts per tenant after a
+    deploy, a policy rollout or a Redis flush, before users have to miss on them.
+
+    Every `check_s` it compares MARKER_KEY in Redis with the current policy_version; a mismatch
+    (or no marker) starts a warm run under a Redis lock, so one relay process does it. Per
+    candidate, in order of popularity:
+      - already in the exact cache under the current cache signature: nothing to do;
+      - the latest trace's plan hashes to the current signature (nothing that shapes the answer
+        changed) and kept a response that fits the current budget: the entry is restored from
+        the trace, no backend call;
+      - otherwise the request is replayed through the pipeline's warm path on the batch lane,
+        which only runs on idle workers: no cache lookups (so no hit/miss counters and no
+        admission-filter sightings), a backend generation stored in both caches.
+    Only generated answers are restored or stored: a trace served from the semantic cache is
+    not the answer to its own prompt. The semantic cache gets an entry too when the tenant's
+    plan has it on. Exact entries skip the admission filter (these requests are popular by
+    construction) but not the tenant's byte budget.
+    """
+
+    def __init__(self, handler: WarmHandler, *, check_s: int, concurrency: int, codec: BodyCodec = IDENTITY):
+        self.handler = handler
+        self.check_s = check_s
+        self.concurrency = max(1, concurrency)
+        self.codec = codec
+        self._task: Optional[asyncio.Task[None]] = None
+        self._force = asyncio.Event()
+        self.state: dict[str, Any] = {"status": "idle"}
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def trigger(self) -> None:
+        """Warm on the next check even if the marker says the caches are current."""
+        self._force.set()
+
+    def snapshot(self) -> dict[str, Any]:
+        return dict(self.state)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                log.warning("cache_warm_failed", error=str(e) or type(e).__name__)
+                self.state.update({"status": "failed", "error": str(e) or type(e).__name__})
+            try:
+                await asyncio.wait_for(self._force.wait(), timeout=self.check_s)
+            except TimeoutError:
+                pass
+
+    async def check_once(self) -> bool:
+        """Run a warm pass if the caches are not warm for the current policy; True if one ran."""
+        policy = settings.load_policy()
+        redis = get_redis()
+        marker = await redis.get(MARKER_KEY)
+        current = policy.policy_version.encode("utf-8")
+        if not self._force.is_set() and marker == current:
+            return False
+        self._force.clear()
+        if not await redis.set(LOCK_KEY, b"1", nx=True, ex=3600):
+            return False  # another process is warming
+        try:
+            await self.run(policy)
+            await redis.set(MARKER_KEY, current)
+        finally:
+            await redis.delete(LOCK_KEY)
+        return True
+
+    async def candidates(self) -> tuple[str, list[WarmCandidate]]:
+        if settings.cache_warm_file:
+            return settings.cache_warm_file, load_candidates_file(settings.cache_warm_file)
+        since = datetime.now(timezone.utc) - timedelta(hours=settings.cache_warm_lookback_hours)
+        rows = await top_requests(since=since, per_tenant=settings.cache_warm_top_n)
+        return "request_traces", [_candidate_from_trace(r) for r in rows]
+
+    async def run(self, policy: PolicyConfig) -> dict[str, Any]:
+        source, cands = await self.candidates()
+        counts = {"already_warm": 0, "restored": 0, "replayed": 0, "semantic_stored": 0, "over_budget": 0, "failed": 0}
+        self.state = {
+            "status": "running",
+            "policy_version": policy.policy_version,
+            "source": source,
+            "started_at": time.time(),
+            "candidates": len(cands),
+            "done": 0,
+            **counts,
+        }
+        log.info("cache_warm_started", policy_version=policy.policy_version, source=source, candidates=len(cands))
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(cand: WarmCandidate) -> None:
+            async with sem:
+                try:
+                    for outcome in await self.warm_one(policy, cand):
+                        self.state[outcome] += 1
+                except Exception as e:
+                    self.state["failed"] += 1
+                    log.warning("cache_warm_request_failed", tenant_id=cand.tenant_id, error=str(e) or type(e).__name__)
+                self.state["done"] += 1
+
+        await asyncio.gather(*(one(c) for c in cands))
+        self.state.update({"status": "done", "finished_at": time.time()})
+        log.info("cache_warm_finished", **{k: self.state[k] for k in ("candidates", *counts)})
+        return self.state
+
+    async def warm_one(self, policy: PolicyConfig, cand: WarmCandidate) -> list[str]:
+        tenant_policy = policy.tenants.get(cand.tenant_id, policy.tenants["default"])
+        normalized = normalize_messages(cand.request.messages, tenant_policy.normalize)
+        plan_obj, _ = build_plan(
+            policy=policy,
+            tenant_id=cand.tenant_id,
+            prompt_chars=len(normalized.canonical_text),
+            override_temperature=cand.request.temperature,
+            override_max_tokens=cand.request.max_tokens,
+        )
+        plan = plan_dict(plan_obj)
+        sig = cache_signature(plan)
+        redis = get_redis()
+        key = exact_cache_key(tenant_id=cand.tenant_id, request_hash=normalized.request_hash, plan_sig=sig)
+        exact_on = bool(plan["cache"].get("exact_enabled", True))
+        sem_cfg = plan["cache"].get("semantic", {})
+        if not exact_on and not sem_cfg.get("enabled", False):
+            return []  # nothing would be cached
+        if exact_on and await redis.get(key) is not None:
+            return ["already_warm"]
+
+        traced = orjson.loads(cand.response_json) if cand.response_json is not None else None
+        traced_plan = orjson.loads(cand.plan_json) if cand.plan_json is not None else None
+        traced_finish = ((traced or {}).get("choices") or [{}])[0].get("finish_reason")
+        traced_max_tokens = int((traced_plan or {}).get("max_tokens") or plan_obj.max_tokens)
+        if (
+            traced is None
+            or traced_plan is None
+            or cache_signature(traced_plan) != sig
+            or not reusable_for(
+                finish_reason=traced_finish,
+                completion_tokens=int((traced.get("usage") or {}).get("completion_tokens") or 0),
+                max_tokens=plan_obj.max_tokens,
+                generated_max_tokens=traced_max_tokens,
+            )
+        ):
+            # regenerated on the batch lane; the pipeline's warm path fills both caches itself
+            await self.handler(cand.request, cand.tenant_id)
+            return ["replayed"]
+
+        body = cacheable_body(traced)
+        usage = traced.get("usage") or {}
+        outcomes = ["restored"]
+        # semantic entries do not record the budget an unknown finish needs (see reusable_for)
+        if sem_cfg.get("enabled", False) and traced_finish is not None and not await semantic_has_entry(
+            tenant_id=cand.tenant_id, plan_sig=sig, request_hash=normalized.request_hash
+        ):
+            await semantic_store(
+                tenant_id=cand.tenant_id,
+                plan_sig=sig,
+                request_hash=normalized.request_hash,
+                prompt_text=normalized.canonical_text,
+                embedding=embed_text(normalized.canonical_text),
+                response_body=body,
+                ttl_seconds=int(sem_cfg.get("ttl_seconds", 1800)),
+            )
+            outcomes.append("semantic_stored")
+
+        if exact_on:
+            entry = encode_entry(
+                body,
+                prompt_tokens=int(usage.get("prompt_tokens") or 0),
+                completion_tokens=int(usage.get("completion_tokens") or 0),
+                total_tokens=int(usage.get("total_tokens") or 0),
+                fresh_until=time.time() + settings.exact_cache_ttl_seconds,
+                compute_ms=cand.backend_latency_ms,  # the traced generation's, so XFetch refreshes it early
+                max_tokens=traced_max_tokens,
+                finish_reason=traced_finish,
+                codec=self.codec,
+            )
+            hard_ttl = settings.exact_cache_ttl_seconds + settings.exact_cache_stale_seconds
+            budget = plan["cache"].get("exact_max_bytes")
+            if budget is not None and not await reserve_tenant_bytes(
+                redis, tenant_id=cand.tenant_id, nbytes=len(key) + len(entry), budget=int(budget), window_s=hard_ttl
+            ):
+                outcomes.append("over_budget")
+                return outcomes
+            await redis.setex(key, hard_ttl, entry)
+        return outcomes
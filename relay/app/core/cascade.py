@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import time
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.backend import GenerationResult
+from app.core.logging import get_logger
+from app.core.settings import CascadeConfig
+
+log = get_logger(component="cascade")
+
+
+def escalation_reason(result: GenerationResult, checks: CascadeConfig) -> Optional[str]:
+    """Why a cheap tier's answer should not be trusted, or None to keep it."""
+    text = result.text.strip()
+    if len(text) < checks.min_completion_chars:
+        return f"short_answer({len(text)} chars)"
+    meta = result.backend_meta or {}
+    if checks.escalate_on_truncation and meta.get("done_reason") == "length":
+        return "truncated"
+    head = text[: checks.refusal_scan_chars].lower()
+    for pattern in checks.refusal_patterns:
+        if pattern in head:
+            return f"refusal({pattern!r})"
+    avg_logprob = meta.get("avg_logprob")
+    if checks.min_avg_logprob is not None and avg_logprob is not None and avg_logprob < checks.min_avg_logprob:
+        return f"low_logprob({avg_logprob:.2f})"
+    return None
+
+
+async def run_cascade(
+    tiers: tuple[str, ...],
+    generate: Callable[[str], Awaitable[GenerationResult]],
+    checks: CascadeConfig,
+    decision_trace: dict[str, Any],
+) -> GenerationResult:
+    """
+    Answer with each tier in turn until one passes the checks (the last tier always answers).
+    A backend error on a non-final tier escalates too. Every step is recorded in
+    decision_trace["cascade"], and every escalation also gets a line in decision_trace["reasons"].
+    The result's backend latency covers all steps (they all held the worker); its usage is the
+    served answer's, with per-step token counts in the trace.
+    """
+    steps: list[dict[str, Any]] = []
+    decision_trace["cascade"] = steps
+    t0 = time.perf_counter()
+    reason: Optional[str]
+    for i, tier in enumerate(tiers):
+        last = i == len(tiers) - 1
+        try:
+            result = await generate(tier)
+        except Exception as e:
+            if last:
+                raise
+            reason = f"error({type(e).__name__})"
+            steps.append({"tier": tier, "escalated": reason})
+        else:
+            reason = None if last else escalation_reason(result, checks)
+            steps.append(
+                {
+                    "tier": tier,
+                    "model": (result.backend_meta or {}).get("model"),
+                    "latency_ms": result.backend_latency_ms,
+                    "prompt_tokens": result.prompt_tokens,
+                    "completion_tokens": result.completion_tokens,
+                    "escalated": reason,
+                }
+            )
+            if reason is None:
+                return replace(
+                    result,
+                    backend_latency_ms=int((time.perf_counter() - t0) * 1000),
+                    backend_meta={**(result.backend_meta or {}), "tier": tier},
+                )
+        decision_trace["reasons"].append(f"cascade escalated {tier} -> {tiers[i + 1]}: {reason}")
+        log.info("cascade_escalated", tier=tier, next_tier=tiers[i + 1], reason=reason)
+    raise AssertionError("unreachable: the last tier either returns or raises")
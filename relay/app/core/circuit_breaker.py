@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Callable
+
+from app.core.settings import BackendCircuitBreaker
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker over the last `window` calls. It opens when, with at least `min_calls`
+    in the window, the error rate reaches `error_rate` or the share of calls whose TTFT exceeded
+    `slow_call_ms` reaches `slow_call_rate`. While open, the endpoint gets no traffic. After
+    `open_s` (doubling on each consecutive trip, capped at `max_open_s`) it goes half-open and
+    lets `half_open_probes` calls through: a success closes it, a failure re-opens it.
+    """
+
+    def __init__(self, cfg: BackendCircuitBreaker, *, clock: Callable[[], float] = time.monotonic):
+        self.cfg = cfg
+        self._clock = clock
+        self._state = CLOSED
+        self._calls: deque[tuple[bool, bool]] = deque(maxlen=max(1, cfg.window))  # (failed, slow)
+        self._opened_at = 0.0
+        self._open_for = cfg.open_s
+        self._trips = 0
+        self._probes = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self._open_for:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def retry_after_s(self) -> float:
+        """Seconds until an open breaker lets a probe through (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._open_for - (self._clock() - self._opened_at))
+
+    def can_send(self) -> bool:
+        if not self.cfg.enabled:
+            return True
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            return self._probes < self.cfg.half_open_probes
+        return False
+
+    def on_send(self) -> bool:
+        """Call when a request is actually sent; returns True if it is a half-open probe."""
+        if self.cfg.enabled and self.state == HALF_OPEN:
+            self._probes += 1
+            return True
+        return False
+
+    def on_cancel(self, probe: bool) -> None:
+        # a cancelled hedge loser says nothing about the endpoint; just free its probe slot
+        if probe and self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def on_success(self, *, ttft_ms: float | None, probe: bool) -> None:
+        slow = ttft_ms is not None and ttft_ms > self.cfg.slow_call_ms
+        if probe and self._state == HALF_OPEN:
+            if slow:
+                self._trip()
+            else:
+                self._close()
+            return
+        self._record(failed=False, slow=slow)
+
+    def on_failure(self, *, probe: bool) -> None:
+        if probe and self._state == HALF_OPEN:
+            self._trip()
+            return
+        self._record(failed=True, slow=False)
+
+    def _record(self, *, failed: bool, slow: bool) -> None:
+        if not self.cfg.enabled or self._state != CLOSED:
+            return
+        self._calls.append((failed, slow))
+        n = len(self._calls)
+        if n < self.cfg.min_calls:
+            return
+        errors = sum(1 for f, _ in self._calls if f)
+        slow_calls = sum(1 for _, s in self._calls if s)
+        if errors / n >= self.cfg.error_rate or slow_calls / n >= self.cfg.slow_call_rate:
+            self._trip()
+
+    def _trip(self) -> None:
+        # consecutive trips (probe failed again) back off exponentially
+        self._open_for = min(self.cfg.max_open_s, self.cfg.open_s * (2 ** self._trips))
+        self._trips += 1
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probes = 0
+        self._calls.clear()
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._trips = 0
+        self._probes = 0
+        self._calls.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        failed = sum(1 for f, _ in self._calls if f)
+        return {
+            "state": self.state,
+            "window_calls": len(self._calls),
+            "window_errors": failed,
+            "retry_after_s": round(self.retry_after_s(), 2),
+            "consecutive_trips": self._trips,
+        }
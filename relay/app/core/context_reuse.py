@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from app.models.openai_chat import ChatMessage
+
+# Ollama's /api/generate returns `context`: the token ids of the prompt it evaluated plus the
+# answer. Sending it back with only the next turn's text lets the server skip re-tokenizing the
+# history and, on the same endpoint, reuse the KV cache for that prefix. We keep one entry per
+# conversation state (tenant + model + every message so far, including the answer we served).
+
+_MAGIC = b"k1"
+
+
+@dataclass(frozen=True)
+class ContextEntry:
+    base_url: str  # endpoint that produced it: its KV cache holds this prefix
+    tokens: list[int]
+
+
+@dataclass(frozen=True)
+class ContinuedTurn:
+    prefix_hash: str  # conversation state the stored context belongs to
+    prefix_messages: int
+    new_messages: tuple[ChatMessage, ...]
+
+
+def conversation_hash(messages: Sequence[ChatMessage]) -> str:
+    # same canonical form as app.utils.normalize (messages there are already stripped)
+    text = "\n".join(f"{m.role}:{m.content}" for m in messages)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_continued_turn(messages: Sequence[ChatMessage]) -> Optional[ContinuedTurn]:
+    """Split at the last assistant message; None unless there are new messages after it."""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].role == "assistant":
+            if i == len(messages) - 1:
+                return None
+            return ContinuedTurn(
+                prefix_hash=conversation_hash(messages[: i + 1]),
+                prefix_messages=i + 1,
+                new_messages=tuple(messages[i + 1 :]),
+            )
+    return None
+
+
+def context_key(*, tenant_id: str, model: str, conversation_hash: str) -> str:
+    return f"ctx:{tenant_id}:{model}:{conversation_hash}"
+
+
+def encode_context(entry: ContextEntry) -> bytes:
+    # int32 ids: ~4 bytes/token instead of ~6-7 as JSON
+    return _MAGIC + b" " + entry.base_url.encode("utf-8") + b"\n" + array("i", entry.tokens).tobytes()
+
+
+def decode_context(raw: bytes) -> Optional[ContextEntry]:
+    head, nl, body = raw.partition(b"\n")
+    magic, _, url = head.partition(b" ")
+    if not nl or magic != _MAGIC or len(body) % 4:
+        return None
+    tokens = array("i")
+    tokens.frombytes(body)
+    return ContextEntry(base_url=url.decode("utf-8"), tokens=tokens.tolist())
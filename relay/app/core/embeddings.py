@@ -1,4 +1,5 @@
 from __future__ import annotations
+import numpy as np
 from fastembed import TextEmbedding
 from app.core.settings import settings
 _embedder:TextEmbedding | None=None
@@ -10,6 +11,20 @@ def get_embedder() -> TextEmbedding:
         _embedder = TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
     return _embedder
 
-def embed_text(text:str)->list[float]:
+def embed_text(text:str)->np.ndarray:
     vecs = list(get_embedder().embed([text]))
-    return vecs[0].tolist()
+    return vecs[0].astype(np.float32, copy=False)
+
+def embed_texts(texts:list[str], *, batch_size:int=256)->np.ndarray:
+    """Embed many texts in one call: float32 array of shape (len(texts), dim), input order kept."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vecs = get_embedder().embed(texts, batch_size=batch_size)
+    return np.vstack(list(vecs)).astype(np.float32, copy=False)
+
+def cosine_rows(a:np.ndarray, b:np.ndarray)->np.ndarray:
+    """Row-wise cosine similarity of two (n, dim) arrays; 0.0 where either row is all zeros."""
+    dots = np.einsum("ij,ij->i", a, b)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    sims = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+    return np.clip(sims, -1.0, 1.0)  # float32 rounding can land just outside
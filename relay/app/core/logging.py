@@ -30,4 +30,6 @@ def configure_logging(level: str = "info") -> None:
 
 
 def get_logger(**kwargs: Any) -> structlog.BoundLogger:
-    return structlog.get_logger().bind(**kwargs)
+    # lazy: module-level loggers are created at import, before configure_logging runs, and
+    # must still pick up its level and renderer on first use
+    return structlog.get_logger(**kwargs)
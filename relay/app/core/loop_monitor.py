@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Optional
+
+from app.core.logging import get_logger
+
+log = get_logger(component="loop_monitor")
+
+# upper bounds (ms) of the lag histogram buckets; the last bucket is +inf
+LAG_BUCKETS_MS: tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class LagHistogram:
+    def __init__(self, bounds: tuple[float, ...] = LAG_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.n = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.n += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th sample (coarse but allocation free)."""
+        if self.n == 0:
+            return 0.0
+        rank = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return float(self.bounds[i]) if i < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> dict[str, Any]:
+        labels = [f"le_{b:g}" for b in self.bounds] + ["le_inf"]
+        return {
+            "n": self.n,
+            "mean_ms": (self.sum_ms / self.n) if self.n else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.quantile(0.50),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag by scheduling a sleep every `interval_ms` and recording how late it
+    wakes up. A watchdog thread watches the same heartbeat: if the loop has not ticked for
+    `slow_ms`, it grabs the loop thread's current stack, so the log shows *what* is blocking
+    (ONNX embedding, a big orjson dump, ...) rather than just that something did.
+    """
+
+    def __init__(self, *, interval_ms: int, slow_ms: int):
+        self.interval_s = interval_ms / 1000.0
+        self.slow_s = slow_ms / 1000.0
+        self.histogram = LagHistogram()
+        self.stalls = 0
+
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._task = asyncio.create_task(self._tick_loop())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _tick_loop(self) -> None:
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            now = time.perf_counter()
+            self._heartbeat = now
+            self.histogram.observe(max(0.0, (now - start - self.interval_s) * 1000.0))
+
+    def _watch(self) -> None:
+        reported_for: float | None = None
+        while not self._stop.wait(self.interval_s):
+            hb = self._heartbeat
+            blocked_s = time.perf_counter() - hb
+            if blocked_s < self.slow_s + self.interval_s or reported_for == hb:
+                continue
+            # one report per stall; the heartbeat moves on once the loop recovers
+            reported_for = hb
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else None
+            log.warning("event_loop_blocked", blocked_ms=int(blocked_s * 1000), stack=stack)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "interval_ms": int(self.interval_s * 1000),
+            "slow_ms": int(self.slow_s * 1000),
+            "stalls": self.stalls,
+            "lag": self.histogram.snapshot(),
+        }
@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import time
 from dataclasses import dataclass
+from typing import Any, Optional
 
 import httpx
+import orjson
 
-from app.core.backend import GenerationResult
+from app.core.backend import BackendTimeoutError, BackendTimeouts, GenerationResult
+
+
+class OllamaError(RuntimeError):
+    """Error reported inside an Ollama stream (the HTTP status is already 200 by then)."""
 
 
 @dataclass(frozen=True)
 class OllamaAdapter:
     base_url: str
     name: str = "ollama"
+    # shared keep-alive client (see app/core/backend_pool.py); None opens one per call
+    client: Optional[httpx.AsyncClient] = None
 
     async def generate(
         self,
@@ -20,27 +29,46 @@ class OllamaAdapter:
         prompt: str,
         temperature: float,
         max_tokens: int,
+        first_token: Optional[asyncio.Event] = None,
+        timeouts: Optional[BackendTimeouts] = None,
+        logprobs: bool = False,
+        context: Optional[list[int]] = None,
     ) -> GenerationResult:
+        """
+        Streams /api/generate so time-to-first-token is observable: `first_token` is set as soon
+        as the first chunk arrives (the hedging trigger) and backend_ttft_ms is filled in.
+        `timeouts` bounds connect, first token and the whole call separately (BackendTimeoutError
+        says which one fired); without it the client's flat timeout applies. `logprobs` asks for
+        token logprobs (newer Ollama) and reports their mean as backend_meta["avg_logprob"];
+        servers that ignore the option just leave it out. `context` continues a previous
+        generation (see app/core/context_reuse.py); the returned one is in backend_context.
+        Cancelling the call closes the connection, which makes Ollama abort the generation.
+        """
         t0 = time.perf_counter()
 
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens,
             },
         }
+        if logprobs:
+            payload["logprobs"] = True
+        if context:
+            payload["context"] = context
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            r = await client.post(f"{self.base_url}/api/generate", json=payload)
-            r.raise_for_status()
-            data = r.json()
+        if self.client is not None:
+            data, parts, ttft_ms, lps = await self._stream(self.client, payload, t0, first_token, timeouts)
+        else:
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                data, parts, ttft_ms, lps = await self._stream(client, payload, t0, first_token, timeouts)
 
         latency_ms = int((time.perf_counter() - t0) * 1000)
 
-        text = (data.get("response") or "").strip()
+        text = "".join(parts).strip()
 
         prompt_tokens = data.get("prompt_eval_count")
         completion_tokens = data.get("eval_count")
@@ -54,7 +82,66 @@ class OllamaAdapter:
             completion_tokens=completion_tokens if isinstance(completion_tokens, int) else None,
             total_tokens=total_tokens,
             backend_latency_ms=latency_ms,
-            backend_ttft_ms=None,
+            backend_ttft_ms=ttft_ms,
             backend_name=self.name,
-            backend_meta={"endpoint": "/api/generate"},
+            backend_context=data.get("context") if isinstance(data.get("context"), list) else None,
+            backend_meta={
+                "endpoint": "/api/generate",
+                "base_url": self.base_url,
+                "model": model,
+                "done_reason": data.get("done_reason"),
+                "avg_logprob": (sum(lps) / len(lps)) if lps else None,
+            },
         )
+
+    async def _stream(
+        self,
+        client: httpx.AsyncClient,
+        payload: dict[str, Any],
+        t0: float,
+        first_token: Optional[asyncio.Event],
+        timeouts: Optional[BackendTimeouts],
+    ) -> tuple[dict[str, Any], list[str], Optional[int], list[float]]:
+        parts: list[str] = []
+        lps: list[float] = []
+        ttft_ms: Optional[int] = None
+        data: dict[str, Any] = {}
+        loop_t0 = asyncio.get_running_loop().time()
+        http_timeout: Any = httpx.USE_CLIENT_DEFAULT
+        if timeouts is not None:
+            http_timeout = httpx.Timeout(timeouts.total_s, connect=timeouts.connect_s)
+        # first-byte deadline, moved out to the total deadline once the first token is in
+        deadline = asyncio.timeout_at(loop_t0 + timeouts.first_byte_s) if timeouts is not None else asyncio.timeout(None)
+        try:
+            async with deadline:
+                async with client.stream(
+                    "POST", f"{self.base_url}/api/generate", content=orjson.dumps(payload), timeout=http_timeout
+                ) as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line:
+                            continue
+                        data = orjson.loads(line)
+                        if "error" in data:
+                            raise OllamaError(str(data["error"]))
+                        if ttft_ms is None:
+                            ttft_ms = int((time.perf_counter() - t0) * 1000)
+                            if first_token is not None:
+                                first_token.set()
+                            if timeouts is not None:
+                                deadline.reschedule(loop_t0 + timeouts.total_s)
+                        parts.append(data.get("response") or "")
+                        for lp in data.get("logprobs") or ():
+                            if isinstance(lp, dict) and isinstance(lp.get("logprob"), (int, float)):
+                                lps.append(float(lp["logprob"]))
+                        if data.get("done"):
+                            break
+        except TimeoutError:
+            if timeouts is None:
+                raise
+            if ttft_ms is None:
+                raise BackendTimeoutError("first_byte", timeouts.first_byte_s) from None
+            raise BackendTimeoutError("total", timeouts.total_s) from None
+        except httpx.ConnectTimeout:
+            raise BackendTimeoutError("connect", timeouts.connect_s if timeouts is not None else 0.0) from None
+        return data, parts, ttft_ms, lps
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any
-from app.core.settings import PolicyConfig, TenantPolicy
+from app.core.settings import PolicyConfig, TenantPolicy, TierConfig, settings
 
 @dataclass(frozen = True)
 class ExecutionPlan : 
@@ -11,6 +11,9 @@ class ExecutionPlan :
     temperature: float
     cache : dict[str,Any]
     plan_name : str
+    model : str # what `tier` resolves to under the policy
+    cascade : tuple[str, ...] = () # tiers tried cheapest-first; empty = just `tier`
+    cascade_models : tuple[str, ...] = () # the model each cascade tier resolves to
 
 
 @dataclass(frozen=True)
@@ -35,6 +38,18 @@ def _pick_length_bucket(policy:PolicyConfig, prompt_chars : int) -> str:
     return 'long'
 
 
+_default_tiers : dict[str, TierConfig] = {}
+
+def resolve_tier(policy:PolicyConfig, tier:str) -> TierConfig:
+    ## tiers not mapped in the policy run on the deployment default model, on any endpoint
+    cfg = policy.tiers.get(tier)
+    if cfg is None:
+        cfg = _default_tiers.get(settings.ollama_model)
+        if cfg is None:
+            cfg = _default_tiers[settings.ollama_model] = TierConfig(model=settings.ollama_model)
+    return cfg
+
+
 def build_plan(*,policy: PolicyConfig, tenant_id : str, prompt_chars : int, override_temperature:float|None, override_max_tokens: int|None)-> tuple[ExecutionPlan, DecisionTrace]:
     ## becuase user can request for explicit temperature and max_token that means they can be overriden by defualt which we are getting from yaml
     tenant : TenantPolicy = policy.tenants.get(tenant_id, policy.tenants['default'])
@@ -47,21 +62,49 @@ def build_plan(*,policy: PolicyConfig, tenant_id : str, prompt_chars : int, over
 
     max_tokens = int(override_max_tokens) if override_max_tokens is not None else int(plan_cfg.get('max_tokens',256))
 
-    plan = ExecutionPlan(tier = str(plan_cfg.get('tier','standard')), 
+    cascade = tuple(str(t) for t in plan_cfg.get('cascade') or ())
+    if len(cascade) < 2:
+        cascade = ()
+    tier = str(cascade[-1] if cascade else plan_cfg.get('tier','standard'))
+    plan = ExecutionPlan(tier = tier,
         decoding_profile=str(plan_cfg.get("decoding_profile", "standard")),
         max_tokens=max_tokens,
         temperature=temperature,
         cache=tenant.caching.model_dump(),
-        plan_name=bucket,)
+        plan_name=bucket,
+        model=resolve_tier(policy, tier).model,
+        cascade=cascade,
+        cascade_models=tuple(resolve_tier(policy, t).model for t in cascade),)
     trace = DecisionTrace(
         reasons=[
             f"bucket={bucket} (prompt_chars={prompt_chars})",
             f"tenant={tenant_id}",
             "plan selected from policy.plans[bucket]",
+            (f"cascade {' -> '.join(cascade)}" if cascade
+             else f"tier={plan.tier} -> model {plan.model}"),
         ],
         bucket=bucket,
         tenant_id=tenant_id,
         policy_version=policy.policy_version,
     )
 
-    return plan, trace
\ No newline at end of file
+    return plan, trace
+
+
+def plan_dict(plan: ExecutionPlan) -> dict[str, Any]:
+    ## the plan as persisted in traces and hashed into cache keys (plan_signature); the resolved
+    ## model is in it so remapping a tier to another model does not serve the old model's answers
+    out : dict[str, Any] = {
+        "plan_name": plan.plan_name,
+        "tier": plan.tier,
+        "model": plan.model,
+        "decoding_profile": plan.decoding_profile,
+        "max_tokens": plan.max_tokens,
+        "temperature": plan.temperature,
+        "cache": plan.cache,
+    }
+    if plan.cascade:
+        # answers from a cascade are not interchangeable with single-tier ones
+        out["cascade"] = list(plan.cascade)
+        out["cascade_models"] = list(plan.cascade_models)
+    return out
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Iterator, Optional, Sequence
+
+from app.core.settings import BackendAffinity
+from app.models.openai_chat import ChatMessage
+
+
+def _h(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def prefix_key(messages: Sequence[ChatMessage], cfg: BackendAffinity) -> Optional[str]:
+    """
+    Hash of the leading `prefix_messages` normalized messages (same "role:content" lines the
+    prompt starts with), or None when that prefix is too short to be worth pinning.
+    """
+    text = "\n".join(f"{m.role}:{m.content}" for m in messages[: cfg.prefix_messages])[: cfg.prefix_chars]
+    if len(text) < cfg.min_prefix_chars:
+        return None
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class HashRing:
+    """
+    Consistent hashing over endpoint URLs with `vnodes` points each: adding or removing an
+    endpoint only moves the keys that hashed next to its points.
+    """
+
+    def __init__(self, nodes: Sequence[str], *, vnodes: int):
+        points = sorted((_h(f"{node}#{i}"), node) for node in dict.fromkeys(nodes) for i in range(max(1, vnodes)))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [n for _, n in points]
+        self._distinct = len(set(self._nodes))
+
+    def walk(self, key: str) -> Iterator[str]:
+        """Distinct nodes clockwise from the key's position: its home first, then fallbacks."""
+        if not self._nodes:
+            return
+        start = bisect.bisect(self._hashes, _h(key))
+        seen: set[str] = set()
+        for i in range(len(self._nodes)):
+            node = self._nodes[(start + i) % len(self._nodes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == self._distinct:
+                    return
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Optional
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+    names: list[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks(
+    *,
+    duration_s: float,
+    interval_s: float,
+    thread_ids: Optional[set[int]] = None,
+) -> Counter[str]:
+    """
+    Poor man's sampling profiler: every `interval_s` snapshot the Python stacks of the target
+    threads (default: every thread except this one) and count identical collapsed stacks.
+    Meant to run in a worker thread so the event loop keeps serving traffic while sampled.
+    Output keys are flamegraph.pl / speedscope "collapsed" stacks with thread name as root.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    counts: Counter[str] = Counter()
+
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline:
+        for tid, frame in sys._current_frames().items():
+            if tid == me or (thread_ids is not None and tid not in thread_ids):
+                continue
+            counts[f"{names.get(tid, tid)};{_collapse(frame)}"] += 1
+        time.sleep(interval_s)
+    return counts
+
+
+def render_collapsed(counts: Counter[str]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.core.logging import get_logger
+from app.db.trace_rollups import upsert_rollups
+
+log = get_logger(component="rollups")
+
+# must match the bounds inside relay_hist_quantile() in infra/postgres-init/004_trace_partitioning.sql
+LATENCY_BUCKETS_MS: tuple[int, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+
+def latency_bucket(ms: int) -> int:
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, ms)
+
+
+def hist_quantile(hist: list[int], q: float) -> Optional[int]:
+    """Upper bound of the bucket holding the q-th sample; None if empty or in the +inf bucket."""
+    total = sum(hist)
+    if total == 0:
+        return None
+    seen = 0
+    for i, c in enumerate(hist):
+        seen += c
+        if seen >= q * total:
+            return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+def summarize(rows: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """
+    Fold per-(tenant, cache outcome) rollup totals into one summary per tenant:
+    latency quantiles, exact/semantic hit rates and admission outcomes.
+    """
+    out: dict[str, dict[str, Any]] = {}
+    hists: dict[str, list[int]] = {}
+    for r in rows:
+        t = out.setdefault(
+            r["tenant_id"],
+            {"requests": 0, "errors": 0, "degraded": 0, "prompt_tokens": 0, "completion_tokens": 0,
+             "latency_sum_ms": 0, "outcomes": {}},
+        )
+        for k in ("requests", "errors", "degraded", "prompt_tokens", "completion_tokens", "latency_sum_ms"):
+            t[k] += int(r[k] or 0)
+        t["outcomes"][r["cache_outcome"]] = int(r["requests"] or 0)
+        h = hists.setdefault(r["tenant_id"], [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        for i, c in enumerate(r["latency_hist"] or []):
+            h[i] += int(c or 0)
+
+    for tenant, t in out.items():
+        n = t["requests"] or 1
+        outcomes = t["outcomes"]
+        t["exact_hit_rate"] = outcomes.get("exact_hit", 0) / n
+        # overload hits are semantic hits at the relaxed threshold
+        t["semantic_hit_rate"] = (outcomes.get("semantic_hit", 0) + outcomes.get("overload_hit", 0)) / n
+        t["admission"] = {
+            "served_from_cache": outcomes.get("overload_hit", 0),
+            "degraded": t["degraded"],
+            "rejected": outcomes.get("rejected", 0),
+            "queue_full": outcomes.get("queue_full", 0),
+            "backend_error": outcomes.get("backend_error", 0),
+        }
+        t["latency_ms"] = {
+            "mean": t.pop("latency_sum_ms") / n,
+            "p50": hist_quantile(hists[tenant], 0.50),
+            "p95": hist_quantile(hists[tenant], 0.95),
+            "p99": hist_quantile(hists[tenant], 0.99),
+        }
+    return out
+
+
+@dataclass
+class RollupCell:
+    requests: int = 0
+    errors: int = 0
+    degraded: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_sum_ms: int = 0
+    latency_hist: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+
+class TraceRollups:
+    """
+    In-process minute rollups per (tenant, lane, cache outcome). Recording is a dict update on
+    the request path; a background task upserts the accumulated cells every `flush_interval_s`,
+    adding counters and histograms to whatever other relay processes already wrote.
+    """
+
+    def __init__(self, *, flush_interval_s: float):
+        self.flush_interval_s = flush_interval_s
+        self._cells: dict[tuple[int, str, str, str], RollupCell] = {}
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def record(
+        self,
+        *,
+        created_at: float,
+        tenant_id: str,
+        lane: str | None,
+        cache_outcome: str,
+        status_code: int,
+        latency_ms: int,
+        degraded: bool,
+        prompt_tokens: int | None,
+        completion_tokens: int | None,
+    ) -> None:
+        minute = int(created_at // 60) * 60
+        key = (minute, tenant_id, lane or "none", cache_outcome)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = RollupCell()
+        cell.requests += 1
+        cell.errors += 1 if status_code >= 400 else 0
+        cell.degraded += 1 if degraded else 0
+        cell.prompt_tokens += prompt_tokens or 0
+        cell.completion_tokens += completion_tokens or 0
+        cell.latency_sum_ms += latency_ms
+        cell.latency_hist[latency_bucket(latency_ms)] += 1
+
+    def drain(self) -> list[dict[str, Any]]:
+        cells, self._cells = self._cells, {}
+        return [
+            {
+                "bucket_start": minute,
+                "tenant_id": tenant_id,
+                "lane": lane,
+                "cache_outcome": outcome,
+                "requests": c.requests,
+                "errors": c.errors,
+                "degraded": c.degraded,
+                "prompt_tokens": c.prompt_tokens,
+                "completion_tokens": c.completion_tokens,
+                "latency_sum_ms": c.latency_sum_ms,
+                "latency_hist": c.latency_hist,
+            }
+            for (minute, tenant_id, lane, outcome), c in cells.items()
+        ]
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self) -> None:
+        rows = self.drain()
+        if not rows:
+            return
+        try:
+            await upsert_rollups(rows)
+        except Exception as e:
+            # rollups are best effort; never let them back up into memory
+            log.warning("rollup_flush_failed", rows=len(rows), error=str(e))
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            await self.flush()
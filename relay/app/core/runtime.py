@@ -1,9 +1,25 @@
 from __future__ import annotations
 from typing import Optional
+from app.core.backend_pool import BackendPool
+from app.core.batch_runner import BatchHandler, BatchRunner
+from app.core.cache_admission import ExactCacheAdmission
+from app.core.cache_warmer import CacheWarmer, WarmHandler
+from app.core.loop_monitor import LoopLagMonitor
+from app.core.rollups import TraceRollups
 from app.core.scheduler import Scheduler
-from app.core.settings import PolicyConfig 
+from app.core.settings import PolicyConfig
+from app.core.sim_backend import SimConfig, SimulatedBackend
+from app.utils.cached_response import IDENTITY, BodyCodec
 
 _scheduler : Optional[Scheduler] = None
+_batch_runner : Optional[BatchRunner] = None
+_loop_monitor : Optional[LoopLagMonitor] = None
+_cache_warmer : Optional[CacheWarmer] = None
+_rollups : Optional[TraceRollups] = None
+_sim_backend : Optional[SimulatedBackend] = None
+_backend_pool : Optional[BackendPool] = None
+_body_codec : BodyCodec = IDENTITY
+_cache_admission : Optional[ExactCacheAdmission] = None
 
 def init_scheduler(policy:PolicyConfig)->Scheduler:
     global _scheduler
@@ -11,6 +27,80 @@ def init_scheduler(policy:PolicyConfig)->Scheduler:
     _scheduler.start()
     return _scheduler
 
-def get_scheduler()->Scheduler : 
+def get_scheduler()->Scheduler :
     assert _scheduler is not None, "Scheduler not initalized"
-    return _scheduler
\ No newline at end of file
+    return _scheduler
+
+def init_batch_runner(policy:PolicyConfig, handler:BatchHandler)->BatchRunner:
+    global _batch_runner
+    _batch_runner = BatchRunner(policy.scheduler.batch, get_scheduler(), handler)
+    _batch_runner.start()
+    return _batch_runner
+
+def get_batch_runner()->Optional[BatchRunner]:
+    return _batch_runner
+
+def init_loop_monitor(*, interval_ms:int, slow_ms:int)->LoopLagMonitor:
+    global _loop_monitor
+    _loop_monitor = LoopLagMonitor(interval_ms=interval_ms, slow_ms=slow_ms)
+    _loop_monitor.start()
+    return _loop_monitor
+
+def get_loop_monitor()->Optional[LoopLagMonitor]:
+    return _loop_monitor
+
+def init_cache_warmer(handler:WarmHandler, *, check_s:int, concurrency:int)->CacheWarmer:
+    global _cache_warmer
+    _cache_warmer = CacheWarmer(handler, check_s=check_s, concurrency=concurrency, codec=_body_codec)
+    _cache_warmer.start()
+    return _cache_warmer
+
+def get_cache_warmer()->Optional[CacheWarmer]:
+    return _cache_warmer
+
+def init_rollups(*, flush_interval_s:float)->TraceRollups:
+    global _rollups
+    _rollups = TraceRollups(flush_interval_s=flush_interval_s)
+    _rollups.start()
+    return _rollups
+
+def get_rollups()->Optional[TraceRollups]:
+    return _rollups
+
+def init_sim_backend(cfg:SimConfig)->SimulatedBackend:
+    global _sim_backend
+    _sim_backend = SimulatedBackend(cfg)
+    return _sim_backend
+
+def get_sim_backend()->SimulatedBackend:
+    assert _sim_backend is not None, "Simulated backend not initialized"
+    return _sim_backend
+
+def init_backend_pool(base_urls:list[str], policy:PolicyConfig)->BackendPool:
+    global _backend_pool
+    _backend_pool = BackendPool(base_urls, policy.backends)
+    return _backend_pool
+
+def get_backend_pool()->BackendPool:
+    assert _backend_pool is not None, "Backend pool not initialized"
+    return _backend_pool
+
+def get_backend_pool_or_none()->Optional[BackendPool]:
+    return _backend_pool
+
+def init_body_codec(codec:BodyCodec)->BodyCodec:
+    global _body_codec
+    _body_codec = codec
+    return _body_codec
+
+def get_body_codec()->BodyCodec:
+    # uncompressed until startup configures one
+    return _body_codec
+
+def init_cache_admission(*, min_hits:int, width:int)->ExactCacheAdmission:
+    global _cache_admission
+    _cache_admission = ExactCacheAdmission(min_hits=min_hits, width=width)
+    return _cache_admission
+
+def get_cache_admission()->Optional[ExactCacheAdmission]:
+    return _cache_admission
@@ -13,13 +13,15 @@ from app.core.settings import PolicyConfig
 class ScheduledJob:
     request_id: str
     tenant_id: str
-    lane: str  # "short" | "long"
+    lane: str  # "short" | "long" | "batch"
     created_at: float
     slo_ms: int
     plan: ExecutionPlan
     run: Callable[[], Awaitable[object]]  # returns backend result (opaque)
     fut: asyncio.Future[object]
     queue_entered_at: float
+    # time.time() after which the job is dropped instead of started (JobExpiredError)
+    start_by: float | None = None
 
 
 @dataclass(frozen=True)
@@ -31,11 +33,17 @@ class AdmissionResult:
     retry_after_seconds: int | None = None
 
 
+INTERACTIVE_LANES = ("short", "long")
+BATCH_LANE = "batch"
+LANES = INTERACTIVE_LANES + (BATCH_LANE,)
+
+
 class Scheduler:
     """
     Two-lane (short/long) fair scheduler with basic admission control.
     - Per-lane: per-tenant FIFO deques (implemented as asyncio Queues per tenant)
     - Fairness: round-robin across tenants that have queued work
+    - Batch lane: offline work, only dequeued when both interactive lanes are empty
     """
 
     def __init__(self, policy: PolicyConfig):
@@ -45,17 +53,22 @@ class Scheduler:
 
         # lane -> tenant -> queue
         self._queues: Dict[str, Dict[str, asyncio.Queue[ScheduledJob]]] = {
-            "short": {},
-            "long": {},
+            lane: {} for lane in LANES
         }
 
         # lane -> round robin tenant order (maintained)
-        self._rr_order: Dict[str, list[str]] = {"short": [], "long": []}
-        self._rr_index: Dict[str, int] = {"short": 0, "long": 0}
+        self._rr_order: Dict[str, list[str]] = {lane: [] for lane in LANES}
+        self._rr_index: Dict[str, int] = {lane: 0 for lane in LANES}
+
+        # lane -> jobs currently executing on a worker
+        self._busy: Dict[str, int] = {lane: 0 for lane in LANES}
 
         self._workers: list[asyncio.Task[None]] = []
         self._stop = asyncio.Event()
 
+        # fraction of backend capacity currently usable (e.g. endpoints with closed breakers)
+        self.capacity: Callable[[], float] = lambda: 1.0
+
     def start(self) -> None:
         workers = int(self.policy.scheduler.workers)
         for i in range(workers):
@@ -70,6 +83,21 @@ class Scheduler:
     def lane_for_prompt_chars(self, prompt_chars: int) -> str:
         return "short" if prompt_chars <= int(self.policy.scheduler.short_max_prompt_chars) else "long"
 
+    @property
+    def workers(self) -> int:
+        return max(1, int(self.policy.scheduler.workers))
+
+    def lane_depth(self, lane: str) -> int:
+        return sum(q.qsize() for q in self._queues[lane].values())
+
+    def busy(self, lanes: tuple[str, ...] = LANES) -> int:
+        return sum(self._busy[lane] for lane in lanes)
+
+    def utilization(self, lanes: tuple[str, ...] = INTERACTIVE_LANES) -> float:
+        """Running + queued jobs in `lanes` as a fraction of worker capacity."""
+        load = sum(self._busy[lane] + self.lane_depth(lane) for lane in lanes)
+        return load / self.workers
+
     async def submit(self, job: ScheduledJob) -> None:
         async with self._lock:
             lane = job.lane
@@ -98,7 +126,12 @@ class Scheduler:
 
             if job.fut.cancelled():
                 continue
+            if job.start_by is not None and time.time() > job.start_by:
+                # whoever queued it no longer wants it run (e.g. a revalidation whose lock expired)
+                job.fut.set_exception(JobExpiredError(f"not started by its deadline on the {job.lane} lane"))
+                continue
 
+            self._busy[job.lane] += 1
             try:
                 res = await job.run()
                 if not job.fut.done():
@@ -106,14 +139,17 @@ class Scheduler:
             except Exception as e:
                 if not job.fut.done():
                     job.fut.set_exception(e)
+            finally:
+                self._busy[job.lane] -= 1
 
     async def _dequeue_fair(self) -> Optional[ScheduledJob]:
         async with self._lock:
-            # Prefer short to reduce tail latency
-            job = self._dequeue_lane("short")
-            if job is not None:
-                return job
-            return self._dequeue_lane("long")
+            # Prefer short to reduce tail latency; batch only runs on otherwise idle workers
+            for lane in LANES:
+                job = self._dequeue_lane(lane)
+                if job is not None:
+                    return job
+            return None
 
     def _dequeue_lane(self, lane: str) -> Optional[ScheduledJob]:
         tenants = self._rr_order[lane]
@@ -147,12 +183,16 @@ class Scheduler:
         if not adm.enabled:
             return AdmissionResult(True, False, False, "admission_disabled"), 0
 
-        workers = max(1, int(self.policy.scheduler.workers))
+        # workers stuck behind dead backends are not capacity
+        capacity = self.capacity()
+        if capacity <= 0.0:
+            retry_after = adm.reject.retry_after_seconds
+            return AdmissionResult(False, False, True, "backends_unavailable", retry_after), 0
+        workers = self.workers * capacity
         avg_compute = adm.default_compute_ms.short if lane == "short" else adm.default_compute_ms.long
 
         # Approximate queue depth in this lane
-        tmap = self._queues[lane]
-        depth = sum(q.qsize() for q in tmap.values())
+        depth = self.lane_depth(lane)
         predicted_wait_ms = int((depth * avg_compute) / workers)
 
         ## now to decide if we should admit this question: two factor
@@ -180,3 +220,7 @@ class Scheduler:
 
 class QueueFullError(RuntimeError):
     pass
+
+
+class JobExpiredError(RuntimeError):
+    pass
@@ -1,38 +1,69 @@
 from __future__ import annotations
 
+import re
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal, Optional
 
 import yaml
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.core.backend import BackendTimeouts
+from app.core.sim_backend import SimConfig
+
 
 # -------------------------
 # Policy schema
 # -------------------------
-class TenantCaching(BaseModel):
-    exact_enabled: bool = True
-    semantic_enabled: bool = False
-
-
-class TenantPolicy(BaseModel):
-    latency_slo_ms: int = 8000
-    caching: TenantCaching = Field(default_factory=TenantCaching)
-
-
-
-
 class SemanticCaching(BaseModel):
     enabled : bool = False
     threshold :float = 0.90
+    # under overload (admission would degrade or reject) a candidate down to this similarity is
+    # served instead, flagged; unset = never relax
+    overload_threshold : Optional[float] = None
     ttl_seconds : int = 1800
     verifier : str ='off'
 
 class TenantCaching(BaseModel):
     exact_enabled : bool = True
+    # Redis bytes this tenant's exact entries may hold; past it new answers are not stored
+    exact_max_bytes : Optional[int] = None
     semantic : SemanticCaching  = Field(default_factory = SemanticCaching)
 
+class TenantTraces(BaseModel):
+    # always | sampled | errors_only | hash_only (see app/utils/trace_payload.py)
+    payload_capture : Literal["always", "sampled", "errors_only", "hash_only"] = "always"
+    sample_rate : float = 0.1
+
+
+class PromptScrubber(BaseModel):
+    # e.g. {name: timestamp, pattern: "\\d{4}-\\d{2}-\\d{2}[T ][\\d:.]+Z?", roles: [system]}
+    name : str
+    pattern : str
+    replacement : Optional[str] = None # default "<name>"
+    roles : Optional[list[str]] = None # None = every message
+
+    @field_validator("pattern")
+    @classmethod
+    def _compiles(cls, v: str) -> str:
+        re.compile(v)  # a bad pattern fails the policy load, not every request
+        return v
+
+class TenantNormalize(BaseModel):
+    # cache-key canonicalization (app/utils/normalize.py); the backend still gets the prompt as sent
+    nfkc : bool = False
+    collapse_whitespace : bool = False
+    scrubbers : list[PromptScrubber] = Field(default_factory=list)
+    casefold : bool = False
+    strip_trailing_punctuation : bool = False
+    fingerprint_system : bool = False
+
+class TenantPolicy(BaseModel):
+    latency_slo_ms: int = 8000
+    caching: TenantCaching = Field(default_factory=TenantCaching)
+    traces: TenantTraces = Field(default_factory=TenantTraces)
+    normalize: TenantNormalize = Field(default_factory=TenantNormalize)
+
 class SchedulerAdmissionComputeMs(BaseModel):
     short : int = 1200
     long : int = 3500
@@ -52,13 +83,97 @@ class SchedulerAdmission(BaseModel):
     degrade : SchedulerDegrade = Field(default_factory = SchedulerDegrade)
     reject : SchedulerReject = Field(default_factory = SchedulerReject)
 
+class SchedulerBatch(BaseModel):
+    enabled : bool = True
+    utilization_threshold : float = 0.5 # only feed batch jobs while interactive load is below this fraction of workers
+    max_in_flight : int = 4
+    poll_interval_ms : int = 500
+    max_attempts : int = 3
+    # a running job whose updated_at is older than this is presumed orphaned (its process died)
+    # and goes back to pending; live runners renew their jobs every lease_s / 3
+    lease_s : int = 300
+
 class SchedulerConfig(BaseModel):
     short_max_prompt_chars : int = 1200
     workers : int =2
     max_queue_depth_per_lane : int = 200
     admission: SchedulerAdmission = Field(default_factory = SchedulerAdmission)
+    batch : SchedulerBatch = Field(default_factory = SchedulerBatch)
+
 
 
+class BackendHedging(BaseModel):
+    enabled : bool = False
+    delay_quantile : float = 0.9 # hedge once a request has waited longer than this TTFT quantile of its bucket
+    min_samples : int = 20 # below this many TTFTs in a bucket, use default_delay_ms
+    default_delay_ms : int = 2000
+    min_delay_ms : int = 200
+    max_delay_ms : int = 10000
+    budget_ratio : float = 0.05 # at most ~5% extra backend requests
+    budget_burst : float = 5.0
+
+class BackendCircuitBreaker(BaseModel):
+    enabled : bool = True
+    window : int = 20 # last N calls per endpoint
+    min_calls : int = 5
+    error_rate : float = 0.5
+    slow_call_ms : int = 10000 # a TTFT above this counts as a slow call
+    slow_call_rate : float = 0.8
+    open_s : float = 5.0
+    max_open_s : float = 60.0 # open_s doubles on each consecutive trip up to this
+    half_open_probes : int = 1
+
+class BackendRetries(BaseModel):
+    max_attempts : int = 2 # per request, across endpoints; only failures before the first token are retried
+    budget_ratio : float = 0.1 # retries earned per request: bounds amplification when everything fails
+    budget_burst : float = 10.0
+
+class BackendTimeoutPolicy(BaseModel):
+    # keyed by the plan's length bucket (routing.length_buckets)
+    connect_ms : int = 1000
+    first_byte_ms : dict[str, int] = Field(default_factory = lambda: {"short": 10000, "medium": 20000, "long": 30000})
+    total_ms : dict[str, int] = Field(default_factory = lambda: {"short": 60000, "medium": 90000, "long": 120000})
+    default_first_byte_ms : int = 30000
+    default_total_ms : int = 120000
+
+    def for_bucket(self, bucket: str) -> BackendTimeouts:
+        return BackendTimeouts(
+            connect_s=self.connect_ms / 1000.0,
+            first_byte_s=self.first_byte_ms.get(bucket, self.default_first_byte_ms) / 1000.0,
+            total_s=self.total_ms.get(bucket, self.default_total_ms) / 1000.0,
+        )
+
+class BackendAffinity(BaseModel):
+    # route requests sharing a leading prefix to the same endpoint, whose prompt/KV cache holds it
+    enabled : bool = False
+    prefix_messages : int = 1 # leading normalized messages hashed (1 = the system prompt)
+    prefix_chars : int = 4096 # ... capped at this many canonical chars
+    min_prefix_chars : int = 256 # shorter prefixes are cheap to re-evaluate: plain least-loaded
+    load_factor : float = 1.25 # bounded loads: the home endpoint takes at most this x the average in-flight
+    virtual_nodes : int = 64 # ring points per endpoint
+
+class BackendsConfig(BaseModel):
+    hedging : BackendHedging = Field(default_factory = BackendHedging)
+    affinity : BackendAffinity = Field(default_factory = BackendAffinity)
+    circuit_breaker : BackendCircuitBreaker = Field(default_factory = BackendCircuitBreaker)
+    retries : BackendRetries = Field(default_factory = BackendRetries)
+    timeouts : BackendTimeoutPolicy = Field(default_factory = BackendTimeoutPolicy)
+
+
+class TierConfig(BaseModel):
+    model : str
+    backends : list[str] = Field(default_factory=list) # Ollama base URLs serving this model; empty = any pool endpoint
+
+class CascadeConfig(BaseModel):
+    # cheap checks on a cascade step's answer; any hit escalates to the plan's next tier
+    min_completion_chars : int = 1
+    escalate_on_truncation : bool = True # done_reason == "length"
+    refusal_patterns : list[str] = Field(default_factory=lambda: [
+        "i can't", "i cannot", "i'm not able", "i am not able", "i'm unable", "i am unable", "i don't know",
+    ])
+    refusal_scan_chars : int = 200 # only the opening of the answer is checked
+    min_avg_logprob : Optional[float] = None # needs a backend that returns logprobs; unset = check off
+
 
 class PolicyConfig(BaseModel):
     policy_version: str
@@ -66,6 +181,12 @@ class PolicyConfig(BaseModel):
     routing: dict[str, Any]
     plans: dict[str, Any]
     scheduler : SchedulerConfig = Field(default_factory = SchedulerConfig)
+    backends : BackendsConfig = Field(default_factory = BackendsConfig)
+    tiers : dict[str, TierConfig] = Field(default_factory = dict) # plan tier -> model (unlisted: OLLAMA_MODEL)
+    cascade : CascadeConfig = Field(default_factory = CascadeConfig)
+
+    def tier_urls(self) -> list[str]:
+        return [u for t in self.tiers.values() for u in t.backends]
 # -------------------------
 # Settings
 # -------------------------
@@ -91,22 +212,99 @@ class Settings(BaseSettings):
     )
     redis_url: str = Field(default="redis://localhost:6379/0", alias="REDIS_URL")
 
+    # raw asyncpg pool for hot-path queries (app/db/pg_pool.py)
+    pg_pool_min_size : int = 2
+    pg_pool_max_size : int = 10
+    pg_statement_cache_size : int = 256
+    pg_pool_max_idle_s : float = 300.0
+    pg_semantic_lookup_timeout_s : float = 0.5  # a slow lookup is treated as a miss
+    pg_semantic_store_timeout_s : float = 1.0
+    pg_trace_write_timeout_s : float = 2.0
+
     # repo-root relative path by default
     policy_path: str = Field(default="policies/policy.dev.yaml", alias="POLICY_PATH")
 
     ollama_base_url: str = "http://localhost:11434"
+    # comma-separated endpoints for the backend pool (hedging needs 2+); empty -> ollama_base_url
+    ollama_base_urls: str = ""
     ollama_model: str = "llama3.2:1b"
-
-
-    exact_cache_ttl_seconds : int = 300
+    # multi-turn: keep ollama's `context` per conversation and send only the new turn next time
+    context_reuse_enabled : bool = False
+    context_ttl_seconds : int = 1800
+    context_max_tokens : int = 16384  # longer contexts are not stored (4 bytes/token in redis)
+
+
+    exact_cache_ttl_seconds : int = 300 # soft TTL: older entries are served stale while one request refreshes them
+    exact_cache_stale_seconds : int = 300 # ... for at most this long past the soft TTL (hard TTL = sum)
+    exact_cache_xfetch_beta : float = 1.0 # probabilistic early refresh before the soft TTL; 0 = off
+    exact_cache_revalidate_lock_s : int = 60
+    exact_cache_compression : Literal["off", "zlib", "zstd"] = "zlib" # zstd needs `poetry install -E zstd`
+    exact_cache_compression_level : int = 3
+    exact_cache_compress_min_bytes : int = 256 # smaller bodies are stored as is
+    exact_cache_zstd_dict : Optional[str] = None # dictionary from scripts/train_zstd_dict.py
+    exact_cache_admission_min_hits : int = 2 # store an answer once its request was seen this often; 1 = always
+    exact_cache_sketch_width : int = 65536 # count-min counters per row (4 rows, 1 byte each)
 
     backend_mode : str ="mock" ## added for github action CI, as we dont have ollama over github action
+    # backend_mode="sim": in-process latency model (app/core/sim_backend.py), no model needed
+    sim_ttft_ms : float = 150.0
+    sim_jitter : float = 0.2
+    sim_prompt_eval_tokens_per_s : float = 2000.0
+    sim_decode_tokens_per_s : float = 40.0
+    sim_output_tokens_mean : int = 120
+    sim_max_concurrency : int = 4
+    sim_slowdown : float = 0.15
+    sim_error_rate : float = 0.0
+    sim_timeout_rate : float = 0.0
+    sim_hang_s : float = 300.0
+    sim_prefix_cache_prompts : int = 0
+    sim_seed : Optional[int] = None
 
 
     semantic_cache_ttl_seconds : int =1800
     semantic_cache_max_entries: int =200
     semantic_cache_threshold : float = 0.90
     embedding_model : str = 'BAAI/bge-small-en-v1.5'
+
+    trace_partition_granularity : Literal["day", "hour"] = "day"
+    trace_partitions_ahead : int = 2
+    trace_retention_hours : int = 24 * 14
+    trace_maintenance_interval_s : int = 600
+    rollup_flush_interval_s : float = 10.0
+
+    # cache warmer: refill the exact/semantic caches from recent traffic after a deploy, a policy
+    # change or a Redis flush (app/core/cache_warmer.py)
+    cache_warm_enabled : bool = False
+    cache_warm_top_n : int = 200 # per tenant
+    cache_warm_lookback_hours : int = 24
+    cache_warm_file : str = "" # JSONL of {"tenant_id", "request"} to warm from instead of traces
+    cache_warm_concurrency : int = 2 # regenerations in flight (they run on the batch lane)
+    cache_warm_check_s : int = 30
+
+    loop_monitor_enabled : bool = True
+    loop_lag_interval_ms : int = 100
+    loop_slow_ms : int = 200 # log the loop thread's stack when it has not ticked for this long
+    profiler_max_seconds : int = 60
+    def sim_config(self) -> SimConfig:
+        return SimConfig(
+            ttft_ms=self.sim_ttft_ms,
+            jitter=self.sim_jitter,
+            prompt_eval_tokens_per_s=self.sim_prompt_eval_tokens_per_s,
+            decode_tokens_per_s=self.sim_decode_tokens_per_s,
+            output_tokens_mean=self.sim_output_tokens_mean,
+            max_concurrency=self.sim_max_concurrency,
+            slowdown=self.sim_slowdown,
+            error_rate=self.sim_error_rate,
+            timeout_rate=self.sim_timeout_rate,
+            hang_s=self.sim_hang_s,
+            prefix_cache_prompts=self.sim_prefix_cache_prompts,
+            seed=self.sim_seed,
+        )
+
+    def ollama_endpoints(self) -> list[str]:
+        urls = [u.strip() for u in self.ollama_base_urls.split(",") if u.strip()]
+        return urls or [self.ollama_base_url]
+
     def load_policy(self) -> PolicyConfig:
         p = Path(self.policy_path)
 
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Optional
+
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.backend import GenerationResult
+
+
+class SimulatedBackendError(RuntimeError):
+    """Injected backend failure (HTTP 500 when served over /api/generate)."""
+
+
+@dataclass(frozen=True)
+class SimConfig:
+    ttft_ms: float = 150.0  # fixed part of time-to-first-token (scheduling, KV alloc)
+    jitter: float = 0.2  # lognormal sigma applied to TTFT and to each token's decode time
+    prompt_eval_tokens_per_s: float = 2000.0
+    decode_tokens_per_s: float = 40.0
+    output_tokens_mean: int = 120  # sampled completion length, capped by max_tokens
+    chars_per_token: float = 4.0
+    # Decode slows as more requests share the device: per-token time is multiplied by
+    # 1 + slowdown * (active - 1) ** slowdown_exponent. Beyond max_concurrency requests
+    # wait for a slot (like OLLAMA_NUM_PARALLEL) before prefill starts.
+    max_concurrency: int = 4
+    slowdown: float = 0.15
+    slowdown_exponent: float = 1.0
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0  # fraction of requests that hang for hang_s (exercise client timeouts)
+    hang_s: float = 300.0
+    # Prompt cache: the longest common prefix with any of the last N prompts is not
+    # re-evaluated (prefill time and prompt_eval_count cover the rest only). 0 = off.
+    prefix_cache_prompts: int = 0
+    seed: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class SimPlan:
+    prompt_tokens: int
+    cached_tokens: int  # prompt prefix found in the prompt cache
+    completion_tokens: int
+    done_reason: str  # "stop" | "length"
+    fail: bool
+    hang: bool
+
+
+class SimulatedBackend:
+    """
+    Latency model of a single local inference server. Delays are real (asyncio.sleep), so
+    the scheduler, admission control and queue-wait accounting see realistic service times
+    without a GPU or a model.
+    """
+
+    name = "sim"
+
+    def __init__(self, cfg: SimConfig):
+        self.cfg = cfg
+        self._rng = random.Random(cfg.seed)
+        self._slots = asyncio.Semaphore(max(1, cfg.max_concurrency))
+        self._active = 0
+        self._recent_prompts: deque[str] = deque(maxlen=max(0, cfg.prefix_cache_prompts))
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _jitter(self) -> float:
+        return self._rng.lognormvariate(0.0, self.cfg.jitter) if self.cfg.jitter > 0 else 1.0
+
+    def _slowdown(self) -> float:
+        extra = max(0, self._active - 1)
+        return 1.0 + self.cfg.slowdown * extra ** self.cfg.slowdown_exponent
+
+    def plan(self, *, prompt: str, max_tokens: int) -> SimPlan:
+        cfg = self.cfg
+        want = max(1, int(self._rng.expovariate(1.0 / max(1, cfg.output_tokens_mean))))
+        completion = min(want, max_tokens)
+        r = self._rng.random()
+        cached_chars = max((len(os.path.commonprefix((prompt, p))) for p in self._recent_prompts), default=0)
+        if self._recent_prompts.maxlen:
+            self._recent_prompts.append(prompt)
+        prompt_tokens = max(1, math.ceil(len(prompt) / cfg.chars_per_token))
+        return SimPlan(
+            prompt_tokens=prompt_tokens,
+            # at least the last token is always evaluated
+            cached_tokens=min(prompt_tokens - 1, int(cached_chars / cfg.chars_per_token)),
+            completion_tokens=completion,
+            done_reason="length" if want >= max_tokens else "stop",
+            fail=r < cfg.error_rate,
+            hang=cfg.error_rate <= r < cfg.error_rate + cfg.timeout_rate,
+        )
+
+    async def stream(self, *, prompt: str, max_tokens: int) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        """
+        Yields (token_text, stats) per decoded token; stats on the last item carry the
+        Ollama-style counters and durations (ns).
+        """
+        p = self.plan(prompt=prompt, max_tokens=max_tokens)
+        t0 = time.perf_counter()
+        async with self._slots:
+            self._active += 1
+            try:
+                if p.hang:
+                    await asyncio.sleep(self.cfg.hang_s)
+                t_prefill = time.perf_counter()
+                evaluated = p.prompt_tokens - p.cached_tokens
+                prefill_s = self.cfg.ttft_ms / 1000.0 + evaluated / self.cfg.prompt_eval_tokens_per_s
+                await asyncio.sleep(prefill_s * self._slowdown() * self._jitter())
+                if p.fail:
+                    raise SimulatedBackendError("simulated backend failure")
+                t_decode = time.perf_counter()
+                for i in range(p.completion_tokens):
+                    if i:
+                        # re-evaluated per token: requests arriving mid-decode slow this one down
+                        await asyncio.sleep(self._slowdown() * self._jitter() / self.cfg.decode_tokens_per_s)
+                    last = i == p.completion_tokens - 1
+                    stats: dict[str, Any] = {}
+                    if last:
+                        t_end = time.perf_counter()
+                        stats = {
+                            "done_reason": p.done_reason,
+                            "prompt_eval_count": evaluated,
+                            "eval_count": p.completion_tokens,
+                            "total_duration": int((t_end - t0) * 1e9),
+                            "load_duration": int((t_prefill - t0) * 1e9),
+                            "prompt_eval_duration": int((t_decode - t_prefill) * 1e9),
+                            "eval_duration": int((t_end - t_decode) * 1e9),
+                        }
+                    yield ("tok " if i else "(sim) "), stats
+            finally:
+                self._active -= 1
+
+    async def generate(self, *, model: str, prompt: str, temperature: float, max_tokens: int) -> GenerationResult:
+        t0 = time.perf_counter()
+        ttft_ms: Optional[int] = None
+        parts: list[str] = []
+        stats: dict[str, Any] = {}
+        async for tok, stats in self.stream(prompt=prompt, max_tokens=max_tokens):
+            if ttft_ms is None:
+                ttft_ms = int((time.perf_counter() - t0) * 1000)
+            parts.append(tok)
+        return GenerationResult(
+            text="".join(parts).strip(),
+            prompt_tokens=stats["prompt_eval_count"],
+            completion_tokens=stats["eval_count"],
+            total_tokens=stats["prompt_eval_count"] + stats["eval_count"],
+            backend_latency_ms=int((time.perf_counter() - t0) * 1000),
+            backend_ttft_ms=ttft_ms,
+            backend_name=self.name,
+            backend_meta={"done_reason": stats["done_reason"], "model": model},
+        )
+
+
+def create_sim_app(cfg: SimConfig) -> FastAPI:
+    """
+    FastAPI app speaking enough of Ollama's API for the relay (and `ollama run`-style clients):
+    POST /api/generate (streaming NDJSON or a single JSON object), GET /api/tags, GET /api/version.
+    """
+    backend = SimulatedBackend(cfg)
+    app = FastAPI(title="Relay simulated backend")
+
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    @app.get("/api/version")
+    async def version() -> dict[str, str]:
+        return {"version": "0.0.0-sim"}
+
+    @app.get("/api/tags")
+    async def tags() -> dict[str, Any]:
+        return {"models": [{"name": "sim", "model": "sim"}]}
+
+    @app.get("/sim/stats")
+    async def stats() -> dict[str, Any]:
+        return {"active": backend.active, "max_concurrency": cfg.max_concurrency}
+
+    @app.post("/api/generate")
+    async def generate(request: Request) -> Response:
+        body = orjson.loads(await request.body())
+        model = str(body.get("model") or "sim")
+        prompt = str(body.get("prompt") or "")
+        max_tokens = int((body.get("options") or {}).get("num_predict") or 128)
+        if max_tokens < 0:  # ollama: -1 = unlimited
+            max_tokens = 4096
+        # `context` in: the prefix is already evaluated, only `prompt` costs prefill time.
+        # `context` out: ids standing in for prompt + answer tokens, so callers can chain turns.
+        context_in = body.get("context") or []
+
+        def _context(final: dict[str, Any]) -> list[int]:
+            n = len(context_in) + final.get("prompt_eval_count", 0) + final.get("eval_count", 0)
+            return list(range(n))
+
+        if not body.get("stream", True):
+            try:
+                text: list[str] = []
+                final: dict[str, Any] = {}
+                async for tok, final in backend.stream(prompt=prompt, max_tokens=max_tokens):
+                    text.append(tok)
+            except SimulatedBackendError as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            return Response(
+                orjson.dumps(
+                    {"model": model, "created_at": _now(), "response": "".join(text), "done": True,
+                     "context": _context(final), **final}
+                ),
+                media_type="application/json",
+            )
+
+        async def lines() -> AsyncIterator[bytes]:
+            try:
+                async for tok, final in backend.stream(prompt=prompt, max_tokens=max_tokens):
+                    yield orjson.dumps({"model": model, "created_at": _now(), "response": tok, "done": False}) + b"\n"
+                yield orjson.dumps(
+                    {"model": model, "created_at": _now(), "response": "", "done": True, "context": _context(final), **final}
+                ) + b"\n"
+            except SimulatedBackendError as e:
+                # mid-stream failure, as ollama reports it
+                yield orjson.dumps({"error": str(e)}) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class StageTimer:
+    """
+    Cheap per-request stage timer (perf_counter, no allocation per sample beyond a dict slot).
+    Stages are recorded in ms, repeated stages accumulate, and `add` accepts externally measured
+    durations (e.g. queue wait and backend latency reported by the scheduler/backend).
+    """
+
+    def __init__(self) -> None:
+        self._t0 = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000.0)
+
+    def add(self, name: str, ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+    def as_dict(self) -> dict[str, float]:
+        out = {k: round(v, 3) for k, v in self.stages.items()}
+        out["total"] = round(self.elapsed_ms(), 3)
+        return out
+
+    def server_timing(self) -> str:
+        """Render as a `Server-Timing` header value (https://www.w3.org/TR/server-timing/)."""
+        return ", ".join(f"{k};dur={v}" for k, v in self.as_dict().items())
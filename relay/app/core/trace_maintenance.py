@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core.logging import get_logger
+from app.db.trace_partitions import (
+    default_partition_rows,
+    drop_expired_trace_partitions,
+    ensure_trace_partitions,
+)
+
+log = get_logger(component="trace_maintenance")
+
+
+class TraceMaintenance:
+    """
+    Keeps request_traces partitions created ahead of time and drops the ones past retention.
+    Rows that still landed in the default partition (maintenance fell behind) get their
+    partition created and are moved into it; a warning is logged while any remain there.
+    """
+
+    def __init__(self, *, granularity: str, ahead: int, retention_hours: int, interval_s: int):
+        self.granularity = granularity
+        self.ahead = ahead
+        self.retention = timedelta(hours=retention_hours)
+        self.interval_s = interval_s
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run_once(self) -> None:
+        since = datetime.now(timezone.utc) - self.retention
+        created = await ensure_trace_partitions(granularity=self.granularity, ahead=self.ahead, since=since)
+        dropped = await drop_expired_trace_partitions(retention=self.retention)
+        log.info("trace_partitions_maintained", ensured=created, dropped=dropped)
+        stray = await default_partition_rows()
+        if stray:
+            log.warning("trace_default_partition_not_empty", rows=stray)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                log.warning("trace_maintenance_failed", error=str(e))
+            await asyncio.sleep(self.interval_s)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Optional
+
+import orjson
+from sqlalchemy import text
+
+from app.db.postgres import get_sessionmaker
+
+
+INSERT_CHUNK = 1000
+
+
+async def create_batch(
+    *,
+    batch_id: str,
+    tenant_id: str,
+    endpoint: str,
+    jobs: list[dict[str, Any]],
+) -> None:
+    """Persist the batch header and all of its jobs (status=pending) in one transaction."""
+    q_batch = text(
+        """
+        INSERT INTO batches (id, tenant_id, endpoint, status, total)
+        VALUES (:id, :tenant_id, :endpoint, 'in_progress', :total)
+        """
+    )
+    q_job = text(
+        """
+        INSERT INTO batch_jobs (batch_id, line_no, custom_id, request_json)
+        VALUES (:batch_id, :line_no, :custom_id, CAST(:request_json AS JSONB))
+        """
+    )
+
+    async with get_sessionmaker()() as session:
+        await session.execute(
+            q_batch,
+            {
+                "id": batch_id,
+                "tenant_id": tenant_id,
+                "endpoint": endpoint,
+                "total": len(jobs),
+            },
+        )
+        for i in range(0, len(jobs), INSERT_CHUNK):
+            chunk = [
+                {
+                    "batch_id": batch_id,
+                    "line_no": j["line_no"],
+                    "custom_id": j["custom_id"],
+                    "request_json": orjson.dumps(j["request"]).decode("utf-8"),
+                }
+                for j in jobs[i : i + INSERT_CHUNK]
+            ]
+            await session.execute(q_job, chunk)
+        await session.commit()
+
+
+async def get_batch(batch_id: str) -> Optional[dict[str, Any]]:
+    q = text(
+        """
+        SELECT id, tenant_id, endpoint, status, total, completed, failed,
+               created_at, completed_at, cancelled_at
+        FROM batches
+        WHERE id = :id
+        """
+    )
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, {"id": batch_id})
+        row = res.mappings().first()
+        return dict(row) if row else None
+
+
+async def cancel_batch(batch_id: str) -> None:
+    q_batch = text(
+        """
+        UPDATE batches SET status = 'cancelled', cancelled_at = now()
+        WHERE id = :id AND status = 'in_progress'
+        """
+    )
+    q_jobs = text(
+        """
+        UPDATE batch_jobs SET status = 'cancelled', updated_at = now()
+        WHERE batch_id = :id AND status = 'pending'
+        """
+    )
+    async with get_sessionmaker()() as session:
+        await session.execute(q_batch, {"id": batch_id})
+        await session.execute(q_jobs, {"id": batch_id})
+        await session.commit()
+
+
+async def claim_jobs(limit: int) -> list[dict[str, Any]]:
+    """
+    Atomically move up to `limit` pending jobs to running, oldest batch first.
+    SKIP LOCKED lets several relay processes share the same job table.
+    """
+    q = text(
+        """
+        UPDATE batch_jobs j
+        SET status = 'running', attempts = j.attempts + 1, updated_at = now()
+        FROM (
+          SELECT j2.batch_id, j2.line_no, b.tenant_id, b.endpoint
+          FROM batch_jobs j2
+          JOIN batches b ON b.id = j2.batch_id
+          WHERE j2.status = 'pending' AND b.status = 'in_progress'
+          ORDER BY b.created_at, j2.line_no
+          LIMIT :limit
+          FOR UPDATE OF j2 SKIP LOCKED
+        ) c
+        WHERE j.batch_id = c.batch_id AND j.line_no = c.line_no
+        RETURNING j.batch_id, j.line_no, j.custom_id, j.attempts, j.request_json,
+                  c.tenant_id, c.endpoint
+        """
+    )
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, {"limit": limit})
+        rows = [dict(r) for r in res.mappings().all()]
+        await session.commit()
+        return rows
+
+
+async def requeue_running_jobs(*, lease_s: int) -> int:
+    """
+    Jobs left `running` by a crashed/restarted process go back to the queue. Only jobs whose
+    lease ran out: other relay processes share the table and renew their running jobs.
+    """
+    q = text(
+        """
+        UPDATE batch_jobs SET status = 'pending', updated_at = now()
+        WHERE status = 'running' AND updated_at < now() - make_interval(secs => :lease_s)
+        """
+    )
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, {"lease_s": lease_s})
+        await session.commit()
+        return int(getattr(res, "rowcount", 0) or 0)
+
+
+async def renew_leases(jobs: list[tuple[str, int]]) -> None:
+    """Bump updated_at of the (batch_id, line_no) jobs this process is running."""
+    if not jobs:
+        return
+    q = text(
+        """
+        UPDATE batch_jobs j SET updated_at = now()
+        FROM unnest(CAST(:batch_ids AS TEXT[]), CAST(:line_nos AS INT[])) AS k(batch_id, line_no)
+        WHERE j.batch_id = k.batch_id AND j.line_no = k.line_no AND j.status = 'running'
+        """
+    )
+    async with get_sessionmaker()() as session:
+        await session.execute(q, {"batch_ids": [b for b, _ in jobs], "line_nos": [n for _, n in jobs]})
+        await session.commit()
+
+
+async def release_job(*, batch_id: str, line_no: int, attempts: int) -> None:
+    """
+    Return a claimed job to pending (e.g. the scheduler queue was full). `attempts` is the
+    count the claim returned: once the lease ran out and the job was claimed again (it went up),
+    the job is another runner's and is left alone, or it would run twice.
+    """
+    q = text(
+        """
+        UPDATE batch_jobs SET status = 'pending', updated_at = now()
+        WHERE batch_id = :batch_id AND line_no = :line_no AND status = 'running' AND attempts = :attempts
+        """
+    )
+    async with get_sessionmaker()() as session:
+        await session.execute(q, {"batch_id": batch_id, "line_no": line_no, "attempts": attempts})
+        await session.commit()
+
+
+async def finish_job(
+    *,
+    batch_id: str,
+    line_no: int,
+    ok: bool,
+    status_code: int,
+    request_id: Optional[str],
+    response_body: Optional[bytes],
+    error_obj: Optional[dict[str, Any]],
+) -> None:
+    """
+    Record a job result, bump the batch counters and close the batch once every job is done.
+    `response_body` is the response JSON as served (see app.utils.cached_response). A job that is
+    no longer `running` (its lease ran out and it was requeued) is left alone, so it is counted once.
+    """
+    q_job = text(
+        """
+        UPDATE batch_jobs
+        SET status = :status, status_code = :status_code, request_id = :request_id,
+            response_json = CAST(:response_json AS JSONB), error_json = CAST(:error_json AS JSONB),
+            updated_at = now()
+        WHERE batch_id = :batch_id AND line_no = :line_no AND status = 'running'
+        """
+    )
+    counter = "completed" if ok else "failed"
+    q_batch = text(
+        f"""
+        UPDATE batches
+        SET {counter} = {counter} + 1,
+            status = CASE
+              WHEN status = 'in_progress' AND completed + failed + 1 >= total THEN 'completed'
+              ELSE status
+            END,
+            completed_at = CASE
+              WHEN status = 'in_progress' AND completed + failed + 1 >= total THEN now()
+              ELSE completed_at
+            END
+        WHERE id = :batch_id
+        """
+    )
+    async with get_sessionmaker()() as session:
+        res = await session.execute(
+            q_job,
+            {
+                "batch_id": batch_id,
+                "line_no": line_no,
+                "status": "completed" if ok else "failed",
+                "status_code": status_code,
+                "request_id": request_id,
+                "response_json": response_body.decode("utf-8") if response_body is not None else "null",
+                "error_json": orjson.dumps(error_obj).decode("utf-8"),
+            },
+        )
+        if int(getattr(res, "rowcount", 0) or 0):
+            await session.execute(q_batch, {"batch_id": batch_id})
+        await session.commit()
+
+
+async def iter_batch_results(batch_id: str, chunk_size: int = 500) -> AsyncIterator[dict[str, Any]]:
+    """Yield finished jobs in input order, one keyset page per round trip."""
+    q = text(
+        """
+        SELECT line_no, custom_id, status, status_code, request_id, response_json, error_json
+        FROM batch_jobs
+        WHERE batch_id = :batch_id
+          AND line_no > :after
+          AND status IN ('completed', 'failed')
+        ORDER BY line_no
+        LIMIT :limit
+        """
+    )
+    after = -1
+    while True:
+        async with get_sessionmaker()() as session:
+            res = await session.execute(q, {"batch_id": batch_id, "after": after, "limit": chunk_size})
+            rows = [dict(r) for r in res.mappings().all()]
+        for r in rows:
+            yield r
+        if len(rows) < chunk_size:
+            return
+        after = int(rows[-1]["line_no"])
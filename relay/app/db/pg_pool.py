@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional
+
+import asyncpg
+
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.db.pgvector_codec import register_vector_codec
+
+log = get_logger(component="pg_pool")
+
+# Hot-path data access (trace insert, semantic lookup/store) runs on this raw asyncpg pool:
+# no ORM session, no pre-ping round trip, statements prepared once per connection and reused
+# from asyncpg's statement cache. Admin/reporting queries stay on SQLAlchemy (app/db/postgres.py).
+_pool: Optional[asyncpg.Pool] = None
+
+
+def asyncpg_dsn() -> str:
+    return settings.database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    await register_vector_codec(conn)
+
+
+async def init_pg_pool() -> asyncpg.Pool:
+    global _pool
+    _pool = await asyncpg.create_pool(
+        asyncpg_dsn(),
+        min_size=settings.pg_pool_min_size,
+        max_size=settings.pg_pool_max_size,
+        # 0 disables server-side prepared statements (needed behind pgbouncer in transaction mode)
+        statement_cache_size=settings.pg_statement_cache_size,
+        max_inactive_connection_lifetime=settings.pg_pool_max_idle_s,
+        init=_init_connection,
+    )
+    log.info("pg_pool_ready", min_size=settings.pg_pool_min_size, max_size=settings.pg_pool_max_size)
+    return _pool
+
+
+def get_pg_pool() -> asyncpg.Pool:
+    assert _pool is not None, "pg pool not initialized"
+    return _pool
+
+
+async def close_pg_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def fetchrow(sql: str, *args: Any, timeout_s: float) -> Optional[asyncpg.Record]:
+    """One deadline covers waiting for a pooled connection and running the statement."""
+    async with asyncio.timeout(timeout_s):
+        async with get_pg_pool().acquire() as conn:
+            return await conn.fetchrow(sql, *args)
+
+
+async def execute(sql: str, *args: Any, timeout_s: float) -> str:
+    async with asyncio.timeout(timeout_s):
+        async with get_pg_pool().acquire() as conn:
+            return await conn.execute(sql, *args)
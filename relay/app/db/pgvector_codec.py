@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import struct
+from typing import Any
+
+import asyncpg
+import numpy as np
+import numpy.typing as npt
+
+# pgvector binary wire format (vector_send / vector_recv):
+#   int16 dim, int16 unused (0), dim x float32, all big-endian
+_HEADER = struct.Struct(">HH")
+_BE_F4 = np.dtype(">f4")
+
+
+def encode_vector(vec: npt.NDArray[np.floating[Any]]) -> bytes:
+    arr = np.asarray(vec)
+    return _HEADER.pack(arr.shape[0], 0) + arr.astype(_BE_F4, copy=False).tobytes()
+
+
+def decode_vector(buf: bytes) -> npt.NDArray[np.float32]:
+    dim, _ = _HEADER.unpack_from(buf)
+    return np.frombuffer(buf, dtype=_BE_F4, count=dim, offset=_HEADER.size).astype(np.float32)
+
+
+async def register_vector_codec(conn: asyncpg.Connection) -> None:
+    """
+    Send/receive `vector` values as binary float32 on this connection, so embeddings go to
+    Postgres as NumPy arrays with no text rendering or parsing on either side. Fails (and so
+    does pool init) without the extension: the semantic cache binds arrays, which asyncpg
+    cannot send as anything but this codec.
+    """
+    try:
+        await conn.set_type_codec(
+            "vector", schema="public", encoder=encode_vector, decoder=decode_vector, format="binary"
+        )
+    except ValueError:
+        raise RuntimeError(
+            "pgvector type `vector` not found in schema public: run the migrations in infra/postgres-init"
+        ) from None
@@ -2,11 +2,13 @@ from __future__ import annotations
 
 from typing import Any, Optional
 
-from sqlalchemy import text
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app.core.settings import settings
+from app.db import pg_pool
+from app.db.pgvector_codec import register_vector_codec
 
 
 _engine: Optional[AsyncEngine] = None
@@ -17,9 +19,15 @@ def get_engine() -> AsyncEngine:
     global _engine
     if _engine is None:
         _engine = create_async_engine(settings.database_url, pool_pre_ping=True)
+        event.listen(_engine.sync_engine, "connect", _on_connect)
     return _engine
 
 
+def _on_connect(dbapi_conn: Any, _record: Any) -> None:
+    # runs once per new pooled connection; the asyncpg adapter bridges to the raw connection
+    dbapi_conn.run_async(register_vector_codec)
+
+
 def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
     global _sessionmaker
     if _sessionmaker is None:
@@ -27,26 +35,39 @@ def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
     return _sessionmaker
 
 
+INSERT_TRACE_SQL = """
+INSERT INTO request_traces (
+  request_id, tenant_id, endpoint, model, status_code,
+  request_hash, lane, cache_outcome,
+  latency_ms, backend_latency_ms, queue_wait_ms, backend_ttft_ms,
+  prompt_tokens, completion_tokens, total_tokens,
+  payload_capture, request_json, response_json, response_hash, error_json,
+  policy_version, plan_json, decision_trace_json, cache_json, timings_json
+)
+VALUES (
+  $1, $2, $3, $4, $5,
+  $6, $7, $8,
+  $9, $10, $11, $12,
+  $13, $14, $15,
+  $16, $17::text::jsonb, $18::text::jsonb, $19, $20::text::jsonb,
+  $21, $22::text::jsonb, $23::text::jsonb, $24::text::jsonb, $25::text::jsonb
+)
+"""
+
+_INSERT_TRACE_PARAMS = (
+    "request_id", "tenant_id", "endpoint", "model", "status_code",
+    "request_hash", "lane", "cache_outcome",
+    "latency_ms", "backend_latency_ms", "queue_wait_ms", "backend_ttft_ms",
+    "prompt_tokens", "completion_tokens", "total_tokens",
+    "payload_capture", "request_json", "response_json", "response_hash", "error_json",
+    "policy_version", "plan_json", "decision_trace_json", "cache_json", "timings_json",
+)
+
+
 async def insert_trace(payload: dict[str, Any]) -> None:
-    stmt = text(
-        """
-        INSERT INTO request_traces (
-          request_id, tenant_id, endpoint, model, status_code,
-          request_hash, latency_ms, backend_latency_ms, queue_wait_ms, backend_ttft_ms,
-          prompt_tokens, completion_tokens, total_tokens,
-          request_json, response_json, error_json,
-          policy_version, plan_json, decision_trace_json, cache_json
-        )
-        VALUES (
-          :request_id, :tenant_id, :endpoint, :model, :status_code,
-          :request_hash, :latency_ms, :backend_latency_ms, :queue_wait_ms, :backend_ttft_ms,
-          :prompt_tokens, :completion_tokens, :total_tokens,
-          CAST(:request_json AS JSONB), CAST(:response_json AS JSONB), CAST(:error_json AS JSONB),
-          :policy_version, CAST(:plan_json AS JSONB), CAST(:decision_trace_json AS JSONB), CAST(:cache_json AS JSONB)
-        )
-        """
+    """JSON columns arrive pre-serialized (str); runs on the hot-path asyncpg pool."""
+    await pg_pool.execute(
+        INSERT_TRACE_SQL,
+        *(payload[k] for k in _INSERT_TRACE_PARAMS),
+        timeout_s=settings.pg_trace_write_timeout_s,
     )
-
-    async with get_sessionmaker()() as session:
-        await session.execute(stmt, payload)
-        await session.commit()
@@ -3,53 +3,67 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 
-import orjson
-from sqlalchemy import text
-
-from app.db.postgres import get_sessionmaker
-
-
-def _vec_literal(vec: list[float]) -> str:
-    # pgvector accepts: '[1,2,3]'::vector
-    return "[" + ",".join(f"{x:.6f}" for x in vec) + "]"
+import numpy as np
+
+from app.core.settings import settings
+from app.db import pg_pool
+
+# $3 is bound as binary pgvector (see app/db/pgvector_codec.py)
+LOOKUP_SQL = """
+SELECT
+  id::text AS id,
+  (response_json - 'id' - 'created')::text AS response_body,
+  COALESCE((response_json #>> '{usage,prompt_tokens}')::int, 0) AS prompt_tokens,
+  COALESCE((response_json #>> '{usage,completion_tokens}')::int, 0) AS completion_tokens,
+  COALESCE((response_json #>> '{usage,total_tokens}')::int, 0) AS total_tokens,
+  response_json #>> '{choices,0,finish_reason}' AS finish_reason,
+  (1 - (embedding <=> $3::vector)) AS similarity
+FROM semantic_cache_entries
+WHERE tenant_id = $1
+  AND plan_sig = $2
+  AND expires_at > now()
+ORDER BY embedding <=> $3::vector
+LIMIT 1
+"""
+
+STORE_SQL = """
+INSERT INTO semantic_cache_entries
+  (tenant_id, plan_sig, request_hash, prompt_text, embedding, response_json, expires_at)
+VALUES
+  ($1, $2, $3, $4, $5::vector, $6::text::jsonb, $7)
+RETURNING id::text AS id
+"""
+
+EXISTS_SQL = """
+SELECT EXISTS (
+  SELECT 1 FROM semantic_cache_entries
+  WHERE tenant_id = $1 AND plan_sig = $2 AND request_hash = $3 AND expires_at > now()
+)
+"""
 
 
 async def semantic_lookup(
     *,
     tenant_id: str,
     plan_sig: str,
-    query_vec: list[float],
+    query_vec: np.ndarray,
 ) -> Optional[dict[str, Any]]:
     """
-    Returns best match: {id, response_json, similarity}
+    Returns best match: {id, response_body, prompt_tokens, completion_tokens, total_tokens,
+    finish_reason (None if the backend did not report one), similarity}. response_body is the stored response without id/created, as JSON bytes ready
+    for app.utils.cached_response.render (never parsed here).
     Using cosine distance (<=>) with vector_cosine_ops.
     similarity ≈ 1 - cosine_distance
+    Raises TimeoutError past `pg_semantic_lookup_timeout_s`.
     """
-    q = text(
-        """
-        SELECT
-          id::text AS id,
-          response_json,
-          (1 - (embedding <=> (:qvec)::vector)) AS similarity
-        FROM semantic_cache_entries
-        WHERE tenant_id = :tenant_id
-          AND plan_sig = :plan_sig
-          AND expires_at > now()
-        ORDER BY embedding <=> (:qvec)::vector
-        LIMIT 1
-        """
+    row = await pg_pool.fetchrow(
+        LOOKUP_SQL, tenant_id, plan_sig, query_vec, timeout_s=settings.pg_semantic_lookup_timeout_s
     )
-
-    params = {
-        "tenant_id": tenant_id,
-        "plan_sig": plan_sig,
-        "qvec": _vec_literal(query_vec),
-    }
-
-    async with get_sessionmaker()() as session:
-        res = await session.execute(q, params)
-        row = res.mappings().first()
-        return dict(row) if row else None
+    if row is None:
+        return None
+    out = dict(row)
+    out["response_body"] = row["response_body"].encode("utf-8")
+    return out
 
 
 async def semantic_store(
@@ -58,62 +72,29 @@ async def semantic_store(
     plan_sig: str,
     request_hash: str,
     prompt_text: str,
-    embedding: list[float],
-    response_obj: dict[str, Any],
+    embedding: np.ndarray,
+    response_body: bytes,
     ttl_seconds: int,
 ) -> str:
     expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
-
-    q = text(
-        """
-        INSERT INTO semantic_cache_entries
-          (tenant_id, plan_sig, request_hash, prompt_text, embedding, response_json, expires_at)
-        VALUES
-          (:tenant_id, :plan_sig, :request_hash, :prompt_text, (:embedding)::vector, CAST(:response_json AS JSONB), :expires_at)
-        RETURNING id::text AS id
-        """
+    row = await pg_pool.fetchrow(
+        STORE_SQL,
+        tenant_id,
+        plan_sig,
+        request_hash,
+        prompt_text,
+        embedding,
+        response_body.decode("utf-8"),
+        expires_at,
+        timeout_s=settings.pg_semantic_store_timeout_s,
     )
-
-    params = {
-        "tenant_id": tenant_id,
-        "plan_sig": plan_sig,
-        "request_hash": request_hash,
-        "prompt_text": prompt_text,
-        "embedding": _vec_literal(embedding),
-        "response_json": orjson.dumps(response_obj).decode("utf-8"),
-        "expires_at": expires_at,
-    }
-
-    async with get_sessionmaker()() as session:
-        res = await session.execute(q, params)
-        await session.commit()
-        return str(res.scalar_one())
-    
+    assert row is not None
+    return str(row["id"])
 
 
-async def semantic_score(*,tenant_id:str, plan_sig:str, request_hash:str,prompt_text:str,embedding:list[float], response_obj:dict[str,Any], ttl_seconds:int)->str:
-    expires_at = datetime.now(timezone.utc) + timedelta(seconds = ttl_seconds)
-
-    q = text(
-        """
-        INSERT INTO semantic_cache_entries
-          (tenant_id, plan_sig, request_hash, prompt_text, embedding, response_json, expires_at)
-        VALUES
-          (:tenant_id, :plan_sig, :request_hash, :prompt_text, (:embedding)::vector, CAST(:response_json AS JSONB), :expires_at)
-        RETURNING id::text AS id
-        """
+async def semantic_has_entry(*, tenant_id: str, plan_sig: str, request_hash: str) -> bool:
+    """Whether a live entry for exactly this request exists (the cache warmer skips those)."""
+    row = await pg_pool.fetchrow(
+        EXISTS_SQL, tenant_id, plan_sig, request_hash, timeout_s=settings.pg_semantic_lookup_timeout_s
     )
-
-    params = {
-        "tenant_id": tenant_id,
-        "plan_sig": plan_sig,
-        "request_hash": request_hash,
-        "prompt_text": prompt_text,
-        "embedding": _vec_literal(embedding),
-        "response_json": orjson.dumps(response_obj).decode("utf-8"),
-        "expires_at": expires_at,
-    }
-    async with get_sessionmaker()() as session:
-        res = await session.execute(q,params)
-        await session.commit()
-        return str(res.scalar_one())
\ No newline at end of file
+    return bool(row is not None and row[0])
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import io
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterator, Optional
+
+import asyncpg
+import orjson
+
+from app.db.pg_pool import asyncpg_dsn
+
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+
+# (output column, SQL expression, arrow type name) -- JSONB blobs flattened into typed columns
+EXPORT_COLUMNS: tuple[tuple[str, str, str], ...] = (
+    ("request_id", "request_id", "string"),
+    ("tenant_id", "tenant_id", "string"),
+    ("created_at", "created_at", "timestamp"),
+    ("endpoint", "endpoint", "string"),
+    ("model", "model", "string"),
+    ("status_code", "status_code", "int32"),
+    ("request_hash", "request_hash", "string"),
+    ("lane", "lane", "string"),
+    ("cache_outcome", "cache_outcome", "string"),
+    ("latency_ms", "latency_ms", "int32"),
+    ("backend_latency_ms", "backend_latency_ms", "int32"),
+    ("queue_wait_ms", "queue_wait_ms", "int32"),
+    ("backend_ttft_ms", "backend_ttft_ms", "int32"),
+    ("prompt_tokens", "prompt_tokens", "int32"),
+    ("completion_tokens", "completion_tokens", "int32"),
+    ("total_tokens", "total_tokens", "int32"),
+    ("policy_version", "policy_version", "string"),
+    ("plan_name", "plan_json->>'plan_name'", "string"),
+    ("tier", "plan_json->>'tier'", "string"),
+    ("max_tokens", "(plan_json->>'max_tokens')::int", "int32"),
+    ("temperature", "(plan_json->>'temperature')::float8", "float64"),
+    ("exact_hit", "(cache_json->'exact'->>'hit')::boolean", "bool"),
+    ("semantic_hit", "(cache_json->'semantic'->>'hit')::boolean", "bool"),
+    ("semantic_similarity", "(cache_json->'semantic'->>'similarity')::float8", "float64"),
+    ("admission", "cache_json->'scheduler'->>'admission'", "string"),
+    ("degraded", "(cache_json->'scheduler'->>'degraded')::boolean", "bool"),
+    ("predicted_wait_ms", "(cache_json->'scheduler'->>'predicted_wait_ms')::int", "int32"),
+    ("total_stage_ms", "(timings_json->>'total')::float8", "float64"),
+)
+
+# only when include_payloads=true (needed for replay; subject to the tenant's payload capture)
+PAYLOAD_COLUMNS: tuple[tuple[str, str, str], ...] = (
+    ("messages", "(request_json->'messages')::text", "string"),
+    ("response_text", "response_json->'choices'->0->'message'->>'content'", "string"),
+    # the client's overrides (NULL when it sent none); max_tokens/temperature above are the plan's
+    ("request_max_tokens", "(request_json->>'max_tokens')::int", "int32"),
+    ("request_temperature", "(request_json->>'temperature')::float8", "float64"),
+)
+
+
+@dataclass(frozen=True)
+class ExportQuery:
+    tenant_id: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    include_payloads: bool = False
+
+    def columns(self) -> tuple[tuple[str, str, str], ...]:
+        return EXPORT_COLUMNS + (PAYLOAD_COLUMNS if self.include_payloads else ())
+
+    def sql(self) -> tuple[str, list[Any]]:
+        where: list[str] = []
+        args: list[Any] = []
+        for clause, val in (
+            ("tenant_id = ${}", self.tenant_id),
+            ("created_at >= ${}", self.since),
+            ("created_at < ${}", self.until),
+        ):
+            if val is not None:
+                args.append(val)
+                where.append(clause.format(len(args)))
+        select = ", ".join(f"{expr} AS {name}" for name, expr, _ in self.columns())
+        q = f"SELECT {select} FROM request_traces"
+        if where:
+            q += " WHERE " + " AND ".join(where)
+        # created_at order lets Postgres walk partitions one by one
+        return q + " ORDER BY created_at", args
+
+
+async def iter_trace_records(query: ExportQuery, *, prefetch: int = 1000) -> AsyncIterator[asyncpg.Record]:
+    """
+    Server-side cursor over request_traces on a dedicated connection (exports never hold a
+    pool connection the hot path needs). Only `prefetch` rows are in memory at any time.
+    """
+    sql, args = query.sql()
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        async with conn.transaction(readonly=True):
+            async for rec in conn.cursor(sql, *args, prefetch=prefetch):
+                yield rec
+    finally:
+        await conn.close()
+
+
+async def stream_ndjson(query: ExportQuery, *, prefetch: int = 1000) -> AsyncIterator[bytes]:
+    buf: list[bytes] = []
+    async for rec in iter_trace_records(query, prefetch=prefetch):
+        buf.append(orjson.dumps(dict(rec)))
+        if len(buf) >= prefetch:
+            yield b"\n".join(buf) + b"\n"
+            buf = []
+    if buf:
+        yield b"\n".join(buf) + b"\n"
+
+
+async def stream_csv(query: ExportQuery, *, max_chunks: int = 16) -> AsyncGenerator[bytes, None]:
+    """COPY ... TO STDOUT (CSV, with header); a bounded queue applies backpressure to COPY."""
+    sql, args = query.sql()
+    chunks: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=max_chunks)
+
+    async def sink(data: bytes) -> None:
+        await chunks.put(bytes(data))
+
+    async def copy() -> None:
+        cancelled = False
+        try:
+            conn = await asyncpg.connect(asyncpg_dsn())
+            try:
+                await conn.copy_from_query(sql, *args, output=sink, format="csv", header=True)
+            finally:
+                await conn.close()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # end marker, also after an error (the reader then awaits the task); not when the
+            # reader cancelled us: it is gone, and a full queue would block here forever
+            if not cancelled:
+                await chunks.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+        await task  # surface COPY errors
+    finally:
+        task.cancel()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every row group."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out, self._chunks = b"".join(self._chunks), []
+        return out
+
+
+async def stream_parquet(query: ExportQuery, *, row_group_size: int = 10_000) -> AsyncIterator[bytes]:
+    """Columnar export; pyarrow is an optional dependency (`poetry install -E export`)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "string": pa.string(),
+        "int32": pa.int32(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    cols = query.columns()
+    schema = pa.schema([(name, types[kind]) for name, _, kind in cols])
+    names = [name for name, _, _ in cols]
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    rows: list[asyncpg.Record] = []
+
+    def flush() -> None:
+        batch = pa.record_batch([[r[i] for r in rows] for i in range(len(names))], schema=schema)
+        writer.write_batch(batch, row_group_size=row_group_size)
+        rows.clear()
+
+    async for rec in iter_trace_records(query, prefetch=min(row_group_size, 5000)):
+        rows.append(rec)
+        if len(rows) >= row_group_size:
+            flush()
+            yield sink.drain()
+    if rows:
+        flush()
+    writer.close()
+    yield sink.drain()
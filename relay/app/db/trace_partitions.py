@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.db.postgres import get_sessionmaker
+
+log = get_logger(component="trace_partitions")
+
+PARTITION_RE = re.compile(r"^request_traces_p(\d{8}|\d{10})$")
+DEFAULT_PARTITION = "request_traces_default"
+
+STEPS = {"day": timedelta(days=1), "hour": timedelta(hours=1)}
+
+
+def _floor(ts: datetime, granularity: str) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def partition_range(name: str) -> tuple[datetime, datetime] | None:
+    """[start, end) of a partition from its name, None for the default/foreign partitions."""
+    m = PARTITION_RE.match(name)
+    if not m:
+        return None
+    stamp = m.group(1)
+    if len(stamp) == 10:
+        start = datetime.strptime(stamp, "%Y%m%d%H").replace(tzinfo=timezone.utc)
+        return start, start + STEPS["hour"]
+    start = datetime.strptime(stamp, "%Y%m%d").replace(tzinfo=timezone.utc)
+    return start, start + STEPS["day"]
+
+
+def plan_partitions(
+    wanted: list[tuple[datetime, datetime]], existing: list[tuple[datetime, datetime]]
+) -> list[tuple[datetime, timedelta]]:
+    """
+    (start, step) of the partitions to create for the `wanted` ranges. A range already covered
+    by `existing` partitions is skipped; one that is only partly covered (the granularity was
+    changed, e.g. hourly maintenance next to a daily partition) gets the hours still free:
+    Postgres rejects overlapping partitions.
+    """
+    hour = STEPS["hour"]
+    taken = list(existing)
+    out: list[tuple[datetime, timedelta]] = []
+    for start, end in sorted(set(wanted)):
+        overlaps = [(s, e) for s, e in taken if s < end and start < e]
+        if not overlaps:
+            out.append((start, end - start))
+            taken.append((start, end))
+            continue
+        t = start
+        while t < end:
+            if not any(s <= t < e for s, e in overlaps):
+                out.append((t, hour))
+                taken.append((t, t + hour))
+            t += hour
+    return out
+
+
+async def _partition_names(session: AsyncSession) -> list[str]:
+    res = await session.execute(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'request_traces'::regclass
+            """
+        )
+    )
+    return [str(n) for n in res.scalars().all()]
+
+
+async def _create_partition(session: AsyncSession, start: datetime, step: timedelta) -> str:
+    """
+    Create one partition. Rows the default partition holds for its range are moved into it in
+    the same transaction: Postgres refuses to create a partition the default has rows for.
+    """
+    rng = {"start": start, "end": start + step}
+    in_range = f"FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end"
+    stray = (await session.execute(text(f"SELECT EXISTS (SELECT 1 {in_range})"), rng)).scalar_one()
+    if stray:
+        # no new rows for this range may reach the default until the partition takes them
+        await session.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+        await session.execute(text("CREATE TEMP TABLE relay_moving_traces (LIKE request_traces) ON COMMIT DROP"))
+        await session.execute(
+            text(f"WITH moved AS (DELETE {in_range} RETURNING *) INSERT INTO relay_moving_traces SELECT * FROM moved"),
+            rng,
+        )
+    res = await session.execute(text("SELECT relay_create_trace_partition(:start, :step)"), {"start": start, "step": step})
+    name = str(res.scalar_one())
+    if stray:
+        moved = await session.execute(text("INSERT INTO request_traces SELECT * FROM relay_moving_traces"))
+        log.info("trace_default_rows_moved", partition=name, rows=int(getattr(moved, "rowcount", 0) or 0))
+    return name
+
+
+async def ensure_trace_partitions(*, granularity: str, ahead: int, since: datetime | None = None) -> list[str]:
+    """
+    Create the current partition plus `ahead` future ones (idempotent), and a partition for
+    every range the default partition has rows in since `since`, moving those rows out.
+    Each partition is created in its own transaction, so one failure does not undo the rest.
+    """
+    step = STEPS[granularity]
+    start = _floor(datetime.now(timezone.utc), granularity)
+    wanted = [(start + i * step, start + (i + 1) * step) for i in range(ahead + 1)]
+    async with get_sessionmaker()() as session:
+        existing = [r for n in await _partition_names(session) if (r := partition_range(n)) is not None]
+        if since is not None:
+            res = await session.execute(
+                text(
+                    f"""
+                    SELECT DISTINCT date_trunc(:unit, created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                    FROM {DEFAULT_PARTITION}
+                    WHERE created_at >= :since
+                    """
+                ),
+                {"unit": granularity, "since": since},
+            )
+            wanted += [(s, s + step) for s in res.scalars().all()]
+        await session.commit()
+
+    names: list[str] = []
+    for part_start, part_step in plan_partitions(wanted, existing):
+        try:
+            async with get_sessionmaker()() as session:
+                names.append(await _create_partition(session, part_start, part_step))
+                await session.commit()
+        except Exception as e:
+            log.warning("trace_partition_create_failed", start=part_start.isoformat(), error=str(e))
+    return names
+
+
+async def drop_expired_trace_partitions(*, retention: timedelta) -> list[str]:
+    """
+    Retention is a metadata-only DROP of whole partitions, never a DELETE; only rows that
+    ended up in the default partition (normally none) are deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - retention
+    async with get_sessionmaker()() as session:
+        expired = [
+            name
+            for name in await _partition_names(session)
+            if (rng := partition_range(name)) is not None and rng[1] <= cutoff
+        ]
+        for name in expired:
+            # names are validated by PARTITION_RE above
+            await session.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+        await session.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"), {"cutoff": cutoff})
+        await session.commit()
+    return expired
+
+
+async def default_partition_rows(limit: int = 10_000) -> int:
+    """Rows in the default partition, counted up to `limit`: anything here escaped maintenance."""
+    q = text(f"SELECT count(*) FROM (SELECT 1 FROM {DEFAULT_PARTITION} LIMIT :limit) AS t")
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, {"limit": limit})
+        return int(res.scalar_one())
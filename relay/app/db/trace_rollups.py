@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import text
+
+from app.db.postgres import get_sessionmaker
+
+
+async def upsert_rollups(rows: list[dict[str, Any]]) -> None:
+    q = text(
+        """
+        INSERT INTO request_trace_rollups_1m (
+          bucket_start, tenant_id, lane, cache_outcome,
+          requests, errors, degraded, prompt_tokens, completion_tokens, latency_sum_ms, latency_hist
+        )
+        VALUES (
+          :bucket_start, :tenant_id, :lane, :cache_outcome,
+          :requests, :errors, :degraded, :prompt_tokens, :completion_tokens, :latency_sum_ms, :latency_hist
+        )
+        ON CONFLICT (bucket_start, tenant_id, lane, cache_outcome) DO UPDATE SET
+          requests = request_trace_rollups_1m.requests + EXCLUDED.requests,
+          errors = request_trace_rollups_1m.errors + EXCLUDED.errors,
+          degraded = request_trace_rollups_1m.degraded + EXCLUDED.degraded,
+          prompt_tokens = request_trace_rollups_1m.prompt_tokens + EXCLUDED.prompt_tokens,
+          completion_tokens = request_trace_rollups_1m.completion_tokens + EXCLUDED.completion_tokens,
+          latency_sum_ms = request_trace_rollups_1m.latency_sum_ms + EXCLUDED.latency_sum_ms,
+          latency_hist = relay_hist_add(request_trace_rollups_1m.latency_hist, EXCLUDED.latency_hist)
+        """
+    )
+    params = [
+        {**r, "bucket_start": datetime.fromtimestamp(r["bucket_start"], tz=timezone.utc)} for r in rows
+    ]
+    async with get_sessionmaker()() as session:
+        await session.execute(q, params)
+        await session.commit()
+
+
+async def rollup_totals(*, since: datetime, tenant_id: Optional[str] = None) -> list[dict[str, Any]]:
+    """Rollup rows summed per (tenant, cache outcome) since `since`, histograms merged in SQL."""
+    q = text(
+        f"""
+        SELECT
+          tenant_id,
+          cache_outcome,
+          sum(requests)::bigint AS requests,
+          sum(errors)::bigint AS errors,
+          sum(degraded)::bigint AS degraded,
+          sum(prompt_tokens)::bigint AS prompt_tokens,
+          sum(completion_tokens)::bigint AS completion_tokens,
+          sum(latency_sum_ms)::bigint AS latency_sum_ms,
+          relay_hist_sum(latency_hist) AS latency_hist
+        FROM request_trace_rollups_1m
+        WHERE bucket_start >= :since
+          {"AND tenant_id = :tenant_id" if tenant_id is not None else ""}
+        GROUP BY tenant_id, cache_outcome
+        """
+    )
+    params: dict[str, Any] = {"since": since}
+    if tenant_id is not None:
+        params["tenant_id"] = tenant_id
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, params)
+        return [dict(r) for r in res.mappings().all()]
@@ -1,34 +1,94 @@
 from __future__ import annotations
+import base64
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Any, Optional
 from sqlalchemy import text
 from app.db.postgres import get_sessionmaker
 
-async def list_traces(limit:int=50) ->list[dict[str,Any]]:
+
+@dataclass(frozen=True)
+class TraceFilters:
+    tenant_id: Optional[str] = None
+    status_code: Optional[int] = None
+    lane: Optional[str] = None
+    cache_outcome: Optional[str] = None
+    policy_version: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
+def encode_cursor(created_at: datetime, request_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{request_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    ts, request_id = raw.split("|", 1)
+    return datetime.fromisoformat(ts), request_id
+
+
+async def list_traces(
+    limit: int = 50,
+    *,
+    filters: TraceFilters = TraceFilters(),
+    cursor: Optional[str] = None,
+) -> tuple[list[dict[str, Any]], Optional[str]]:
+    """
+    One page of traces, newest first, plus the cursor for the next page.
+    Keyset pagination on (created_at, request_id) so deep pages cost the same as the first,
+    and the time bounds let Postgres prune partitions.
+    """
+    where: list[str] = []
+    params: dict[str, Any] = {"limit": limit + 1}
+    for col in ("tenant_id", "status_code", "lane", "cache_outcome", "policy_version"):
+        val = getattr(filters, col)
+        if val is not None:
+            where.append(f"{col} = :{col}")
+            params[col] = val
+    if filters.since is not None:
+        where.append("created_at >= :since")
+        params["since"] = filters.since
+    if filters.until is not None:
+        where.append("created_at < :until")
+        params["until"] = filters.until
+    if cursor:
+        params["cur_ts"], params["cur_id"] = decode_cursor(cursor)
+        where.append("(created_at, request_id) < (:cur_ts, :cur_id)")
+
     q = text(
-        """
+        f"""
         SELECT
           request_id,
           tenant_id,
           created_at,
           status_code,
           model,
+          lane,
+          cache_outcome,
           latency_ms,
           backend_latency_ms,
           queue_wait_ms,
           request_hash,
-          policy_version,
-          cache_json,
-          plan_json
+          policy_version
         FROM request_traces
-        ORDER BY created_at DESC
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY created_at DESC, request_id DESC
         LIMIT :limit
         """
     )
     async with get_sessionmaker()() as session:
-        res = await session.execute(q,{'limit':limit})
-        rows = res.mappings().all()
-        return [dict(r) for r in rows]
-    
+        res = await session.execute(q, params)
+        rows = [dict(r) for r in res.mappings().all()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["request_id"])
+    return rows, next_cursor
+
+
 async def get_trace(request_id:str)->Optional[dict[str,Any]]:
     q = text(
         """
@@ -40,6 +100,8 @@ async def get_trace(request_id:str)->Optional[dict[str,Any]]:
           model,
           status_code,
           request_hash,
+          lane,
+          cache_outcome,
           latency_ms,
           backend_latency_ms,
           queue_wait_ms,
@@ -51,6 +113,7 @@ async def get_trace(request_id:str)->Optional[dict[str,Any]]:
           plan_json,
           decision_trace_json,
           cache_json,
+          timings_json,
           request_json,
           response_json,
           error_json
@@ -62,4 +125,77 @@ async def get_trace(request_id:str)->Optional[dict[str,Any]]:
     async with get_sessionmaker()() as session:
         res = await session.execute(q, {"request_id": request_id})
         row = res.mappings().first()
-        return dict(row) if row else None
\ No newline at end of file
+        return dict(row) if row else None
+
+
+async def top_requests(*, since: datetime, per_tenant: int, endpoint: str = "/v1/chat/completions") -> list[dict[str, Any]]:
+    """
+    The `per_tenant` most frequent successful request hashes per tenant since `since`, each with
+    its latest captured request (for the cache warmer). The response, plan and backend latency
+    come from the latest trace that generated an answer (a miss, or a stale-entry revalidation):
+    a cache hit's response may be another prompt's semantic match. Hashes whose traces never
+    kept the request are skipped: there is nothing to replay.
+    """
+    q = text(
+        """
+        WITH recent AS (
+          SELECT
+            tenant_id, request_hash, created_at, cache_outcome, request_json, response_json, plan_json,
+            backend_latency_ms,
+            count(*) FILTER (WHERE endpoint = :endpoint) OVER (PARTITION BY tenant_id, request_hash) AS hits
+          FROM request_traces
+          WHERE created_at >= :since AND status_code = 200 AND endpoint IN (:endpoint, :revalidate_endpoint)
+        ),
+        latest AS (
+          SELECT DISTINCT ON (tenant_id, request_hash) tenant_id, request_hash, hits, request_json
+          FROM recent
+          WHERE jsonb_typeof(request_json) = 'object' AND hits > 0
+          ORDER BY tenant_id, request_hash, created_at DESC
+        ),
+        generated AS (
+          SELECT DISTINCT ON (tenant_id, request_hash) tenant_id, request_hash, response_json, plan_json, backend_latency_ms
+          FROM recent
+          WHERE cache_outcome IN ('miss', 'revalidate') AND jsonb_typeof(response_json) = 'object'
+          ORDER BY tenant_id, request_hash, created_at DESC
+        ),
+        ranked AS (
+          SELECT
+            l.tenant_id, l.request_hash, l.hits, l.request_json, g.response_json, g.plan_json, g.backend_latency_ms,
+            row_number() OVER (PARTITION BY l.tenant_id ORDER BY l.hits DESC, l.request_hash) AS rnk
+          FROM latest l
+          LEFT JOIN generated g ON g.tenant_id = l.tenant_id AND g.request_hash = l.request_hash
+        )
+        SELECT
+          tenant_id,
+          request_hash,
+          hits,
+          request_json::text AS request_json,
+          response_json::text AS response_json,
+          plan_json::text AS plan_json,
+          backend_latency_ms
+        FROM ranked
+        WHERE rnk <= :per_tenant
+        ORDER BY tenant_id, rnk
+        """
+    )
+    params = {"since": since, "per_tenant": per_tenant, "endpoint": endpoint, "revalidate_endpoint": "/internal/revalidate"}
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, params)
+        return [dict(r) for r in res.mappings().all()]
+
+
+async def sample_responses(*, since: datetime, limit: int, endpoint: str = "/v1/chat/completions") -> list[str]:
+    """Captured successful response bodies since `since`, newest first (zstd dictionary training)."""
+    q = text(
+        """
+        SELECT response_json::text AS response_json
+        FROM request_traces
+        WHERE created_at >= :since AND status_code = 200 AND endpoint = :endpoint
+          AND jsonb_typeof(response_json) = 'object'
+        ORDER BY created_at DESC
+        LIMIT :limit
+        """
+    )
+    async with get_sessionmaker()() as session:
+        res = await session.execute(q, {"since": since, "limit": limit, "endpoint": endpoint})
+        return [r for (r,) in res.all()]
@@ -1,10 +1,33 @@
+from functools import partial
+
 from fastapi import FastAPI
 
-from app.api.routes import router
+from app.api.routes import router, run_chat_completion
 from app.api.admin_routes import admin   # <-- must exist
+from app.api.batch_routes import batches
 from app.core.logging import configure_logging
+from app.core.scheduler import BATCH_LANE
 from app.core.settings import settings
-from app.core.runtime import init_scheduler
+from app.core.runtime import (
+    get_backend_pool_or_none,
+    get_batch_runner,
+    get_cache_warmer,
+    get_loop_monitor,
+    get_rollups,
+    get_scheduler,
+    init_backend_pool,
+    init_batch_runner,
+    init_body_codec,
+    init_cache_admission,
+    init_cache_warmer,
+    init_loop_monitor,
+    init_rollups,
+    init_scheduler,
+    init_sim_backend,
+)
+from app.core.trace_maintenance import TraceMaintenance
+from app.db.pg_pool import close_pg_pool, init_pg_pool
+from app.utils.cached_response import make_codec
 
 
 def create_app() -> FastAPI:
@@ -12,12 +35,75 @@ def create_app() -> FastAPI:
     app = FastAPI(title="LLM Relay", version="0.1.0")
 
     app.include_router(router)
-    app.include_router(admin) 
+    app.include_router(admin)
+    app.include_router(batches)
+
+    maintenance = TraceMaintenance(
+        granularity=settings.trace_partition_granularity,
+        ahead=settings.trace_partitions_ahead,
+        retention_hours=settings.trace_retention_hours,
+        interval_s=settings.trace_maintenance_interval_s,
+    )
 
     @app.on_event("startup")
     async def _startup() -> None:
+        await init_pg_pool()
+        if settings.loop_monitor_enabled:
+            init_loop_monitor(interval_ms=settings.loop_lag_interval_ms, slow_ms=settings.loop_slow_ms)
+        init_rollups(flush_interval_s=settings.rollup_flush_interval_s)
+        maintenance.start()
+        if settings.backend_mode == "sim":
+            init_sim_backend(settings.sim_config())
+        init_body_codec(
+            make_codec(
+                settings.exact_cache_compression,
+                level=settings.exact_cache_compression_level,
+                dict_path=settings.exact_cache_zstd_dict,
+                min_bytes=settings.exact_cache_compress_min_bytes,
+            )
+        )
+        if settings.exact_cache_admission_min_hits > 1:
+            init_cache_admission(min_hits=settings.exact_cache_admission_min_hits, width=settings.exact_cache_sketch_width)
         policy = settings.load_policy()
-        init_scheduler(policy)
+        scheduler = init_scheduler(policy)
+        if settings.backend_mode == "ollama":
+            pool = init_backend_pool(settings.ollama_endpoints() + policy.tier_urls(), policy)
+            # open breakers shrink the capacity admission control plans with
+            scheduler.capacity = pool.available_fraction
+        if policy.scheduler.batch.enabled:
+            init_batch_runner(
+                policy,
+                handler=partial(run_chat_completion, endpoint="/v1/batches", lane=BATCH_LANE),
+            )
+        if settings.cache_warm_enabled:
+            init_cache_warmer(
+                lambda req, tenant_id: run_chat_completion(
+                    req, tenant_id=tenant_id, endpoint="/internal/warm", lane=BATCH_LANE, warm=True
+                ),
+                check_s=settings.cache_warm_check_s,
+                concurrency=settings.cache_warm_concurrency,
+            )
+
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        warmer = get_cache_warmer()
+        if warmer is not None:
+            await warmer.stop()
+        runner = get_batch_runner()
+        if runner is not None:
+            await runner.stop()
+        await get_scheduler().stop()
+        pool = get_backend_pool_or_none()
+        if pool is not None:
+            await pool.close()
+        monitor = get_loop_monitor()
+        if monitor is not None:
+            await monitor.stop()
+        await maintenance.stop()
+        rollups = get_rollups()
+        if rollups is not None:
+            await rollups.stop()
+        await close_pg_pool()
 
     return app
 
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from app.models.openai_chat import ChatCompletionsRequest
+
+
+BatchStatus = Literal["in_progress", "completed", "cancelled"]
+
+
+class BatchInputLine(BaseModel):
+    """One line of an OpenAI-style batch input file."""
+
+    custom_id: Optional[str] = None
+    method: str = "POST"
+    url: str = "/v1/chat/completions"
+    body: ChatCompletionsRequest
+
+
+class BatchRequestCounts(BaseModel):
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+class BatchObject(BaseModel):
+    id: str
+    object: str = "batch"
+    endpoint: str = "/v1/chat/completions"
+    status: BatchStatus
+    tenant_id: str
+    request_counts: BatchRequestCounts = Field(default_factory=BatchRequestCounts)
+    created_at: int
+    completed_at: Optional[int] = None
+    cancelled_at: Optional[int] = None
+    output_url: str
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional
+
+import httpx
+import pytest
+
+from app.core.backend import GenerationResult
+from app.core.backend_pool import BackendPool
+from app.core.settings import BackendAffinity, BackendHedging, BackendRetries, BackendsConfig
+
+
+class _FakeAdapter:
+    def __init__(self, name: str, delay_s: float):
+        self.name = name
+        self.base_url = f"http://{name}"
+        self.delay_s = delay_s
+        self.cancelled = 0
+
+    async def generate(self, *, first_token: Optional[asyncio.Event] = None, **_: Any) -> GenerationResult:
+        try:
+            await asyncio.sleep(self.delay_s)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if first_token is not None:
+            first_token.set()
+        return GenerationResult(text=self.name, backend_ttft_ms=int(self.delay_s * 1000), backend_name=self.name)
+
+
+async def _pool(budget_burst: float) -> tuple[BackendPool, _FakeAdapter, _FakeAdapter]:
+    hedging = BackendHedging(enabled=True, default_delay_ms=20, min_delay_ms=10, budget_ratio=0.0, budget_burst=budget_burst)
+    pool = BackendPool(["http://a", "http://b"], BackendsConfig(hedging=hedging))
+    await pool.close()
+    slow, fast = _FakeAdapter("slow", 5.0), _FakeAdapter("fast", 0.01)
+    pool.endpoints[0].adapter, pool.endpoints[1].adapter = slow, fast  # type: ignore[assignment]
+    pool.pick = lambda exclude=(), **_: next(e for e in pool.endpoints if e not in exclude)  # type: ignore[method-assign]
+    return pool, slow, fast
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_over_stalled_primary_and_cancels_it() -> None:
+    pool, slow, _ = await _pool(budget_burst=1.0)
+    result = await asyncio.wait_for(
+        pool.generate(model="m", prompt="p", temperature=0.0, max_tokens=8, bucket="short"), timeout=1.0
+    )
+    assert result.text == "fast"
+    assert result.backend_meta is not None and result.backend_meta["hedge"]["winner"] == "hedge"
+    assert slow.cancelled == 1
+
+    # budget spent: the next stall is waited out rather than hedged
+    second = asyncio.create_task(pool.generate(model="m", prompt="p", temperature=0.0, max_tokens=8, bucket="short"))
+    await asyncio.sleep(0.1)
+    assert not second.done() and pool.endpoints[1].stats["hedges"] == 1
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    assert slow.cancelled == 2
+
+
+@pytest.mark.asyncio
+async def test_prefix_affinity_keeps_a_key_home_until_it_exceeds_its_bounded_load() -> None:
+    urls = ["http://a", "http://b", "http://c"]
+    pool = BackendPool(urls, BackendsConfig(affinity=BackendAffinity(enabled=True, load_factor=1.25)))
+    await pool.close()
+    homes = {pool.pick_affine(f"prefix-{i}")[0].name for i in range(50)}  # type: ignore[union-attr]
+    assert len(homes) == 3  # keys spread over the ring
+
+    home, info = pool.pick_affine("prefix-0")
+    assert home is not None and info["outcome"] == "affine"
+    assert pool.pick_affine("prefix-0")[0] is home  # stable
+
+    # home busier than 1.25x the average: the request spills to the least-loaded endpoint
+    home.in_flight = 4
+    spilled, info = pool.pick_affine("prefix-0")
+    assert info["outcome"] == "spilled" and spilled is not None and spilled is not home and spilled.in_flight == 0
+
+    # a ring without the home only moves that home's keys
+    smaller = BackendPool([u for u in urls if u != home.adapter.base_url], BackendsConfig())
+    await smaller.close()
+    for i in range(50):
+        key = f"prefix-{i}"
+        before = next(pool.ring.walk(key))
+        if before != home.adapter.base_url:
+            assert next(smaller.ring.walk(key)) == before
+
+
+class _StatusAdapter:
+    def __init__(self, name: str, status: int):
+        self.name = name
+        self.base_url = f"http://{name}"
+        self.status = status
+        self.calls = 0
+
+    async def generate(self, **_: Any) -> GenerationResult:
+        self.calls += 1
+        if self.status == 200:
+            return GenerationResult(text=self.name, backend_name=self.name)
+        request = httpx.Request("POST", f"{self.base_url}/api/generate")
+        raise httpx.HTTPStatusError("status", request=request, response=httpx.Response(self.status, request=request))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("status", "retried"), [(404, False), (400, False), (429, True), (503, True)])
+async def test_only_server_errors_and_429_are_retried_and_count_against_the_breaker(status: int, retried: bool) -> None:
+    pool = BackendPool(["http://a", "http://b"], BackendsConfig(retries=BackendRetries(budget_burst=5.0)))
+    await pool.close()
+    failing, healthy = _StatusAdapter("a", status), _StatusAdapter("b", 200)
+    pool.endpoints[0].adapter, pool.endpoints[1].adapter = failing, healthy  # type: ignore[assignment]
+    pool.pick = lambda exclude=(), **_: next(e for e in pool.endpoints if e not in exclude)  # type: ignore[method-assign]
+
+    if retried:
+        result = await pool.generate(model="m", prompt="p", temperature=0.0, max_tokens=8, bucket="short")
+        assert result.text == "b"
+    else:
+        with pytest.raises(httpx.HTTPStatusError):
+            await pool.generate(model="m", prompt="p", temperature=0.0, max_tokens=8, bucket="short")
+    assert healthy.calls == int(retried)
+    assert pool.endpoints[0].breaker.snapshot()["window_errors"] == int(retried)
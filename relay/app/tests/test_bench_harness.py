@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from benchmarks.harness import BenchResult, compare
+
+
+def test_bench_result_stats_and_compare() -> None:
+    res = BenchResult(name="b", group="g", loops=10, samples_ns=[400.0, 100.0, 200.0, 300.0, 500.0])
+    d = res.as_dict()
+    assert (d["min_ns"], d["median_ns"], d["rounds"]) == (100.0, 300.0, 5)
+    assert d["ops_per_s"] == 1e9 / 300.0
+
+    old = {"results": [{"name": "b", "median_ns": 200.0}, {"name": "gone", "median_ns": 1.0}]}
+    new = {"results": [d, {"name": "added", "median_ns": 5.0}]}
+    assert compare(old, new) == [{"name": "b", "old_median_ns": 200.0, "new_median_ns": 300.0, "ratio": 1.5}]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from app.core.cache_admission import ExactCacheAdmission, FrequencySketch, reserve_tenant_bytes
+
+
+def test_admits_on_second_sighting_and_ages_out() -> None:
+    gate = ExactCacheAdmission(min_hits=2, width=1024)
+    assert not gate.admit(gate.record("exact:t:sig:once"))
+    assert gate.admit(gate.record("exact:t:sig:once"))
+    assert (gate.admitted, gate.rejected) == (1, 1)
+
+    sketch = FrequencySketch(width=1024, sample_size=64)
+    for _ in range(20):
+        sketch.increment("hot")
+    assert sketch.estimate("hot") == 15  # saturates
+    for i in range(64):
+        sketch.increment(f"other {i}")
+    assert sketch.resets >= 1 and sketch.estimate("hot") < 15
+
+
+class _Redis:
+    def __init__(self) -> None:
+        self.d: dict[str, int] = {}
+
+    async def mget(self, *keys: str) -> list[Any]:
+        return [str(self.d[k]).encode() if k in self.d else None for k in keys]
+
+    async def incrby(self, k: str, n: int) -> None:
+        self.d[k] = self.d.get(k, 0) + n
+
+    async def expire(self, k: str, ttl: int) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_tenant_byte_budget_counts_the_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    redis = _Redis()
+    now = [1000.0 * 600 + 300]  # halfway through a 600 s bucket
+    monkeypatch.setattr("app.core.cache_admission.time.time", lambda: now[0])
+
+    async def reserve(tenant: str, n: int) -> bool:
+        return await reserve_tenant_bytes(redis, tenant_id=tenant, nbytes=n, budget=1000, window_s=600)
+
+    assert await reserve("a", 600) and not await reserve("a", 600)
+    assert await reserve("b", 600)  # budgets are per tenant
+    # next bucket, halfway in: half of the previous bucket's 600 bytes still counts
+    now[0] += 600
+    assert await reserve("a", 650) and not await reserve("a", 100)
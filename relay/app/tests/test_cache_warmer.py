@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from typing import Any
+
+import orjson
+import pytest
+
+import app.core.cache_warmer as cw
+from app.core.cache_warmer import CacheWarmer, WarmCandidate
+from app.core.policy_engine import build_plan, plan_dict
+from app.core.settings import PolicyConfig, settings
+from app.models.openai_chat import ChatCompletionsRequest, ChatMessage
+from app.utils.cached_response import RawChatResponse, decode_entry
+
+
+class _Redis:
+    def __init__(self) -> None:
+        self.d: dict[str, Any] = {}
+
+    async def get(self, k: str) -> Any:
+        return self.d.get(k)
+
+    async def setex(self, k: str, ttl: int, v: Any) -> None:
+        self.d[k] = v
+
+
+def _req(text: str) -> ChatCompletionsRequest:
+    return ChatCompletionsRequest(model="m", messages=[ChatMessage(role="user", content=text)])
+
+
+@pytest.mark.asyncio
+async def test_warm_restores_unchanged_plans_from_traces_and_replays_the_rest(monkeypatch: pytest.MonkeyPatch) -> None:
+    redis = _Redis()
+    stored: list[str] = []
+
+    async def semantic_has_entry(**_: Any) -> bool:
+        return False
+
+    async def semantic_store(*, request_hash: str, **_: Any) -> str:
+        stored.append(request_hash)
+        return "id"
+
+    monkeypatch.setattr(cw, "get_redis", lambda: redis)
+    monkeypatch.setattr(cw, "semantic_has_entry", semantic_has_entry)
+    monkeypatch.setattr(cw, "semantic_store", semantic_store)
+    monkeypatch.setattr(cw, "embed_text", lambda text: [0.0])
+
+    replayed: list[str] = []
+
+    async def handler(req: ChatCompletionsRequest, tenant_id: str) -> RawChatResponse:
+        replayed.append(req.messages[0].content)
+        return RawChatResponse(id="x", body=b'{"id":"x","created":1,"object":"chat.completion"}', total_tokens=3)
+
+    raw = settings.load_policy().model_dump()
+    raw["tenants"]["default"]["caching"]["exact_enabled"] = True
+    policy = PolicyConfig.model_validate(raw)
+    plan_obj, _ = build_plan(policy=policy, tenant_id="default", prompt_chars=len("user:same plan"),
+                             override_temperature=None, override_max_tokens=None)
+    response = {"id": "old", "created": 1, "object": "chat.completion", "choices": [{"index": 0, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}}
+    same = WarmCandidate("default", _req("same plan"), response_json=orjson.dumps(response),
+                         plan_json=orjson.dumps(plan_dict(plan_obj)), backend_latency_ms=40)
+    changed = WarmCandidate("default", _req("changed plan"), response_json=orjson.dumps(response),
+                            plan_json=orjson.dumps({**plan_dict(plan_obj), "temperature": 1.5}))
+    # generated while degraded: a different budget, but it finished naturally within this one
+    degraded = WarmCandidate("default", _req("degraded plan"), response_json=orjson.dumps(response),
+                             plan_json=orjson.dumps({**plan_dict(plan_obj), "max_tokens": 2}))
+    truncated = {**response, "choices": [{"index": 0, "finish_reason": "length"}]}
+    cut_short = WarmCandidate("default", _req("cut short"), response_json=orjson.dumps(truncated),
+                              plan_json=orjson.dumps({**plan_dict(plan_obj), "max_tokens": 2}))
+    # the backend reported no done_reason: may have been cut at that other budget
+    unreported = WarmCandidate("default", _req("unreported"), response_json=orjson.dumps({**response, "choices": []}),
+                               plan_json=orjson.dumps({**plan_dict(plan_obj), "max_tokens": 2}))
+
+    warmer = CacheWarmer(handler, check_s=3600, concurrency=2)
+    outcomes = [await warmer.warm_one(policy, c) for c in (same, changed, degraded, cut_short, unreported)]
+
+    assert outcomes[0] == ["restored", "semantic_stored"] and outcomes[2] == ["restored", "semantic_stored"]
+    assert replayed == ["changed plan", "cut short", "unreported"]
+    # replays fill the caches inside the (here faked) pipeline, never from the warmer
+    assert outcomes[1] == outcomes[3] == outcomes[4] == ["replayed"] and len(redis.d) == 2
+    restored = next(v for v in redis.d.values() if decode_entry(v, request_id="r", created=2).compute_ms == 40)  # type: ignore[union-attr]
+    assert orjson.loads(decode_entry(restored, request_id="r", created=2).body)["id"] == "r"  # type: ignore[union-attr]
+
+    assert await warmer.warm_one(policy, same) == ["already_warm"]
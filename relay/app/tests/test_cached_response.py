@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import orjson
+
+from app.models.openai_chat import ChatCompletionsChoice, ChatCompletionsResponse, ChatMessage, Usage
+from app.utils.cached_response import (
+    IDENTITY,
+    ZlibCodec,
+    cacheable_body,
+    decode_entry,
+    encode_entry,
+    render,
+    reusable_for,
+    should_refresh,
+)
+
+
+def _resp() -> ChatCompletionsResponse:
+    return ChatCompletionsResponse(
+        id="original",
+        created=1,
+        model="local-ollama",
+        choices=[ChatCompletionsChoice(index=0, message=ChatMessage(role="assistant", content="hi"), finish_reason="stop")],
+        usage=Usage(prompt_tokens=3, completion_tokens=4, total_tokens=7),
+    )
+
+
+def test_exact_entry_roundtrip_splices_request_fields() -> None:
+    body = cacheable_body(_resp().model_dump())
+    entry = encode_entry(body, prompt_tokens=3, completion_tokens=4, total_tokens=7, fresh_until=1000.5, compute_ms=800,
+                         max_tokens=256, finish_reason="stop")
+    hit = decode_entry(entry, request_id="new", created=99)
+    assert hit is not None and (hit.prompt_tokens, hit.completion_tokens, hit.total_tokens) == (3, 4, 7)
+    assert (hit.fresh_until, hit.compute_ms, hit.max_tokens, hit.finish_reason) == (1000.5, 800, 256, "stop")
+
+    served = ChatCompletionsResponse.model_validate_json(hit.body)
+    assert served.model_dump() == {**_resp().model_dump(), "id": "new", "created": 99}
+
+
+def test_render_accepts_jsonb_text_and_rejects_legacy_entries() -> None:
+    # postgres jsonb::text output: reordered keys, spaces after separators
+    jsonb_text = b'{"model": "m", "usage": {"total_tokens": 0}, "choices": [], "object": "chat.completion"}'
+    assert orjson.loads(render(jsonb_text, request_id="r", created=5))["id"] == "r"
+    assert decode_entry(orjson.dumps(_resp().model_dump()), request_id="r", created=5) is None
+
+
+def test_should_refresh_is_certain_when_stale_and_likelier_near_expiry() -> None:
+    assert should_refresh(fresh_until=100.0, compute_ms=0, now=100.0, beta=1.0)
+    # fresh: refresh when now - compute * beta * ln(u) reaches expiry
+    assert not should_refresh(fresh_until=100.0, compute_ms=1000, now=90.0, beta=1.0, rand=0.5)  # 90.7
+    assert should_refresh(fresh_until=100.0, compute_ms=1000, now=99.5, beta=1.0, rand=0.5)  # 100.2
+    assert not should_refresh(fresh_until=100.0, compute_ms=1000, now=99.5, beta=0.0, rand=1e-9)
+
+
+def test_reusable_for_across_budgets() -> None:
+    # finished naturally: any budget it fits in
+    assert reusable_for(finish_reason="stop", completion_tokens=40, max_tokens=64)
+    assert not reusable_for(finish_reason="stop", completion_tokens=100, max_tokens=64)
+    # truncated: only the budget it was cut at ...
+    assert reusable_for(finish_reason="length", completion_tokens=128, max_tokens=128)
+    assert not reusable_for(finish_reason="length", completion_tokens=64, max_tokens=128)
+    # ... or a request being degraded to no more than that
+    assert reusable_for(finish_reason="length", completion_tokens=64, max_tokens=128, degraded_to=64)
+    assert not reusable_for(finish_reason="length", completion_tokens=32, max_tokens=128, degraded_to=64)
+    # unknown finish (no done_reason/eval_count): only the budget it was generated under
+    assert reusable_for(finish_reason=None, completion_tokens=0, max_tokens=64, generated_max_tokens=64)
+    assert reusable_for(finish_reason=None, completion_tokens=0, max_tokens=128, generated_max_tokens=64, degraded_to=64)
+    assert not reusable_for(finish_reason=None, completion_tokens=0, max_tokens=128, generated_max_tokens=64)
+    assert not reusable_for(finish_reason=None, completion_tokens=0, max_tokens=64)  # semantic rows: no budget
+
+
+def test_unknown_finish_reason_roundtrips() -> None:
+    body = cacheable_body(_resp().model_dump())
+    entry = encode_entry(body, prompt_tokens=3, completion_tokens=0, total_tokens=3, fresh_until=1.0, compute_ms=1,
+                         max_tokens=64, finish_reason=None)
+    hit = decode_entry(entry, request_id="new", created=99)
+    assert hit is not None and (hit.finish_reason, hit.max_tokens) == (None, 64)
+
+
+def test_compressed_entry_roundtrip_and_small_bodies_stay_raw() -> None:
+    body = cacheable_body(_resp().model_dump())
+    codec = ZlibCodec(level=3, min_bytes=0)
+    kw = dict(prompt_tokens=3, completion_tokens=4, total_tokens=7, fresh_until=1.0, compute_ms=1, max_tokens=8, finish_reason="stop")
+    entry = encode_entry(body, codec=codec, **kw)  # type: ignore[arg-type]
+    assert entry.split(b"\n", 1)[0].endswith(b" zlib")
+    # zlib needs no state: entries decode even where another codec is configured
+    for reader in (codec, IDENTITY):
+        hit = decode_entry(entry, request_id="new", created=99, codec=reader)
+        assert hit is not None and orjson.loads(hit.body)["choices"] == orjson.loads(body)["choices"]
+
+    raw = encode_entry(body, codec=ZlibCodec(level=3, min_bytes=len(body) + 1), **kw)  # type: ignore[arg-type]
+    assert raw.endswith(body)
+    assert decode_entry(raw.replace(b" -\n", b" zstd\n", 1), request_id="r", created=1) is None  # no zstd codec here
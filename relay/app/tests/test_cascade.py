@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from app.core.backend import GenerationResult
+from app.core.cascade import run_cascade
+from app.core.policy_engine import build_plan, plan_dict
+from app.core.settings import CascadeConfig, PolicyConfig, TenantPolicy, TierConfig
+from app.utils.cache_keys import cache_signature
+
+
+@pytest.mark.asyncio
+async def test_escalates_on_refusal_and_records_each_step() -> None:
+    answers = {
+        "small": GenerationResult(text="I can't help with that.", completion_tokens=6, backend_meta={"model": "1b"}),
+        "large": GenerationResult(text="Here is the answer.", completion_tokens=5, backend_meta={"model": "8b"}),
+    }
+    calls: list[str] = []
+
+    async def generate(tier: str) -> GenerationResult:
+        calls.append(tier)
+        return answers[tier]
+
+    trace: dict[str, Any] = {"reasons": []}
+    result = await run_cascade(("small", "large"), generate, CascadeConfig(), trace)
+
+    assert calls == ["small", "large"]
+    assert result.text == "Here is the answer." and result.backend_meta is not None
+    assert result.backend_meta["tier"] == "large"
+    assert [s["escalated"] for s in trace["cascade"]] == ["refusal(\"i can't\")", None]
+    assert trace["reasons"] == ["cascade escalated small -> large: refusal(\"i can't\")"]
+
+    calls.clear()
+    answers["small"] = GenerationResult(text="Paris.", backend_meta={"model": "1b", "done_reason": "stop"})
+    result = await run_cascade(("small", "large"), generate, CascadeConfig(), {"reasons": []})
+    assert calls == ["small"] and result.text == "Paris."
+
+
+def test_remapping_a_tier_changes_the_cache_signature() -> None:
+    policy = PolicyConfig(
+        policy_version="t",
+        tenants={"default": TenantPolicy()},
+        routing={"length_buckets": {"short": {"max_chars": 100}}},
+        plans={"short": {"cascade": ["small", "large"]}},
+        tiers={"small": TierConfig(model="1b"), "large": TierConfig(model="8b")},
+    )
+
+    def sig(p: PolicyConfig) -> str:
+        plan, _ = build_plan(policy=p, tenant_id="default", prompt_chars=10,
+                             override_temperature=None, override_max_tokens=None)
+        return cache_signature(plan_dict(plan))
+
+    plan = plan_dict(build_plan(policy=policy, tenant_id="default", prompt_chars=10,
+                                override_temperature=None, override_max_tokens=None)[0])
+    assert plan["model"] == "8b" and plan["cascade_models"] == ["1b", "8b"]
+    remapped = policy.model_copy(update={"tiers": {**policy.tiers, "small": TierConfig(model="3b")}})
+    assert sig(remapped) != sig(policy)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.core.settings import BackendCircuitBreaker
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_trips_on_errors_then_probes_with_backoff() -> None:
+    clock = _Clock()
+    br = CircuitBreaker(BackendCircuitBreaker(window=10, min_calls=4, error_rate=0.5, open_s=5.0), clock=clock)
+    for failed in (False, True, False, True):
+        br.on_send()
+        br.on_failure(probe=False) if failed else br.on_success(ttft_ms=100, probe=False)
+    assert br.state == OPEN and not br.can_send()
+
+    clock.now = 5.0
+    assert br.state == HALF_OPEN and br.can_send()
+    assert br.on_send() is True
+    assert not br.can_send()  # one probe at a time
+    br.on_failure(probe=True)
+    assert br.state == OPEN and br.retry_after_s() == 10.0  # second consecutive trip: doubled
+
+    clock.now = 15.0
+    probe = br.on_send()
+    br.on_success(ttft_ms=100, probe=probe)
+    assert br.state == CLOSED
+
+
+def test_slow_calls_trip_and_cancelled_probe_frees_slot() -> None:
+    clock = _Clock()
+    br = CircuitBreaker(
+        BackendCircuitBreaker(window=5, min_calls=5, slow_call_ms=1000, slow_call_rate=0.8, open_s=1.0), clock=clock
+    )
+    for _ in range(5):
+        br.on_success(ttft_ms=5000, probe=br.on_send())
+    assert br.state == OPEN
+
+    clock.now = 1.0
+    probe = br.on_send()
+    br.on_cancel(probe)
+    assert br.state == HALF_OPEN and br.can_send()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from app.core.context_reuse import (
+    ContextEntry,
+    conversation_hash,
+    decode_context,
+    encode_context,
+    split_continued_turn,
+)
+from app.models.openai_chat import ChatMessage
+
+
+def _m(role: str, content: str) -> ChatMessage:
+    return ChatMessage(role=role, content=content)
+
+
+def test_follow_up_turn_is_keyed_by_the_conversation_that_produced_the_context() -> None:
+    first = (_m("system", "be brief"), _m("user", "hi"))
+    answered = first + (_m("assistant", "hello"),)
+    follow_up = answered + (_m("user", "and again?"),)
+
+    turn = split_continued_turn(follow_up)
+    assert turn is not None
+    # the route stores the context under the hash of the messages plus the answer it served
+    assert turn.prefix_hash == conversation_hash(answered)
+    assert turn.prefix_messages == 3
+    assert turn.new_messages == (_m("user", "and again?"),)
+
+    assert split_continued_turn(first) is None  # first turn: nothing to continue
+    assert split_continued_turn(answered) is None  # nothing new after the last answer
+
+
+def test_context_entry_roundtrip_and_rejects_garbage() -> None:
+    entry = ContextEntry(base_url="http://b:11434", tokens=[1, 2, 128000, 0])
+    assert decode_context(encode_context(entry)) == entry
+    assert decode_context(b"not a context entry") is None
+    assert decode_context(b"k1 http://b\n\x00\x01") is None  # truncated token array
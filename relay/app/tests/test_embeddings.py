@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.core.embeddings import cosine_rows
+
+
+def test_cosine_rows_pairs_rows_and_handles_zero_vectors() -> None:
+    a = np.array([[1.0, 0.0], [1.0, 1.0], [0.0, 0.0]], dtype=np.float32)
+    b = np.array([[2.0, 0.0], [-1.0, -1.0], [1.0, 0.0]], dtype=np.float32)
+    assert np.allclose(cosine_rows(a, b), [1.0, -1.0, 0.0])
+
+    # float32 rounding never leaves [-1, 1]
+    v = np.random.default_rng(0).normal(size=(64, 384)).astype(np.float32)
+    sims = cosine_rows(v, v * 3.0)
+    assert sims.max() <= 1.0 and np.allclose(sims, 1.0)
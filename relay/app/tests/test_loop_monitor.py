@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from app.core.loop_monitor import LagHistogram
+
+
+def test_lag_histogram_quantiles_are_bucket_upper_bounds() -> None:
+    hist = LagHistogram(bounds=(1, 10, 100))
+    for ms in [0.5] * 90 + [7.0] * 9 + [400.0]:
+        hist.observe(ms)
+
+    assert hist.quantile(0.50) == 1.0
+    assert hist.quantile(0.99) == 10.0
+    assert hist.quantile(1.0) == 400.0  # past the last bound: the max seen
+    snap = hist.snapshot()
+    assert snap["buckets"] == {"le_1": 90, "le_10": 9, "le_100": 0, "le_inf": 1}
+    assert snap["n"] == 100 and snap["max_ms"] == 400.0
+
+    assert LagHistogram().quantile(0.99) == 0.0
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import hashlib
+
+from app.core.settings import PromptScrubber, TenantNormalize
+from app.models.openai_chat import ChatMessage
+from app.utils.normalize import normalize_messages
+
+
+def _msgs(system: str, user: str) -> list[ChatMessage]:
+    return [ChatMessage(role="system", content=system), ChatMessage(role="user", content=user)]
+
+
+def test_no_chain_keeps_the_plain_hash_and_the_prompt() -> None:
+    n = normalize_messages(_msgs(" be brief ", "Hi  there?"), TenantNormalize())
+    assert n.canonical_text == "system:be brief\nuser:Hi  there?"
+    assert n.request_hash == hashlib.sha256(n.canonical_text.encode()).hexdigest()
+    assert n.applied == () and n.normalizer_sig is None
+
+
+def test_chain_merges_noisy_variants_and_records_what_it_did() -> None:
+    cfg = TenantNormalize(
+        nfkc=True,
+        collapse_whitespace=True,
+        casefold=True,
+        strip_trailing_punctuation=True,
+        fingerprint_system=True,
+        scrubbers=[PromptScrubber(name="ts", pattern=r"\d{4}-\d{2}-\d{2}T[\d:]+Z", roles=["system"])],
+    )
+    a = normalize_messages(_msgs("Now: 2024-06-01T10:00:00Z", "What is  the ｃapital of France?"), cfg)
+    b = normalize_messages(_msgs("Now: 2024-06-02T11:30:00Z", "what is the capital of france"), cfg)
+    assert a.request_hash == b.request_hash
+    assert a.system_fingerprint == b.system_fingerprint is not None
+    assert a.applied == ("nfkc", "scrub:ts", "casefold", "collapse_whitespace", "strip_trailing_punctuation", "fingerprint_system")
+    # the backend still gets what the client sent
+    assert a.canonical_text.endswith("user:What is  the ｃapital of France?")
+
+    # scrubbers are role-scoped, and a different chain never shares keys with this one
+    c = normalize_messages(_msgs("Now: 2024-06-01T10:00:00Z", "at 2024-06-01T10:00:00Z"), cfg)
+    d = normalize_messages(_msgs("Now: 2024-06-01T10:00:00Z", "at 2024-06-02T10:00:00Z"), cfg)
+    assert c.request_hash != d.request_hash
+    assert normalize_messages(_msgs("x", "y"), cfg).request_hash != normalize_messages(
+        _msgs("x", "y"), TenantNormalize(casefold=True)
+    ).request_hash
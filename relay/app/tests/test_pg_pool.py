@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import pytest
+
+from app.db import pg_pool
+
+
+class _Pool:
+    def __init__(self, *, acquire_s: float, query_s: float):
+        self.acquire_s, self.query_s = acquire_s, query_s
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator["_Pool"]:
+        await asyncio.sleep(self.acquire_s)
+        yield self
+
+    async def fetchrow(self, sql: str, *args: Any) -> dict[str, Any]:
+        await asyncio.sleep(self.query_s)
+        return {"sql": sql, "args": args}
+
+
+@pytest.mark.asyncio
+async def test_one_deadline_covers_pool_wait_and_query(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pg_pool, "_pool", _Pool(acquire_s=0.0, query_s=0.0))
+    assert await pg_pool.fetchrow("SELECT $1", 1, timeout_s=1.0) == {"sql": "SELECT $1", "args": (1,)}
+
+    # each part fits the deadline on its own, together they do not
+    monkeypatch.setattr(pg_pool, "_pool", _Pool(acquire_s=0.06, query_s=0.06))
+    with pytest.raises(TimeoutError):
+        await pg_pool.fetchrow("SELECT 1", timeout_s=0.1)
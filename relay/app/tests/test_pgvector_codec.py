@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+
+from app.db.pgvector_codec import decode_vector, encode_vector, register_vector_codec
+
+
+def test_vector_roundtrip_matches_pgvector_wire_format() -> None:
+    vec = np.array([0.5, -1.25, 3.0], dtype=np.float64)
+    buf = encode_vector(vec)
+    # int16 dim, int16 unused, big-endian float32s (what vector_recv expects)
+    assert buf[:4] == b"\x00\x03\x00\x00" and buf[4:8] == b"\x3f\x00\x00\x00" and len(buf) == 4 + 3 * 4
+    out = decode_vector(buf)
+    assert out.dtype == np.float32 and np.array_equal(out, vec.astype(np.float32))
+
+
+@pytest.mark.asyncio
+async def test_missing_extension_fails_connection_init() -> None:
+    class Conn:
+        async def set_type_codec(self, *args: Any, **kwargs: Any) -> None:
+            raise ValueError("unknown type: public.vector")
+
+    with pytest.raises(RuntimeError, match="pgvector"):
+        await register_vector_codec(Conn())
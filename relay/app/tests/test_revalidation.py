@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+import app.api.routes as routes
+from app.models.openai_chat import ChatCompletionsRequest, ChatMessage
+from app.utils.cached_response import RawChatResponse
+
+
+class _Redis:
+    def __init__(self) -> None:
+        self.d: dict[str, Any] = {}
+
+    async def set(self, k: str, v: Any, *, nx: bool, ex: int) -> bool:
+        if nx and k in self.d:
+            return False
+        self.d[k] = v
+        return True
+
+    async def eval(self, script: str, numkeys: int, key: str, token: str) -> int:
+        return 1 if self.d.pop(key, None) == token else 0
+
+
+class _Scheduler:
+    def utilization(self, lanes: Any) -> float:
+        return 0.0
+
+
+@pytest.mark.asyncio
+async def test_refresh_regenerates_under_the_entrys_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    redis = _Redis()
+    refreshed: list[tuple[int | None, float | None]] = []
+
+    async def run_chat_completion(req: ChatCompletionsRequest, **kw: Any) -> RawChatResponse:
+        refreshed.append((req.max_tokens, req.temperature))
+        return RawChatResponse(id="x", body=b"{}")
+
+    monkeypatch.setattr(routes, "get_redis", lambda: redis)
+    monkeypatch.setattr(routes, "get_scheduler", lambda: _Scheduler())
+    monkeypatch.setattr(routes, "run_chat_completion", run_chat_completion)
+
+    # a max_tokens=50 request hit an entry generated under 256: the refresh must not cut it at 50
+    req = ChatCompletionsRequest(model="m", messages=[ChatMessage(role="user", content="hi")], max_tokens=50,
+                                 temperature=0.2)
+    assert await routes._start_revalidation(req, tenant_id="t", key="k", max_tokens=256) == "started"
+    assert await routes._start_revalidation(req, tenant_id="t", key="k", max_tokens=256) == "in_progress"
+    await asyncio.gather(*routes._revalidations)
+
+    assert refreshed == [(256, 0.2)]
+    assert req.max_tokens == 50
+    assert redis.d == {}  # lock released
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from app.core.rollups import LATENCY_BUCKETS_MS, TraceRollups, hist_quantile, latency_bucket, summarize
+
+
+def test_record_folds_requests_into_minute_cells() -> None:
+    rollups = TraceRollups(flush_interval_s=60)
+    common = dict(tenant_id="acme", cache_outcome="miss", degraded=False, prompt_tokens=10, completion_tokens=None)
+    rollups.record(created_at=120.5, lane="short", status_code=200, latency_ms=40, **common)  # type: ignore[arg-type]
+    rollups.record(created_at=179.9, lane="short", status_code=503, latency_ms=200_000, **common)  # type: ignore[arg-type]
+    rollups.record(created_at=180.0, lane=None, status_code=200, latency_ms=5, **common)  # type: ignore[arg-type]
+
+    cells = {(c["bucket_start"], c["lane"]): c for c in rollups.drain()}
+    assert set(cells) == {(120, "short"), (180, "none")}
+    short = cells[(120, "short")]
+    assert (short["requests"], short["errors"], short["prompt_tokens"], short["completion_tokens"]) == (2, 1, 20, 0)
+    assert short["latency_hist"][latency_bucket(40)] == 1 and short["latency_hist"][-1] == 1
+    assert rollups.drain() == []
+
+
+def test_hist_quantile_returns_bucket_bounds() -> None:
+    hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    hist[latency_bucket(40)] = 95
+    hist[-1] = 5
+    assert hist_quantile(hist, 0.50) == 50
+    assert hist_quantile(hist, 0.99) is None  # above the last bound
+    assert hist_quantile([0] * len(hist), 0.5) is None
+
+
+def test_summarize_counts_overload_hits_as_semantic_hits_served_instead_of_admission() -> None:
+    def row(outcome: str, requests: int, degraded: int = 0) -> dict[str, object]:
+        hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        hist[latency_bucket(20)] = requests
+        return {"tenant_id": "acme", "cache_outcome": outcome, "requests": requests, "errors": 0, "degraded": degraded,
+                "prompt_tokens": 0, "completion_tokens": 0, "latency_sum_ms": 20 * requests, "latency_hist": hist}
+
+    t = summarize([row("exact_hit", 2), row("semantic_hit", 1), row("overload_hit", 3), row("miss", 4, degraded=1)])["acme"]
+    assert t["requests"] == 10 and t["exact_hit_rate"] == 0.2 and t["semantic_hit_rate"] == 0.4
+    assert t["admission"]["served_from_cache"] == 3 and t["admission"]["degraded"] == 1
+    assert t["latency_ms"] == {"mean": 20.0, "p50": 25, "p95": 25, "p99": 25}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.policy_engine import ExecutionPlan
+from app.core.scheduler import BATCH_LANE, JobExpiredError, ScheduledJob, Scheduler
+from app.core.settings import PolicyConfig
+
+
+def _policy(workers: int = 1) -> PolicyConfig:
+    return PolicyConfig.model_validate(
+        {
+            "policy_version": "test",
+            "tenants": {"default": {}},
+            "routing": {},
+            "plans": {},
+            "scheduler": {"workers": workers},
+        }
+    )
+
+
+def _job(lane: str, tenant: str, order: list[str], name: str, start_by: float | None = None) -> ScheduledJob:
+    async def run() -> object:
+        order.append(name)
+        return name
+
+    return ScheduledJob(
+        request_id=name,
+        tenant_id=tenant,
+        lane=lane,
+        created_at=time.time(),
+        slo_ms=1000,
+        plan=ExecutionPlan("standard", "fast", 16, 0.0, {}, "short", "m"),
+        run=run,
+        fut=asyncio.get_running_loop().create_future(),
+        queue_entered_at=time.perf_counter(),
+        start_by=start_by,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_lane_runs_after_interactive_lanes() -> None:
+    sched = Scheduler(_policy())
+    order: list[str] = []
+    jobs = [
+        _job(BATCH_LANE, "t1", order, "batch-1"),
+        _job("long", "t1", order, "long-1"),
+        _job("short", "t1", order, "short-1"),
+        _job("short", "t2", order, "short-2"),
+    ]
+    for j in jobs:
+        await sched.submit(j)
+
+    assert sched.utilization() == 3.0
+
+    sched.start()
+    await asyncio.wait_for(asyncio.gather(*(j.fut for j in jobs)), timeout=2)
+    await sched.stop()
+
+    assert order == ["short-1", "short-2", "long-1", "batch-1"]
+    assert sched.busy() == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_tracks_backend_capacity() -> None:
+    sched = Scheduler(_policy(workers=2))
+    for i in range(4):
+        await sched.submit(_job("short", "t1", [], f"s{i}"))
+
+    _, full_wait = sched.admission_check(lane="short", tenant_slo_ms=60_000, prompt_chars=10)
+    sched.capacity = lambda: 0.5
+    _, half_wait = sched.admission_check(lane="short", tenant_slo_ms=60_000, prompt_chars=10)
+    assert half_wait == 2 * full_wait
+
+    sched.capacity = lambda: 0.0
+    result, _ = sched.admission_check(lane="short", tenant_slo_ms=60_000, prompt_chars=10)
+    assert result.rejected and result.reason == "backends_unavailable"
+
+
+@pytest.mark.asyncio
+async def test_job_not_started_by_its_deadline_is_dropped() -> None:
+    sched = Scheduler(_policy())
+    order: list[str] = []
+    late = _job(BATCH_LANE, "t1", order, "late", start_by=time.time() - 1)
+    on_time = _job(BATCH_LANE, "t1", order, "on-time", start_by=time.time() + 60)
+    await sched.submit(late)
+    await sched.submit(on_time)
+
+    sched.start()
+    assert await asyncio.wait_for(on_time.fut, timeout=2) == "on-time"
+    await sched.stop()
+
+    with pytest.raises(JobExpiredError):
+        late.fut.result()
+    assert order == ["on-time"]
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from app.core.sim_backend import SimConfig, SimulatedBackend
+
+
+def test_plan_caps_completions_and_marks_truncation() -> None:
+    sim = SimulatedBackend(SimConfig(output_tokens_mean=50, seed=3))
+    plans = [sim.plan(prompt="x" * 40, max_tokens=64) for _ in range(500)]
+    assert all(1 <= p.completion_tokens <= 64 for p in plans)
+    assert all((p.done_reason == "length") == (p.completion_tokens == 64) for p in plans)
+    assert any(p.done_reason == "length" for p in plans) and any(p.done_reason == "stop" for p in plans)
+    assert all(p.prompt_tokens == 10 and p.cached_tokens == 0 and not (p.fail or p.hang) for p in plans)
+
+    # same seed, same plans
+    again = SimulatedBackend(SimConfig(output_tokens_mean=50, seed=3))
+    assert [again.plan(prompt="x" * 40, max_tokens=64) for _ in range(500)] == plans
+
+
+def test_plan_prefix_cache_and_injected_failures() -> None:
+    sim = SimulatedBackend(SimConfig(prefix_cache_prompts=2, seed=1))
+    assert sim.plan(prompt="system: be brief\nuser: hi", max_tokens=8).cached_tokens == 0
+    p = sim.plan(prompt="system: be brief\nuser: bye", max_tokens=8)
+    assert p.cached_tokens == len("system: be brief\nuser: ") // 4
+    # a repeated prompt still evaluates its last token
+    assert sim.plan(prompt="system: be brief\nuser: bye", max_tokens=8).cached_tokens == p.prompt_tokens - 1
+
+    assert all(SimulatedBackend(SimConfig(error_rate=1.0)).plan(prompt="q", max_tokens=8).fail for _ in range(20))
+    hung = SimulatedBackend(SimConfig(timeout_rate=1.0)).plan(prompt="q", max_tokens=8)
+    assert hung.hang and not hung.fail
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.utils.stats import bootstrap_ci, bootstrap_relative_change, mean_stat, quantile_stat
+
+
+def test_bootstrap_ci_brackets_point() -> None:
+    values = np.random.default_rng(1).lognormal(5.0, 0.5, size=400)
+    point, lo, hi = bootstrap_ci(values, quantile_stat(0.95), n_boot=500)
+    assert lo <= point <= hi
+
+
+def test_paired_relative_change_detects_uniform_slowdown() -> None:
+    base = np.random.default_rng(2).lognormal(5.0, 1.0, size=200)
+    point, lo, hi = bootstrap_relative_change(base, base * 1.2, mean_stat, paired=True, n_boot=500)
+    # every item is exactly 20% slower, so pairing leaves no noise at all
+    assert np.isclose(point, 0.2) and np.isclose(lo, 0.2) and np.isclose(hi, 0.2)
+
+    _, lo_ind, hi_ind = bootstrap_relative_change(base, base * 1.2, mean_stat, paired=False, n_boot=500)
+    assert hi_ind - lo_ind > 0.05
+
+
+def test_relative_change_from_zero_baseline() -> None:
+    zeros = np.zeros(10)
+    assert bootstrap_relative_change(zeros, zeros, mean_stat, paired=True, n_boot=50)[0] == 0.0
+    assert bootstrap_relative_change(zeros, zeros + 1, mean_stat, paired=True, n_boot=50)[0] == np.inf
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from app.core.timing import StageTimer
+
+
+def test_stages_accumulate_and_render_as_server_timing() -> None:
+    timer = StageTimer()
+    with timer.stage("exact_lookup"):
+        pass
+    timer.add("backend", 12.5)
+    timer.add("backend", 0.25)  # e.g. a retry: repeated stages add up
+
+    out = timer.as_dict()
+    assert out["backend"] == 12.75 and out["exact_lookup"] >= 0.0
+    assert list(out) == ["exact_lookup", "backend", "total"]
+
+    header = timer.server_timing()
+    assert header.startswith("exact_lookup;dur=") and ", backend;dur=12.75, total;dur=" in header
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+
+from app.db import trace_export
+from app.db.trace_export import EXPORT_COLUMNS, ExportQuery, stream_csv
+
+
+def test_export_sql_numbers_only_the_filters_given() -> None:
+    since = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    sql, args = ExportQuery(tenant_id="acme", since=since).sql()
+    assert args == ["acme", since]
+    assert "WHERE tenant_id = $1 AND created_at >= $2 ORDER BY created_at" in sql
+    assert " AS messages" not in sql
+
+    sql, args = ExportQuery(include_payloads=True).sql()
+    assert args == [] and "WHERE" not in sql and " AS messages" in sql
+    assert len(ExportQuery().columns()) == len(EXPORT_COLUMNS)
+
+
+class _Conn:
+    def __init__(self, rows: int, fail: bool = False):
+        self.rows, self.fail, self.closed = rows, fail, False
+
+    async def copy_from_query(self, sql: str, *args: Any, output: Any, **kwargs: Any) -> None:
+        for i in range(self.rows):
+            await output(b"%d\n" % i)
+        if self.fail:
+            raise RuntimeError("copy failed")
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_stream_csv_ends_cleanly_on_disconnect_and_surfaces_copy_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    conns: list[_Conn] = []
+
+    async def connect(dsn: str) -> _Conn:
+        return conns[-1]
+
+    monkeypatch.setattr("app.db.trace_export.asyncpg.connect", connect)
+    monkeypatch.setattr(trace_export, "asyncpg_dsn", lambda: "postgresql://")
+
+    conns.append(_Conn(rows=50))
+    assert len([c async for c in stream_csv(ExportQuery(), max_chunks=2)]) == 50
+
+    # the client goes away with the queue full: the COPY task must still finish
+    conns.append(_Conn(rows=50))
+    gen = stream_csv(ExportQuery(), max_chunks=2)
+    await gen.__anext__()
+    await asyncio.sleep(0)
+    before = asyncio.all_tasks()
+    await gen.aclose()
+    await asyncio.wait_for(asyncio.gather(*(before - {asyncio.current_task()}), return_exceptions=True), 1.0)
+    assert conns[-1].closed
+
+    conns.append(_Conn(rows=3, fail=True))
+    with pytest.raises(RuntimeError, match="copy failed"):
+        [c async for c in stream_csv(ExportQuery(), max_chunks=2)]
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from app.db.trace_partitions import DEFAULT_PARTITION, partition_range, plan_partitions
+
+DAY = timedelta(days=1)
+HOUR = timedelta(hours=1)
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def test_plan_partitions_skips_covered_ranges_and_fills_partial_overlaps_hourly() -> None:
+    # hourly maintenance next to a daily partition for today
+    wanted = [(T0 + i * HOUR, T0 + (i + 1) * HOUR) for i in range(22, 27)]
+    assert plan_partitions(wanted, [(T0, T0 + DAY)]) == [(T0 + DAY, HOUR), (T0 + DAY + HOUR, HOUR), (T0 + DAY + 2 * HOUR, HOUR)]
+
+    # switched back to daily: tomorrow already has two hourly partitions
+    existing = [(T0 + DAY, T0 + DAY + HOUR), (T0 + DAY + 5 * HOUR, T0 + DAY + 6 * HOUR)]
+    planned = plan_partitions([(T0 + DAY, T0 + 2 * DAY), (T0 + 2 * DAY, T0 + 3 * DAY)], existing)
+    assert [s for s, step in planned if step == HOUR] == [T0 + DAY + h * HOUR for h in range(24) if h not in (0, 5)]
+    assert planned[-1] == (T0 + 2 * DAY, DAY)
+
+    assert plan_partitions([(T0, T0 + DAY), (T0, T0 + DAY)], []) == [(T0, DAY)]
+
+
+def test_partition_range_reads_daily_and_hourly_names() -> None:
+    assert partition_range("request_traces_p20260301") == (T0, T0 + DAY)
+    assert partition_range("request_traces_p2026030123") == (T0 + 23 * HOUR, T0 + DAY)
+    for name in (DEFAULT_PARTITION, "request_traces_p202603", "request_traces_legacy", "other_p20260301"):
+        assert partition_range(name) is None
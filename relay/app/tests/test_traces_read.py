@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime, timezone
+
+import pytest
+
+from app.db.traces_read import decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrips_and_rejects_garbage() -> None:
+    ts = datetime(2026, 3, 1, 12, 30, 5, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(ts, "req|with-pipe")
+    assert decode_cursor(cursor) == (ts, "req|with-pipe")
+
+    # the admin routes answer these with a 400
+    no_id = base64.urlsafe_b64encode(ts.isoformat().encode()).decode()
+    for bad in ("not base64!", no_id, "é"):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
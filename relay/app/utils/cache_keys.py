@@ -14,4 +14,14 @@ def plan_signature(plan:dict[str,Any]) ->str:
 
 def exact_cache_key(*,tenant_id:str, request_hash : str, plan_sig : str) -> str:
     # to have user privacy we will only cache hit when all 3 matches 
-    return f"exact:{tenant_id}:{plan_sig}:{request_hash}"
\ No newline at end of file
+    return f"exact:{tenant_id}:{plan_sig}:{request_hash}"
+
+# plan fields that do not change the answer: the cache settings themselves, and max_tokens,
+# which only caps it (whether a cached answer fits a budget is app.utils.cached_response.reusable_for)
+_NOT_ANSWER_SHAPING = ("cache", "max_tokens")
+
+
+def cache_signature(plan: dict[str, Any]) -> str:
+    ## what both caches are keyed by: a degraded request (smaller max_tokens) or a retuned
+    ## threshold lands on the same entries as before
+    return plan_signature({k: v for k, v in plan.items() if k not in _NOT_ANSWER_SHAPING})
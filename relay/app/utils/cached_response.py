@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import math
+import random
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import orjson
+
+# Cached chat completions are kept as ready-to-send JSON: the response object without its
+# per-request fields, which are spliced back in on every hit. A hit is then a bytes concat,
+# not a parse + validate + serialize round trip.
+PER_REQUEST_FIELDS = ("id", "created")
+
+# exact-cache entry:
+#   b"r4 <prompt> <completion> <total> <fresh_until> <compute_ms> <max_tokens> <finish_reason> <codec>\n"
+#   + body, compressed by <codec> ("-" = stored as is).
+# The usage header lets the trace record token counts without parsing the body. fresh_until
+# (epoch seconds) is the soft TTL, the Redis TTL the hard one; compute_ms is what producing the
+# answer cost, which scales early refresh (see should_refresh). max_tokens (the budget it was
+# generated under) and finish_reason ("-" = the backend did not report one) decide which
+# requests may reuse it (see reusable_for).
+# r3 is r4 without the codec (never compressed). Older formats were keyed by the full plan
+# signature, which is no longer looked up; any other header reads as a miss.
+_ENTRY_MAGIC = b"r4"
+_UNCOMPRESSED_MAGIC = b"r3"
+_UNKNOWN_FINISH = "-"
+
+
+class BodyCodec:
+    """
+    Compression for exact-cache bodies. `name` goes in the entry header; bodies shorter than
+    `min_bytes` are stored as is, where the codec's framing would eat the saving.
+    """
+
+    name = "-"
+
+    def __init__(self, *, min_bytes: int = 0):
+        self.min_bytes = min_bytes
+
+    def compress(self, body: bytes) -> bytes:
+        return body
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZlibCodec(BodyCodec):
+    """Standard library deflate: no extra dependency, ~3x on chat completion JSON."""
+
+    name = "zlib"
+
+    def __init__(self, *, level: int, min_bytes: int = 0):
+        super().__init__(min_bytes=min_bytes)
+        self.level = level
+
+    def compress(self, body: bytes) -> bytes:
+        return zlib.compress(body, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec(BodyCodec):
+    """
+    zstd, optionally with a dictionary trained on past responses (scripts/train_zstd_dict.py).
+    A dictionary pays off most on short bodies, which share their JSON skeleton and boilerplate
+    but are too small for plain compression to learn it. Frames carry the dictionary id, so
+    entries written with another dictionary fail to decompress and read as a miss.
+    Needs the optional `zstandard` package (`poetry install -E zstd`).
+    """
+
+    name = "zstd"
+
+    def __init__(self, *, level: int, dict_path: Optional[str] = None, min_bytes: int = 0):
+        import zstandard
+
+        super().__init__(min_bytes=min_bytes)
+        dict_data = zstandard.ZstdCompressionDict(Path(dict_path).read_bytes()) if dict_path else None
+        kwargs = {"dict_data": dict_data} if dict_data is not None else {}
+        self._compressor = zstandard.ZstdCompressor(level=level, **kwargs)
+        self._decompressor = zstandard.ZstdDecompressor(**kwargs)
+
+    def compress(self, body: bytes) -> bytes:
+        return bytes(self._compressor.compress(body))
+
+    def decompress(self, data: bytes) -> bytes:
+        return bytes(self._decompressor.decompress(data))
+
+
+IDENTITY = BodyCodec()
+
+
+def make_codec(kind: str, *, level: int, dict_path: Optional[str] = None, min_bytes: int = 0) -> BodyCodec:
+    """Codec for the EXACT_CACHE_COMPRESSION setting: "off", "zlib" or "zstd"."""
+    if kind == "off":
+        return IDENTITY
+    if kind == "zlib":
+        return ZlibCodec(level=level, min_bytes=min_bytes)
+    if kind == "zstd":
+        try:
+            return ZstdCodec(level=level, dict_path=dict_path, min_bytes=min_bytes)
+        except ImportError:
+            raise RuntimeError("EXACT_CACHE_COMPRESSION=zstd needs zstandard (poetry install -E zstd)") from None
+    raise ValueError(f"unknown exact cache compression: {kind!r}")
+
+
+@dataclass(slots=True)  # not frozen: one is built per cache hit and frozen __init__ is ~3x slower
+class RawChatResponse:
+    """A chat completion already serialized for the wire, plus what the trace needs from it."""
+
+    id: str
+    body: bytes
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    # exact-cache hits only: soft expiry and recompute cost of the entry
+    fresh_until: float = math.inf
+    compute_ms: int = 0
+    # "length" when the answer was cut at the budget it was generated under, None when the
+    # backend did not say (may be either)
+    finish_reason: Optional[str] = "stop"
+    # exact-cache hits only: that budget
+    max_tokens: int = 0
+    # set when the answer is a relaxed match the client should know about (X-Relay-Cache header)
+    cache_status: Optional[str] = None
+
+
+def cacheable_body(resp_obj: dict[str, Any]) -> bytes:
+    """Response dict -> JSON object bytes without the per-request fields."""
+    return orjson.dumps({k: v for k, v in resp_obj.items() if k not in PER_REQUEST_FIELDS})
+
+
+def render(body: bytes, *, request_id: str, created: int) -> bytes:
+    """Splice id/created in front of a cacheable body (any JSON object text, e.g. jsonb output)."""
+    start = body.index(b"{") + 1
+    rest = body[start:].lstrip()
+    sep = b"" if rest.startswith(b"}") else b","
+    return b'{"id":' + orjson.dumps(request_id) + b',"created":' + str(created).encode() + sep + rest
+
+
+def encode_entry(
+    body: bytes,
+    *,
+    prompt_tokens: int,
+    completion_tokens: int,
+    total_tokens: int,
+    fresh_until: float,
+    compute_ms: int,
+    max_tokens: int,
+    finish_reason: Optional[str],
+    codec: BodyCodec = IDENTITY,
+) -> bytes:
+    if len(body) >= codec.min_bytes and codec is not IDENTITY:
+        body, codec_name = codec.compress(body), codec.name
+    else:
+        codec_name = IDENTITY.name
+    head = b"%s %d %d %d %.3f %d %d %s %s\n" % (
+        _ENTRY_MAGIC, prompt_tokens, completion_tokens, total_tokens, fresh_until, compute_ms, max_tokens,
+        (finish_reason or _UNKNOWN_FINISH).encode("ascii"), codec_name.encode("ascii"),
+    )
+    return head + body
+
+
+def decode_entry(
+    raw: bytes, *, request_id: str, created: int, codec: BodyCodec = IDENTITY
+) -> Optional[RawChatResponse]:
+    """
+    Exact-cache value -> rendered response; None for entries written in another format, or
+    compressed with a codec other than `codec` (zlib always decodes: it has no state).
+    """
+    head, nl, body = raw.partition(b"\n")
+    parts = head.split(b" ")
+    if not nl or not ((parts[0] == _ENTRY_MAGIC and len(parts) == 9) or (parts[0] == _UNCOMPRESSED_MAGIC and len(parts) == 8)):
+        return None
+    try:
+        prompt, completion, total = map(int, parts[1:4])
+        fresh_until = float(parts[4])
+        compute_ms, max_tokens = int(parts[5]), int(parts[6])
+        codec_name = parts[8].decode("ascii") if len(parts) == 9 else IDENTITY.name
+        if codec_name == codec.name:
+            body = codec.decompress(body)
+        elif codec_name == ZlibCodec.name:
+            body = zlib.decompress(body)
+        elif codec_name != IDENTITY.name:
+            return None
+    except Exception:
+        # bad numbers, or a body the codec rejects (corrupt, another zstd dictionary)
+        return None
+    return RawChatResponse(
+        id=request_id,
+        body=render(body, request_id=request_id, created=created),
+        prompt_tokens=prompt,
+        completion_tokens=completion,
+        total_tokens=total,
+        fresh_until=fresh_until,
+        compute_ms=compute_ms,
+        finish_reason=None if parts[7] == _UNKNOWN_FINISH.encode("ascii") else parts[7].decode("ascii"),
+        max_tokens=max_tokens,
+    )
+
+
+def reusable_for(
+    *,
+    finish_reason: Optional[str],
+    completion_tokens: int,
+    max_tokens: int,
+    generated_max_tokens: Optional[int] = None,
+    degraded_to: Optional[int] = None,
+) -> bool:
+    """
+    Whether a cached answer (same cache_signature, any budget) can serve a request allowed
+    `max_tokens`. One that finished naturally within it is what the request would have got
+    anyway; a truncated one only if it was cut at exactly this budget. A request being degraded
+    to `degraded_to` tokens also takes a truncated answer at least that long: it is no worse
+    than what the backend would produce for it now. An answer whose finish_reason is unknown
+    (None) only serves the budget it was generated under, `generated_max_tokens`: its token
+    count may be missing too, so neither rule can be checked.
+    """
+    if finish_reason is None:
+        return generated_max_tokens is not None and generated_max_tokens in (max_tokens, degraded_to)
+    if completion_tokens > max_tokens:
+        return False
+    if finish_reason != "length":
+        return True
+    return completion_tokens == max_tokens or (degraded_to is not None and completion_tokens >= degraded_to)
+
+
+def should_refresh(*, fresh_until: float, compute_ms: int, now: float, beta: float, rand: float | None = None) -> bool:
+    """
+    Stale entries always refresh. Fresh ones refresh early with probability rising as expiry
+    nears, more so for expensive answers (XFetch: now - compute * beta * ln(U) >= expiry), so a
+    hot key is refreshed by one request ahead of time instead of by every request at once.
+    """
+    if now >= fresh_until:
+        return True
+    if beta <= 0 or compute_ms <= 0:
+        return False
+    u = 1.0 - random.random() if rand is None else rand  # (0, 1]
+    return now - (compute_ms / 1000.0) * beta * math.log(u) >= fresh_until
@@ -1,19 +1,113 @@
 from __future__ import annotations
 
 import hashlib
+import re
+import string
+import unicodedata
 from dataclasses import dataclass
+from typing import Optional, Sequence
 
+from app.core.settings import TenantNormalize
 from app.models.openai_chat import ChatMessage
 
 
 @dataclass(frozen=True)
 class NormalizedRequest:
+    # what the backend is sent: roles/contents stripped at the ends, nothing else
     messages: tuple[ChatMessage, ...]
     canonical_text: str
+    # cache identity: hash of the canonical text, or of its key form when the tenant has a
+    # normalizer chain (see key_form)
     request_hash: str
+    # the chain's normalizers that changed something in this request, in chain order
+    applied: tuple[str, ...] = ()
+    normalizer_sig: Optional[str] = None
+    system_fingerprint: Optional[str] = None
 
 
-def normalize_messages(messages: list[ChatMessage]) -> NormalizedRequest:
+_TRAILING_PUNCT = ".!?;:,。！？" + string.whitespace
+
+# chain signatures by config object, for callers that hold on to one policy (the warmer's pass)
+_sig_cache: dict[int, tuple[TenantNormalize, str]] = {}
+
+
+def _active(cfg: TenantNormalize) -> bool:
+    return bool(
+        cfg.nfkc or cfg.collapse_whitespace or cfg.scrubbers or cfg.casefold
+        or cfg.strip_trailing_punctuation or cfg.fingerprint_system
+    )
+
+
+def chain_signature(cfg: TenantNormalize) -> str:
+    """Hash of the chain's config, mixed into request_hash: a changed chain starts fresh keys."""
+    hit = _sig_cache.get(id(cfg))
+    if hit is not None and hit[0] is cfg:
+        return hit[1]
+    sig = hashlib.sha256(cfg.model_dump_json().encode("utf-8")).hexdigest()[:16]
+    if len(_sig_cache) >= 256:
+        _sig_cache.clear()  # configs from policies reloaded since
+    _sig_cache[id(cfg)] = (cfg, sig)
+    return sig
+
+
+def key_form(messages: Sequence[ChatMessage], cfg: TenantNormalize) -> tuple[str, tuple[str, ...], Optional[str]]:
+    """
+    The text two requests must share to share cache entries, for a tenant that tolerates some
+    byte-level noise. In order, per message: NFKC; scrubbers (regexes whose matches, e.g.
+    timestamps or ids, become a placeholder); case folding; whitespace runs to one space;
+    trailing punctuation dropped. With fingerprint_system, system messages are then keyed by
+    a short hash, which is also returned so traces can tell system prompts apart.
+    Returns (key text, normalizers that changed something, system fingerprint).
+    """
+    changed: set[str] = set()
+    parts: list[str] = []
+    system_texts: list[str] = []
+
+    for m in messages:
+        text = m.content
+        if cfg.nfkc:
+            t = unicodedata.normalize("NFKC", text)
+            if t != text:
+                changed.add("nfkc")
+                text = t
+        for sc in cfg.scrubbers:
+            if sc.roles is not None and m.role not in sc.roles:
+                continue
+            repl = sc.replacement if sc.replacement is not None else f"<{sc.name}>"
+            t = re.compile(sc.pattern).sub(lambda _: repl, text)  # repl is literal, no group refs
+            if t != text:
+                changed.add(f"scrub:{sc.name}")
+                text = t
+        if cfg.casefold:
+            t = text.casefold()
+            if t != text:
+                changed.add("casefold")
+                text = t
+        if cfg.collapse_whitespace:
+            t = " ".join(text.split())  # ~10x a \s+ regex; the ends are already stripped
+            if t != text:
+                changed.add("collapse_whitespace")
+                text = t
+        if cfg.strip_trailing_punctuation:
+            t = text.rstrip(_TRAILING_PUNCT)
+            if t != text:
+                changed.add("strip_trailing_punctuation")
+                text = t
+        if cfg.fingerprint_system and m.role == "system":
+            system_texts.append(text)
+            text = "#" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        parts.append(f"{m.role}:{text}")
+
+    fingerprint = None
+    if system_texts:
+        changed.add("fingerprint_system")
+        fingerprint = hashlib.sha256("\n".join(system_texts).encode("utf-8")).hexdigest()[:16]
+    order = ["nfkc", *(f"scrub:{sc.name}" for sc in cfg.scrubbers), "casefold", "collapse_whitespace",
+             "strip_trailing_punctuation", "fingerprint_system"]
+    return "\n".join(parts), tuple(n for n in order if n in changed), fingerprint
+
+
+def normalize_messages(messages: list[ChatMessage], cfg: Optional[TenantNormalize] = None) -> NormalizedRequest:
     parts: list[str] = []
     canon_msgs: list[ChatMessage] = []
 
@@ -24,6 +118,19 @@ def normalize_messages(messages: list[ChatMessage]) -> NormalizedRequest:
         parts.append(f"{role}:{content}")
 
     canonical_text = "\n".join(parts)
-    request_hash = hashlib.sha256(canonical_text.encode("utf-8")).hexdigest()
+    if cfg is None or not _active(cfg):
+        # no chain: keys are unchanged from before chains existed
+        request_hash = hashlib.sha256(canonical_text.encode("utf-8")).hexdigest()
+        return NormalizedRequest(messages=tuple(canon_msgs), canonical_text=canonical_text, request_hash=request_hash)
 
-    return NormalizedRequest(messages=tuple(canon_msgs), canonical_text=canonical_text, request_hash=request_hash)
\ No newline at end of file
+    text, applied, fingerprint = key_form(canon_msgs, cfg)
+    sig = chain_signature(cfg)
+    request_hash = hashlib.sha256(f"{sig}\n{text}".encode("utf-8")).hexdigest()
+    return NormalizedRequest(
+        messages=tuple(canon_msgs),
+        canonical_text=canonical_text,
+        request_hash=request_hash,
+        applied=applied,
+        normalizer_sig=sig,
+        system_fingerprint=fingerprint,
+    )
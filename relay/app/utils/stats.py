@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+# statistic over the last axis of a (n_boot, n) array -> (n_boot,)
+Floats = npt.NDArray[np.float64]
+Stat = Callable[[Floats], Floats]
+
+
+def quantile_stat(q: float) -> Stat:
+    return lambda a: np.asarray(np.quantile(a, q, axis=-1), dtype=np.float64)
+
+
+def mean_stat(a: Floats) -> Floats:
+    return np.asarray(np.mean(a, axis=-1), dtype=np.float64)
+
+
+def _interval(samples: Floats, confidence: float) -> tuple[float, float]:
+    alpha = (1.0 - confidence) / 2.0
+    lo, hi = np.quantile(samples, [alpha, 1.0 - alpha])
+    return float(lo), float(hi)
+
+
+def bootstrap_ci(
+    values: Floats,
+    stat: Stat,
+    *,
+    n_boot: int = 2000,
+    confidence: float = 0.95,
+    seed: Optional[int] = 0,
+) -> tuple[float, float, float]:
+    """Percentile-bootstrap CI of stat(values): (point, lo, hi)."""
+    values = np.asarray(values, dtype=np.float64)
+    point = float(stat(values[None, :])[0])
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(values), size=(n_boot, len(values)))
+    return (point, *_interval(stat(values[idx]), confidence))
+
+
+def bootstrap_relative_change(
+    baseline: Floats,
+    candidate: Floats,
+    stat: Stat,
+    *,
+    paired: bool,
+    n_boot: int = 2000,
+    confidence: float = 0.95,
+    seed: Optional[int] = 0,
+) -> tuple[float, float, float]:
+    """
+    CI of stat(candidate) / stat(baseline) - 1: (point, lo, hi). `paired` resamples the same
+    item indices from both arrays (same gold item replayed twice), which cancels per-prompt
+    variance; otherwise the two samples are resampled independently.
+    """
+    b = np.asarray(baseline, dtype=np.float64)
+    c = np.asarray(candidate, dtype=np.float64)
+    if paired and len(b) != len(c):
+        raise ValueError("paired bootstrap needs equally long, aligned samples")
+
+    def rel(sb: Floats, sc: Floats) -> Floats:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = sc / sb - 1.0
+        # 0 -> 0 is no change; 0 -> x is an unbounded regression
+        return np.asarray(np.where(sb == 0, np.where(sc == 0, 0.0, np.inf), out), dtype=np.float64)
+
+    point = float(rel(stat(b[None, :]), stat(c[None, :]))[0])
+    rng = np.random.default_rng(seed)
+    ib = rng.integers(0, len(b), size=(n_boot, len(b)))
+    ic = ib if paired else rng.integers(0, len(c), size=(n_boot, len(c)))
+    return (point, *_interval(rel(stat(b[ib]), stat(c[ic])), confidence))
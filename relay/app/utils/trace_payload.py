@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import random
+
+# how much of request_json / response_json a tenant's traces keep
+PAYLOAD_CAPTURE_MODES = ("always", "sampled", "errors_only", "hash_only")
+
+
+def keep_payloads(*, mode: str, sample_rate: float, status_code: int) -> bool:
+    """
+    Decide up front whether this trace stores full payloads, so the caller can skip
+    serializing request/response bodies altogether when they would be dropped.
+    """
+    if mode == "always":
+        return True
+    if mode == "errors_only":
+        return status_code >= 400
+    if mode == "sampled":
+        return status_code >= 400 or random.random() < sample_rate
+    return False
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import sys
+from pathlib import Path
+
+from app.core.logging import configure_logging
+from benchmarks import cases  # noqa: F401  (registers benchmarks)
+from benchmarks.harness import REGISTRY, compare, environment, run_all
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Relay hot-path microbenchmarks. Results are per-op nanoseconds.",
+    )
+    ap.add_argument("-k", "--filter", default="*", help="glob on benchmark name or group, e.g. 'scheduler*'")
+    ap.add_argument("--rounds", type=int, default=15, help="timed rounds per benchmark")
+    ap.add_argument("--min-time", type=float, default=0.02, help="seconds per round (loops are calibrated)")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--quick", action="store_true", help="smoke run: 3 short rounds each")
+    ap.add_argument("--out", default="", help="write results JSON here")
+    ap.add_argument("--compare", default="", help="results JSON from another commit to diff against")
+    ap.add_argument("--fail-above", type=float, default=0.0,
+                    help="with --compare: exit 1 if any median ratio exceeds this (e.g. 1.10)")
+    ap.add_argument("--log-level", default="warning", help="relay log level during e2e benchmarks")
+    ap.add_argument("--list", action="store_true")
+    args = ap.parse_args()
+    configure_logging(args.log_level)
+
+    selected = [
+        b for b in REGISTRY
+        if fnmatch.fnmatch(b.name, args.filter) or fnmatch.fnmatch(b.group, args.filter)
+    ]
+    if args.list:
+        for b in selected:
+            print(f"{b.group:<10} {b.name}")
+        return 0
+    if args.quick:
+        args.rounds, args.min_time, args.warmup = 3, 0.002, 1
+
+    results = run_all(selected, rounds=args.rounds, min_time_s=args.min_time, warmup=args.warmup)
+    report = {
+        "meta": {
+            **environment(),
+            "rounds": args.rounds,
+            "min_time_s": args.min_time,
+            "warmup": args.warmup,
+        },
+        "results": [r.as_dict() for r in results],
+    }
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote: {out}", file=sys.stderr)
+
+    if not args.compare:
+        return 0
+    old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    rows = compare(old, report)
+    worst = 0.0
+    print(f"\nvs {old['meta'].get('git_commit', '?')[:12]}:")
+    for r in sorted(rows, key=lambda r: r["ratio"], reverse=True):
+        worst = max(worst, r["ratio"])
+        print(f"  {r['name']:<48} {r['ratio']:6.2f}x")
+    if args.fail_above and worst > args.fail_above:
+        print(f"FAIL: slowest ratio {worst:.2f}x > {args.fail_above:.2f}x", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+import orjson
+import yaml
+
+import app.api.routes as routes
+from app.core.policy_engine import build_plan, plan_dict
+from app.core.runtime import init_rollups, init_scheduler
+from app.core.scheduler import ScheduledJob, Scheduler
+from app.core.settings import PolicyConfig, PromptScrubber, TenantNormalize, settings
+from app.db.pgvector_codec import encode_vector
+from app.models.openai_chat import (
+    ChatCompletionsChoice,
+    ChatCompletionsRequest,
+    ChatCompletionsResponse,
+    ChatMessage,
+    Usage,
+)
+from app.utils.cache_keys import exact_cache_key, plan_signature
+from app.utils.cached_response import ZlibCodec, cacheable_body, decode_entry, encode_entry
+from app.utils.normalize import normalize_messages
+
+from benchmarks.harness import register
+
+EMBED_DIM = 384
+TENANT_COUNTS = (10, 1_000, 10_000)
+
+_rng = random.Random(1234)
+
+
+def _words(n: int) -> str:
+    vocab = ("latency", "cache", "tenant", "policy", "queue", "token", "vector", "the", "a", "of", "to")
+    return " ".join(_rng.choice(vocab) for _ in range(n))
+
+
+def _messages(n_msgs: int, words: int) -> list[ChatMessage]:
+    roles = ("user", "assistant")
+    msgs = [ChatMessage(role="system", content=" You are a helpful assistant. ")]
+    msgs += [ChatMessage(role=roles[i % 2], content=f"  {_words(words)} \n") for i in range(n_msgs - 1)]
+    return msgs
+
+
+def _policy() -> PolicyConfig:
+    return settings.load_policy()
+
+
+def _unbounded_queues(policy: PolicyConfig) -> PolicyConfig:
+    # a copy with queues the benchmark never fills
+    scheduler = policy.scheduler.model_copy(update={"max_queue_depth_per_lane": 10**9})
+    return policy.model_copy(update={"scheduler": scheduler})
+
+
+def _response() -> ChatCompletionsResponse:
+    return ChatCompletionsResponse(
+        id=str(uuid.uuid4()),
+        created=int(time.time()),
+        model="local-ollama",
+        choices=[
+            ChatCompletionsChoice(
+                index=0,
+                message=ChatMessage(role="assistant", content=_words(200)),
+                finish_reason="stop",
+            )
+        ],
+        usage=Usage(prompt_tokens=120, completion_tokens=200, total_tokens=320),
+    )
+
+
+# -- request canonicalization / keys ------------------------------------------------------------
+
+for _n_msgs, _n_words in ((1, 20), (8, 60), (32, 200)):
+
+    def _setup_normalize(n_msgs: int = _n_msgs, n_words: int = _n_words) -> Callable[[], Any]:
+        msgs = _messages(n_msgs, n_words)
+        return lambda: normalize_messages(msgs)
+
+    register(f"normalize_messages/{_n_msgs}msgs_x{_n_words}w", "keys")(_setup_normalize)
+
+
+@register("normalize_messages/8msgs_x60w/full_chain", "keys")
+def _setup_normalize_chain() -> Callable[[], Any]:
+    # every normalizer on: the worst case a tenant can configure
+    msgs = _messages(8, 60)
+    cfg = TenantNormalize(
+        nfkc=True,
+        collapse_whitespace=True,
+        casefold=True,
+        strip_trailing_punctuation=True,
+        fingerprint_system=True,
+        scrubbers=[PromptScrubber(name="ts", pattern=r"\d{4}-\d{2}-\d{2}[T ][\d:.]+Z?")],
+    )
+    return lambda: normalize_messages(msgs, cfg)
+
+
+@register("plan_signature", "keys")
+def _setup_plan_signature() -> Callable[[], Any]:
+    plan, _ = build_plan(policy=_policy(), tenant_id="default", prompt_chars=500,
+                         override_temperature=None, override_max_tokens=None)
+    d = plan_dict(plan)
+    return lambda: plan_signature(d)
+
+
+@register("exact_cache_key", "keys")
+def _setup_exact_cache_key() -> Callable[[], Any]:
+    h = hashlib.sha256(b"x").hexdigest()
+    return lambda: exact_cache_key(tenant_id="tenant-123", request_hash=h, plan_sig="0123456789abcdef")
+
+
+@register("build_plan", "policy")
+def _setup_build_plan() -> Callable[[], Any]:
+    policy = _policy()
+    return lambda: build_plan(policy=policy, tenant_id="default", prompt_chars=500,
+                              override_temperature=None, override_max_tokens=None)
+
+
+@register("load_policy", "policy")
+def _setup_load_policy() -> Callable[[], Any]:
+    return settings.load_policy
+
+
+@register(f"encode_vector/{EMBED_DIM}d", "vectors")
+def _setup_encode_vector() -> Callable[[], Any]:
+    vec = np.random.default_rng(1234).uniform(-1, 1, EMBED_DIM).astype(np.float32)
+    return lambda: encode_vector(vec)
+
+
+# -- models -------------------------------------------------------------------------------------
+
+@register("ChatCompletionsRequest.model_validate_json/8msgs", "models")
+def _setup_request_validate() -> Callable[[], Any]:
+    body = orjson.dumps(
+        {"model": "local-ollama", "messages": [m.model_dump() for m in _messages(8, 60)], "temperature": 0.2}
+    )
+    return lambda: ChatCompletionsRequest.model_validate_json(body)
+
+
+@register("ChatCompletionsResponse.model_validate/cached", "models")
+def _setup_response_validate() -> Callable[[], Any]:
+    raw = orjson.loads(orjson.dumps(_response().model_dump()))
+    return lambda: ChatCompletionsResponse.model_validate(raw)
+
+
+@register("ChatCompletionsResponse.model_dump+orjson", "models")
+def _setup_response_dump() -> Callable[[], Any]:
+    resp = _response()
+    return lambda: orjson.dumps(resp.model_dump())
+
+
+@register("ChatCompletionsResponse.model_dump_json", "models")
+def _setup_response_dump_json() -> Callable[[], Any]:
+    resp = _response()
+    return resp.model_dump_json
+
+
+@register("cached_response.decode_entry", "models")
+def _setup_cached_decode() -> Callable[[], Any]:
+    # exact-hit path: header parse + id/created splice, versus model_validate above
+    entry = encode_entry(
+        cacheable_body(_response().model_dump()),
+        prompt_tokens=10,
+        completion_tokens=20,
+        total_tokens=30,
+        fresh_until=1_700_000_300.0,
+        compute_ms=850,
+        max_tokens=256,
+        finish_reason="stop",
+    )
+    return lambda: decode_entry(entry, request_id="3f1c0c52-8a53-4c5e-9a7e-0d5b7f1d2c11", created=1_700_000_000)
+
+
+@register("cached_response.decode_entry/zlib", "models")
+def _setup_cached_decode_zlib() -> Callable[[], Any]:
+    # same hit with the default EXACT_CACHE_COMPRESSION: adds the inflate
+    codec = ZlibCodec(level=3)
+    entry = encode_entry(
+        cacheable_body(_response().model_dump()),
+        prompt_tokens=10,
+        completion_tokens=20,
+        total_tokens=30,
+        fresh_until=1_700_000_300.0,
+        compute_ms=850,
+        max_tokens=256,
+        finish_reason="stop",
+        codec=codec,
+    )
+    return lambda: decode_entry(entry, request_id="3f1c0c52-8a53-4c5e-9a7e-0d5b7f1d2c11", created=1_700_000_000, codec=codec)
+
+
+# -- scheduler ----------------------------------------------------------------------------------
+
+def _bench_scheduler(n_tenants: int, backlogged: bool) -> tuple[Scheduler, Callable[[str], ScheduledJob]]:
+    policy = _unbounded_queues(_policy())
+    sched = Scheduler(policy)
+    plan, _ = build_plan(policy=policy, tenant_id="default", prompt_chars=100,
+                         override_temperature=None, override_max_tokens=None)
+    loop = asyncio.get_running_loop()
+    fut: asyncio.Future[object] = loop.create_future()
+
+    async def run() -> object:
+        return None
+
+    def job(tenant: str) -> ScheduledJob:
+        now = time.perf_counter()
+        return ScheduledJob(request_id="r", tenant_id=tenant, lane="short", created_at=now,
+                            slo_ms=1000, plan=plan, run=run, fut=fut, queue_entered_at=now)
+
+    for i in range(n_tenants):
+        # every tenant has a queue in the round robin; "sparse" leaves them all empty
+        sched._queues["short"][f"t{i}"] = asyncio.Queue()
+        sched._rr_order["short"].append(f"t{i}")
+        if backlogged:
+            sched._queues["short"][f"t{i}"].put_nowait(job(f"t{i}"))
+    return sched, job
+
+
+for _n in TENANT_COUNTS:
+    for _backlogged in (True, False):
+
+        async def _setup_sched(n: int = _n, backlogged: bool = _backlogged) -> Callable[[], Awaitable[Any]]:
+            sched, job = _bench_scheduler(n, backlogged)
+            tenants = [f"t{i}" for i in range(n)]
+            cursor = 0
+
+            async def submit_dequeue() -> None:
+                nonlocal cursor
+                cursor = (cursor + 1) % n
+                await sched.submit(job(tenants[cursor]))
+                await sched._dequeue_fair()
+
+            return submit_dequeue
+
+        _shape = "backlogged" if _backlogged else "sparse"
+        register(f"scheduler.submit+dequeue/{_shape}/{_n}_tenants", "scheduler")(_setup_sched)
+
+
+for _n in TENANT_COUNTS:
+
+    async def _setup_admission(n: int = _n) -> Callable[[], Any]:
+        sched, _ = _bench_scheduler(n, backlogged=True)
+        return lambda: sched.admission_check(lane="short", tenant_slo_ms=1000, prompt_chars=100)
+
+    register(f"scheduler.admission_check/{_n}_tenants", "scheduler")(_setup_admission)
+
+
+# -- end to end (mock backend, in-memory Redis/Postgres) -----------------------------------------
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.d: dict[str, Any] = {}
+
+    async def get(self, k: str) -> Any:
+        return self.d.get(k)
+
+    async def incr(self, k: str) -> int:
+        self.d[k] = int(self.d.get(k, 0)) + 1
+        return int(self.d[k])
+
+    async def setex(self, k: str, ttl: int, v: Any) -> None:
+        self.d[k] = v
+
+    async def set(self, k: str, v: Any, nx: bool = False, ex: int | None = None) -> bool | None:
+        if nx and k in self.d:
+            return None
+        self.d[k] = v
+        return True
+
+    async def delete(self, *ks: str) -> None:
+        for k in ks:
+            self.d.pop(k, None)
+
+    async def eval(self, script: str, numkeys: int, key: str, token: str) -> int:
+        # only the revalidation lock's compare-and-delete
+        if self.d.get(key) != token:
+            return 0
+        del self.d[key]
+        return 1
+
+
+def _fake_embed(text: str) -> np.ndarray:
+    # stable per text, constant cost: keeps the model out of the number being measured
+    seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).random(EMBED_DIM, dtype=np.float32)
+
+
+async def _fake_semantic_lookup(**_: Any) -> Optional[dict[str, Any]]:
+    return None
+
+
+async def _fake_semantic_store(**_: Any) -> str:
+    return str(uuid.uuid4())
+
+
+async def _fake_insert_trace(payload: dict[str, Any]) -> None:
+    return None
+
+
+_PATCHES = {
+    "get_redis": None,
+    "embed_text": _fake_embed,
+    "semantic_lookup": _fake_semantic_lookup,
+    "semantic_store": _fake_semantic_store,
+    "insert_trace": _fake_insert_trace,
+}
+_saved: dict[str, Any] = {}
+_e2e_state: dict[str, Any] = {}
+
+
+def _e2e_policy() -> PolicyConfig:
+    # exact caching on for every tenant (the dev policy turns it off for the default tenant)
+    policy = _unbounded_queues(settings.load_policy())
+    tenants = {
+        name: t.model_copy(update={"caching": t.caching.model_copy(update={"exact_enabled": True})})
+        for name, t in policy.tenants.items()
+    }
+    return policy.model_copy(update={"tenants": tenants})
+
+
+async def _e2e_setup() -> FakeRedis:
+    redis = FakeRedis()
+    for name, fake in _PATCHES.items():
+        _saved[name] = getattr(routes, name)
+        setattr(routes, name, fake if fake is not None else (lambda: redis))
+    _saved["backend_mode"] = settings.backend_mode
+    settings.backend_mode = "mock"
+    policy = _e2e_policy()
+    # the pipeline reads the policy file per request: point it at this policy
+    fd, path = tempfile.mkstemp(prefix="relay-bench-", suffix=".yaml")
+    with os.fdopen(fd, "w") as f:
+        yaml.safe_dump(policy.model_dump(mode="json"), f)
+    _saved["policy_path"] = settings.policy_path
+    settings.policy_path = path
+    _e2e_state["scheduler"] = init_scheduler(policy)
+    # recorded in memory like production; the flush (a Postgres upsert) never fires during a run
+    rollups = init_rollups(flush_interval_s=3600)
+    _e2e_state["rollups"] = rollups
+    return redis
+
+
+async def _e2e_teardown() -> None:
+    await _e2e_state.pop("scheduler").stop()
+    rollups = _e2e_state.pop("rollups")
+    rollups.drain()
+    await rollups.stop()
+    for name in _PATCHES:
+        setattr(routes, name, _saved[name])
+    settings.backend_mode = _saved["backend_mode"]
+    os.unlink(settings.policy_path)
+    settings.policy_path = _saved["policy_path"]
+
+
+@register("e2e.chat_completion/miss", "e2e", teardown=_e2e_teardown)
+async def _setup_e2e_miss() -> Callable[[], Awaitable[Any]]:
+    await _e2e_setup()
+    counter = 0
+
+    async def one() -> None:
+        nonlocal counter
+        counter += 1
+        req = ChatCompletionsRequest(
+            model="local-ollama", messages=[ChatMessage(role="user", content=f"question {counter} {_words(30)}")]
+        )
+        await routes.run_chat_completion(req, tenant_id="default")
+
+    return one
+
+
+@register("e2e.chat_completion/exact_hit", "e2e", teardown=_e2e_teardown)
+async def _setup_e2e_hit() -> Callable[[], Awaitable[Any]]:
+    redis = await _e2e_setup()
+    req = ChatCompletionsRequest(
+        model="local-ollama", messages=[ChatMessage(role="user", content=f"cached question {_words(30)}")]
+    )
+    await routes.run_chat_completion(req, tenant_id="default")
+    assert any(k.startswith("exact:") for k in redis.d), "warm-up call stored no exact-cache entry"
+    rollups = _e2e_state["rollups"]
+    rollups.drain()
+    await routes.run_chat_completion(req, tenant_id="default")
+    outcomes = {cell["cache_outcome"] for cell in rollups.drain()}
+    assert outcomes == {"exact_hit"}, f"expected an exact hit, got {outcomes}"
+
+    async def one() -> None:
+        await routes.run_chat_completion(req, tenant_id="default")
+
+    return one
+
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import inspect
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional, Union
+
+BenchFn = Union[Callable[[], Any], Callable[[], Awaitable[Any]]]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    group: str
+    # called once (inside the event loop) before timing; returns the function to time
+    setup: Callable[[], Union[BenchFn, Awaitable[BenchFn]]]
+    teardown: Optional[Callable[[], Awaitable[None]]] = None
+
+
+@dataclass
+class BenchResult:
+    name: str
+    group: str
+    loops: int
+    samples_ns: list[float] = field(default_factory=list)
+
+    def as_dict(self) -> dict[str, Any]:
+        s = sorted(self.samples_ns)
+        q1, q3 = (statistics.quantiles(s, n=4)[0::2] if len(s) >= 4 else (s[0], s[-1]))
+        return {
+            "name": self.name,
+            "group": self.group,
+            "loops": self.loops,
+            "rounds": len(s),
+            "min_ns": s[0],
+            "median_ns": statistics.median(s),
+            "mean_ns": statistics.fmean(s),
+            "stdev_ns": statistics.stdev(s) if len(s) > 1 else 0.0,
+            "iqr_ns": q3 - q1,
+            "ops_per_s": 1e9 / statistics.median(s) if s[0] > 0 else None,
+        }
+
+
+REGISTRY: list[Benchmark] = []
+
+
+def register(name: str, group: str, *, teardown: Optional[Callable[[], Awaitable[None]]] = None) -> Callable[..., Any]:
+    """Decorator for a setup function that returns the callable (sync or async) to time."""
+
+    def deco(setup: Callable[[], Any]) -> Callable[[], Any]:
+        REGISTRY.append(Benchmark(name=name, group=group, setup=setup, teardown=teardown))
+        return setup
+
+    return deco
+
+
+async def _time_loops(fn: BenchFn, loops: int, is_async: bool) -> float:
+    """Wall time in ns for `loops` calls, GC disabled so collections do not land in random samples."""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if is_async:
+            t0 = time.perf_counter_ns()
+            for _ in range(loops):
+                await fn()
+            return float(time.perf_counter_ns() - t0)
+        t0 = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        return float(time.perf_counter_ns() - t0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+async def run_benchmark(b: Benchmark, *, rounds: int, min_time_s: float, warmup: int) -> BenchResult:
+    fn = b.setup()
+    if inspect.isawaitable(fn):
+        fn = await fn
+    is_async = inspect.iscoroutinefunction(fn)
+    try:
+        for _ in range(warmup):
+            await _time_loops(fn, 1, is_async)
+
+        # calibrate: grow loops until one round takes at least min_time_s
+        loops = 1
+        while True:
+            elapsed = await _time_loops(fn, loops, is_async)
+            if elapsed >= min_time_s * 1e9 or loops >= 1_000_000:
+                break
+            loops *= 10 if elapsed < min_time_s * 1e8 else 2
+
+        res = BenchResult(name=b.name, group=b.group, loops=loops)
+        for _ in range(rounds):
+            gc.collect()
+            res.samples_ns.append(await _time_loops(fn, loops, is_async) / loops)
+        return res
+    finally:
+        if b.teardown is not None:
+            await b.teardown()
+
+
+def environment() -> dict[str, Any]:
+    """What a result file needs to be compared against another commit's."""
+
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], capture_output=True, text=True, check=True, timeout=5
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "git_commit": git("rev-parse", "HEAD"),
+        "git_dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> list[dict[str, Any]]:
+    """Median ratio new/old per benchmark present in both runs (> 1.0 means slower)."""
+    before = {r["name"]: r for r in old["results"]}
+    out = []
+    for r in new["results"]:
+        prev = before.get(r["name"])
+        if prev is None or not prev["median_ns"]:
+            continue
+        out.append(
+            {
+                "name": r["name"],
+                "old_median_ns": prev["median_ns"],
+                "new_median_ns": r["median_ns"],
+                "ratio": r["median_ns"] / prev["median_ns"],
+            }
+        )
+    return out
+
+
+def run_all(
+    benchmarks: list[Benchmark], *, rounds: int, min_time_s: float, warmup: int
+) -> list[BenchResult]:
+    async def _run() -> list[BenchResult]:
+        results = []
+        for b in benchmarks:
+            results.append(await run_benchmark(b, rounds=rounds, min_time_s=min_time_s, warmup=warmup))
+            print(_fmt_line(results[-1].as_dict()), file=sys.stderr, flush=True)
+        return results
+
+    return asyncio.run(_run())
+
+
+def _fmt_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:8.2f} {unit}"
+    return f"{ns:8.0f} ns"
+
+
+def _fmt_line(r: dict[str, Any]) -> str:
+    return f"{r['name']:<48} median {_fmt_ns(r['median_ns'])}  min {_fmt_ns(r['min_ns'])}  iqr {_fmt_ns(r['iqr_ns'])}"
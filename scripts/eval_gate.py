@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import yaml
+
+from app.utils.stats import bootstrap_ci, bootstrap_relative_change, mean_stat, quantile_stat
+
+PASS, WARN, FAIL = "pass", "warn", "fail"
+EXIT_CODES = {PASS: 0, WARN: 0, FAIL: 1}
+
+RELATIVE_METRICS = {
+    "latency_p50": ("latency_ms", quantile_stat(0.50)),
+    "latency_p95": ("latency_ms", quantile_stat(0.95)),
+    "latency_p99": ("latency_ms", quantile_stat(0.99)),
+    "tokens_mean": ("tokens_proxy", mean_stat),
+    "tokens_p95": ("tokens_proxy", quantile_stat(0.95)),
+}
+
+
+def load_items(path: Path) -> dict[str, dict[str, Any]]:
+    return {it["id"]: it for it in json.loads(path.read_text()).get("items", [])}
+
+
+def judge_upper(point: float, lo: float, budget: float, enforce: bool) -> str:
+    """Regression metric (higher is worse) against an upper budget."""
+    if lo > budget and enforce:
+        return FAIL
+    if point > budget:
+        return WARN
+    return PASS
+
+
+def judge_floor(point: float, hi: float, floor: float, enforce: bool) -> str:
+    """Quality metric (lower is worse) against a floor."""
+    if hi < floor and enforce:
+        return FAIL
+    if point < floor:
+        return WARN
+    return PASS
+
+
+def run_gate(baseline: dict[str, dict[str, Any]], candidate: dict[str, dict[str, Any]], cfg: dict[str, Any]) -> dict[str, Any]:
+    boot = {"n_boot": 2000, "confidence": 0.95, "seed": 0} | (cfg.get("bootstrap") or {})
+    min_samples = int(cfg.get("min_samples", 5))
+
+    # pair by gold id where both runs succeeded; per-prompt cost dominates the variance
+    ok_ids = sorted(i for i in baseline.keys() & candidate.keys()
+                    if baseline[i]["status"] == 200 and candidate[i]["status"] == 200)
+    paired = len(ok_ids) >= min_samples
+    if paired:
+        b_ok = [baseline[i] for i in ok_ids]
+        c_ok = [candidate[i] for i in ok_ids]
+    else:
+        b_ok = [it for it in baseline.values() if it["status"] == 200]
+        c_ok = [it for it in candidate.values() if it["status"] == 200]
+    enforce = min(len(b_ok), len(c_ok)) >= min_samples
+
+    checks: list[dict[str, Any]] = []
+    for name, budget in (cfg.get("relative") or {}).items():
+        field, stat = RELATIVE_METRICS[name]
+        b = np.array([float(it[field]) for it in b_ok])
+        c = np.array([float(it[field]) for it in c_ok])
+        if not len(b) or not len(c):
+            checks.append({"metric": name, "status": WARN, "reason": "no successful items"})
+            continue
+        point, lo, hi = bootstrap_relative_change(b, c, stat, paired=paired, **boot)
+        checks.append({
+            "metric": name,
+            "kind": "relative",
+            "baseline": float(stat(b[None, :])[0]),
+            "candidate": float(stat(c[None, :])[0]),
+            "change": point,
+            "ci": [lo, hi],
+            "budget": float(budget),
+            "status": judge_upper(point, lo, float(budget), enforce),
+        })
+
+    if "error_rate" in (cfg.get("absolute") or {}):
+        budget = float(cfg["absolute"]["error_rate"])
+        b_err = np.array([float(it["status"] != 200) for it in baseline.values()])
+        c_err = np.array([float(it["status"] != 200) for it in candidate.values()])
+        if len(b_err) and len(c_err):
+            b_rate, c_rate = float(b_err.mean()), float(c_err.mean())
+            _, c_lo, _ = bootstrap_ci(c_err, mean_stat, **boot)
+            checks.append({
+                "metric": "error_rate",
+                "kind": "absolute",
+                "baseline": b_rate,
+                "candidate": c_rate,
+                "change": c_rate - b_rate,
+                "ci": [c_lo - b_rate, None],
+                "budget": budget,
+                "status": judge_upper(c_rate - b_rate, c_lo - b_rate, budget, enforce),
+            })
+
+    sims = np.array([float(it["quality_similarity_vs_baseline"]) for it in candidate.values()
+                     if it.get("quality_similarity_vs_baseline") is not None])
+    for name, stat in (("similarity_mean_min", mean_stat), ("similarity_p10_min", quantile_stat(0.10))):
+        floor = (cfg.get("quality") or {}).get(name)
+        if floor is None:
+            continue
+        if not len(sims):
+            checks.append({"metric": name, "status": WARN, "reason": "candidate has no similarity scores"})
+            continue
+        point, lo, hi = bootstrap_ci(sims, stat, **boot)
+        checks.append({
+            "metric": name,
+            "kind": "floor",
+            "candidate": point,
+            "ci": [lo, hi],
+            "budget": float(floor),
+            "status": judge_floor(point, hi, float(floor), len(sims) >= min_samples),
+        })
+
+    statuses = {c["status"] for c in checks}
+    verdict = FAIL if FAIL in statuses else WARN if WARN in statuses else PASS
+    return {
+        "verdict": verdict,
+        "paired": paired,
+        "n": {"baseline": len(baseline), "candidate": len(candidate), "compared": min(len(b_ok), len(c_ok))},
+        "enforced": enforce,
+        "bootstrap": boot,
+        "checks": checks,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Bootstrap regression gate over two eval_replay reports.")
+    ap.add_argument("--baseline", required=True)
+    ap.add_argument("--candidate", required=True)
+    ap.add_argument("--budgets", default=str(Path(__file__).resolve().parents[1] / "eval" / "gate.yaml"))
+    ap.add_argument("--out", default="eval/gate.json")
+    ap.add_argument("--strict", action="store_true", help="treat warnings as failures")
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(Path(args.budgets).read_text()) or {}
+    try:
+        result = run_gate(load_items(Path(args.baseline)), load_items(Path(args.candidate)), cfg)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"eval_gate: cannot compare reports: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(result, indent=2))
+
+    for c in result["checks"]:
+        if "change" in c:
+            lo, hi = c["ci"]
+            ci = f"[{lo:+.1%}, {hi:+.1%}]" if hi is not None else f"[{lo:+.1%}, ...]"
+            print(f"{c['status'].upper():<5} {c['metric']:<20} {c['change']:+.1%} ci {ci} budget +{c['budget']:.1%}")
+        elif "candidate" in c:
+            print(f"{c['status'].upper():<5} {c['metric']:<20} {c['candidate']:.3f} ci [{c['ci'][0]:.3f}, {c['ci'][1]:.3f}] floor {c['budget']:.3f}")
+        else:
+            print(f"{c['status'].upper():<5} {c['metric']:<20} {c['reason']}")
+    verdict = result["verdict"]
+    print(f"verdict: {verdict} (wrote {out_path})")
+    sys.exit(1 if args.strict and verdict == WARN else EXIT_CODES[verdict])
+
+
+if __name__ == "__main__":
+    main()
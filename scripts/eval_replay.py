@@ -1,17 +1,18 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
+import random
 import time
 from pathlib import Path
 from statistics import median
-from typing import Any
+from typing import IO, Any, Optional
 
 import httpx
 import orjson
 
-from app.core.embeddings import embed_text
-
+from app.core.embeddings import cosine_rows, embed_texts
 
 
 def percentile(vals: list[float], p: float) -> float:
@@ -26,18 +27,6 @@ def percentile(vals: list[float], p: float) -> float:
     return s[f] + (s[c] - s[f]) * (k - f)
 
 
-def cosine(a: list[float], b: list[float]) -> float:
-    dot = 0.0
-    na = 0.0
-    nb = 0.0
-    for x, y in zip(a, b):
-        dot += x * y
-        na += x * x
-        nb += y * y
-    denom = (na**0.5) * (nb**0.5)
-    return 0.0 if denom == 0 else dot / denom
-
-
 def extract_text(resp: dict[str, Any]) -> str:
     try:
         return resp["choices"][0]["message"]["content"] or ""
@@ -56,6 +45,122 @@ def extract_tokens(resp: dict[str, Any]) -> int:
     return max(1, len(txt) // 4)
 
 
+def parse_tenant_mix(spec: str) -> Optional[tuple[list[str], list[float]]]:
+    """'default=0.7,acme=0.3' -> (tenants, weights); empty -> keep each gold row's tenant_id."""
+    if not spec:
+        return None
+    tenants, weights = [], []
+    for part in spec.split(","):
+        name, _, w = part.partition("=")
+        tenants.append(name.strip())
+        weights.append(float(w or 1.0))
+    return tenants, weights
+
+
+def load_baseline(path: str) -> dict[str, str]:
+    """Baseline texts by id, from a report JSON or its streamed .items.ndjson sidecar."""
+    p = Path(path)
+    if p.suffix == ".ndjson":
+        rows = [orjson.loads(line) for line in p.read_bytes().splitlines() if line.strip()]
+    else:
+        rows = json.loads(p.read_text()).get("items", [])
+    return {item["id"]: item.get("text", "") for item in rows}
+
+
+class ItemSink:
+    """
+    Completed items are buffered and, every `batch` items, scored against the baseline with a
+    single embedding call and appended to the NDJSON sidecar, so a long run can be followed
+    (and survives a crash) without re-embedding per item.
+    """
+
+    def __init__(self, f: IO[bytes], baseline: dict[str, str], batch: int):
+        self.f = f
+        self.baseline = baseline
+        self.batch = batch
+        self.items: list[dict[str, Any]] = []
+        self._pending: list[dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+
+    async def add(self, item: dict[str, Any]) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= self.batch:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            chunk, self._pending = self._pending, []
+            if chunk:
+                # embedding is CPU-bound; keep it off the loop so in-flight latencies stay honest
+                await asyncio.to_thread(self._score_and_write, chunk)
+
+    def _score_and_write(self, chunk: list[dict[str, Any]]) -> None:
+        scored = [it for it in chunk if it["id"] in self.baseline]
+        if scored:
+            vecs = embed_texts([it["text"] for it in scored] + [self.baseline[it["id"]] for it in scored])
+            sims = cosine_rows(vecs[: len(scored)], vecs[len(scored):])
+            for it, s in zip(scored, sims.tolist()):
+                it["quality_similarity_vs_baseline"] = s
+        for it in chunk:
+            self.f.write(orjson.dumps(it) + b"\n")
+        self.f.flush()
+        self.items.extend(chunk)
+
+
+async def replay(
+    rows: list[dict[str, Any]],
+    args: argparse.Namespace,
+    sink: ItemSink,
+    tenant_mix: Optional[tuple[list[str], list[float]]],
+) -> None:
+    rng = random.Random(args.seed)
+    sem = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.host, timeout=120.0, limits=limits) as client:
+
+        async def one(r: dict[str, Any], tenant_id: str) -> None:
+            payload = {"model": "local-ollama", "messages": r["messages"]}
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(
+                        "/v1/chat/completions",
+                        headers={"Content-Type": "application/json", "X-Tenant-Id": tenant_id},
+                        content=orjson.dumps(payload),
+                    )
+                except httpx.HTTPError as e:
+                    status, resp_json = 0, {"error": type(e).__name__}
+                else:
+                    status = resp.status_code
+                    try:
+                        resp_json = resp.json() if resp.content else {}
+                    except ValueError:
+                        # e.g. a proxy's HTML error page: one failed item, not an aborted run
+                        status, resp_json = 0, {"error": "invalid_json", "status": resp.status_code, "body": resp.text[:200]}
+                dt = (time.perf_counter() - t0) * 1000.0
+
+            await sink.add(
+                {
+                    "id": r["id"],
+                    "tenant_id": tenant_id,
+                    "status": status,
+                    "latency_ms": dt,
+                    "tokens_proxy": extract_tokens(resp_json),
+                    "text": extract_text(resp_json),
+                    "quality_similarity_vs_baseline": None,
+                    "error": None if status == 200 else resp_json,
+                }
+            )
+
+        tasks = []
+        for r in rows:
+            tenant_id = rng.choices(*tenant_mix)[0] if tenant_mix else r.get("tenant_id", "default")
+            tasks.append(one(r, tenant_id))
+        await asyncio.gather(*tasks)
+        await sink.flush()
+
+
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--host", default="http://localhost:8000")
@@ -63,68 +168,37 @@ def main() -> None:
     ap.add_argument("--out", default="eval/out.json")
     ap.add_argument("--policy-label", default="candidate")
     ap.add_argument("--baseline-out", default="", help="If provided, compute quality similarity vs baseline outputs.")
+    ap.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    ap.add_argument("--tenant-mix", default="", help="e.g. 'default=0.7,acme=0.3' (default: gold tenant_id)")
+    ap.add_argument("--embed-batch", type=int, default=256, help="items scored per embedding call")
+    ap.add_argument("--seed", type=int, default=7)
     args = ap.parse_args()
 
     gold_path = Path(args.gold)
     out_path = Path(args.out)
     rows = [orjson.loads(line) for line in gold_path.read_bytes().splitlines() if line.strip()]
+    baseline_map = load_baseline(args.baseline_out) if args.baseline_out else {}
 
-    baseline_map: dict[str, str] = {}
-    if args.baseline_out:
-        b = json.loads(Path(args.baseline_out).read_text())
-        for item in b.get("items", []):
-            baseline_map[item["id"]] = item.get("text", "")
-
-    lat_ms: list[float] = []
-    tokens: list[int] = []
-    qual_sims: list[float] = []
-
-    items: list[dict[str, Any]] = []
-
-    with httpx.Client(timeout=120.0) as client:
-        for r in rows:
-            rid = r["id"]
-            tenant_id = r.get("tenant_id", "default")
-            payload = {"model": "local-ollama", "messages": r["messages"]}
-
-            t0 = time.perf_counter()
-            resp = client.post(
-                f"{args.host}/v1/chat/completions",
-                headers={"Content-Type": "application/json", "X-Tenant-Id": tenant_id},
-                content=orjson.dumps(payload),
-            )
-            dt = (time.perf_counter() - t0) * 1000.0
-
-            ok = resp.status_code == 200
-            resp_json = resp.json() if resp.content else {}
-            text = extract_text(resp_json)
-            tok = extract_tokens(resp_json)
-
-            lat_ms.append(dt)
-            tokens.append(tok)
-
-            sim = None
-            if rid in baseline_map:
-                a = embed_text(text)
-                b = embed_text(baseline_map[rid])
-                sim = cosine(a, b)
-                qual_sims.append(sim)
-
-            items.append(
-                {
-                    "id": rid,
-                    "status": resp.status_code,
-                    "latency_ms": dt,
-                    "tokens_proxy": tok,
-                    "text": text,
-                    "quality_similarity_vs_baseline": sim,
-                    "error": None if ok else resp_json,
-                }
-            )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    items_path = out_path.with_suffix(".items.ndjson")
+    with items_path.open("wb") as f:
+        sink = ItemSink(f, baseline_map, args.embed_batch)
+        t0 = time.perf_counter()
+        asyncio.run(replay(rows, args, sink, parse_tenant_mix(args.tenant_mix)))
+        wall_s = time.perf_counter() - t0
+
+    # report keeps gold order regardless of completion order
+    order = {r["id"]: i for i, r in enumerate(rows)}
+    items = sorted(sink.items, key=lambda it: order.get(it["id"], len(order)))
+    lat_ms = [it["latency_ms"] for it in items]
+    tokens = [it["tokens_proxy"] for it in items]
+    qual_sims = [it["quality_similarity_vs_baseline"] for it in items if it["quality_similarity_vs_baseline"] is not None]
 
     report = {
         "label": args.policy_label,
         "n": len(items),
+        "concurrency": args.concurrency,
+        "wall_s": wall_s,
         "latency_ms": {
             "p50": percentile(lat_ms, 0.50),
             "p95": percentile(lat_ms, 0.95),
@@ -142,9 +216,8 @@ def main() -> None:
         "items": items,
     }
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(report, indent=2))
-    print(f"Wrote report: {out_path}")
+    print(f"Wrote report: {out_path} (items streamed to {items_path}, {wall_s:.1f}s)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime
+from pathlib import Path
+
+from app.db.trace_export import EXPORT_FORMATS, ExportQuery, stream_csv, stream_ndjson, stream_parquet
+
+
+async def run(args: argparse.Namespace) -> int:
+    query = ExportQuery(
+        tenant_id=args.tenant or None,
+        since=datetime.fromisoformat(args.since) if args.since else None,
+        until=datetime.fromisoformat(args.until) if args.until else None,
+        include_payloads=args.include_payloads,
+    )
+    stream = {"ndjson": stream_ndjson, "csv": stream_csv, "parquet": stream_parquet}[args.format](query)
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with out_path.open("wb") as f:
+        async for chunk in stream:
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stream request_traces to NDJSON / CSV / Parquet.")
+    ap.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    ap.add_argument("--tenant", default="")
+    ap.add_argument("--since", default="", help="ISO timestamp, e.g. 2024-06-01T00:00:00+00:00")
+    ap.add_argument("--until", default="", help="ISO timestamp (exclusive)")
+    ap.add_argument("--include-payloads", action="store_true", help="add messages, response_text and the client's max_tokens/temperature (for replay)")
+    ap.add_argument("--out", default="eval/traces.ndjson")
+    args = ap.parse_args()
+
+    written = asyncio.run(run(args))
+    print(f"Wrote {written} bytes: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
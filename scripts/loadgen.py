@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+import httpx
+import orjson
+
+from app.core.settings import settings
+from app.models.openai_chat import ChatMessage
+from app.utils.normalize import normalize_messages
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+SHORT_PROMPTS = [
+    "Explain caching in one sentence.",
+    "What is an API gateway? One sentence.",
+    "Write a short definition of rate limiting.",
+    "What is tail latency?",
+    "Define admission control in 2 lines.",
+]
+LONG_PROMPTS = [
+    "Explain distributed systems like I'm an engineer. Include tradeoffs, examples, and pitfalls. " * 40,
+    "Summarize what a policy engine does in an LLM relay. " * 50,
+    "Explain semantic caching and failure cases. " * 50,
+]
+
+
+@dataclass(frozen=True)
+class Arrival:
+    offset_s: float  # intended send time relative to the start of the run
+    tenant_id: str
+    body: dict[str, Any]
+
+
+@dataclass
+class Sample:
+    tenant_id: str
+    lane: str
+    status: int
+    latency_ms: float  # from the intended send time: includes any time the generator fell behind
+    service_ms: float  # from the actual send time (what a closed-loop tool would report)
+    send_lag_ms: float
+
+
+@dataclass
+class Run:
+    samples: list[Sample] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def percentile(vals: list[float], p: float) -> float:
+    if not vals:
+        return 0.0
+    s = sorted(vals)
+    k = max(0, min(len(s) - 1, math.ceil(p / 100.0 * len(s)) - 1))
+    return float(s[k])
+
+
+# -- arrival processes --------------------------------------------------------------------------
+
+def synthetic_arrivals(
+    *,
+    model: str,
+    rate: float,
+    duration_s: float,
+    tenants: int,
+    zipf_s: float,
+    long_fraction: float,
+    burst_factor: float,
+    burst_on_s: float,
+    burst_off_s: float,
+    seed: int,
+) -> Iterator[Arrival]:
+    """
+    Poisson arrivals at `rate` req/s, or (model="bursty") a two-state Markov-modulated Poisson
+    process: exponentially distributed ON periods at rate*burst_factor alternating with OFF
+    periods at a rate chosen so the long-run mean stays `rate`. Tenants are Zipf-weighted.
+    """
+    rng = random.Random(seed)
+    names = ["default"] + [f"tenant-{i:04d}" for i in range(1, tenants)]
+    weights = [1.0 / (i + 1) ** zipf_s for i in range(len(names))]
+
+    on_share = burst_on_s / (burst_on_s + burst_off_s)
+    on_rate = rate * burst_factor
+    off_rate = max(rate - on_rate * on_share, 0.0) / (1.0 - on_share) if on_share < 1.0 else 0.0
+
+    t = 0.0
+    on = True
+    state_ends = rng.expovariate(1.0 / burst_on_s) if model == "bursty" else math.inf
+    while True:
+        cur = rate if model == "poisson" else (on_rate if on else off_rate)
+        gap = rng.expovariate(cur) if cur > 0 else math.inf
+        if t + gap >= state_ends:
+            # memoryless: restart the draw at the state boundary with the other rate
+            t = state_ends
+            on = not on
+            state_ends = t + rng.expovariate(1.0 / (burst_on_s if on else burst_off_s))
+            continue
+        t += gap
+        if t >= duration_s:
+            return
+        prompt = rng.choice(LONG_PROMPTS if rng.random() < long_fraction else SHORT_PROMPTS)
+        yield Arrival(
+            offset_s=t,
+            tenant_id=rng.choices(names, weights)[0],
+            body={"model": "local-ollama", "messages": [{"role": "user", "content": prompt}]},
+        )
+
+
+def replay_arrivals(path: Path, *, speedup: float, limit: int) -> tuple[list[Arrival], int]:
+    """
+    Arrivals from a trace export (scripts/export_traces.py --include-payloads --format ndjson):
+    original inter-arrival gaps divided by `speedup`, original tenant, messages and the client's
+    own max_tokens/temperature (never the plan's). Rows without payloads (hash_only / unsampled
+    tenants) and non-chat endpoints are skipped and counted.
+    """
+    rows: list[tuple[datetime, dict[str, Any]]] = []
+    skipped = 0
+    with path.open("rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = orjson.loads(line)
+            msgs = row.get("messages")
+            if isinstance(msgs, str):
+                msgs = orjson.loads(msgs)
+            if not msgs or row.get("endpoint", "/v1/chat/completions") != "/v1/chat/completions":
+                skipped += 1
+                continue
+            body: dict[str, Any] = {"model": row.get("model") or "local-ollama", "messages": msgs}
+            # only what the client sent: the plan's values (max_tokens, temperature) include the
+            # policy's defaults and degraded budgets, which as overrides would change the plan
+            for k in ("max_tokens", "temperature"):
+                if row.get(f"request_{k}") is not None:
+                    body[k] = row[f"request_{k}"]
+            rows.append((datetime.fromisoformat(row["created_at"]), {"tenant_id": row["tenant_id"], "body": body}))
+
+    rows.sort(key=lambda r: r[0])
+    if limit:
+        rows = rows[:limit]
+    if not rows:
+        return [], skipped
+    t0 = rows[0][0]
+    return [
+        Arrival(offset_s=(ts - t0).total_seconds() / speedup, tenant_id=r["tenant_id"], body=r["body"])
+        for ts, r in rows
+    ], skipped
+
+
+# -- driver -------------------------------------------------------------------------------------
+
+def lane_of(body: dict[str, Any], status: int, server_timing: str, short_max_chars: int) -> str:
+    """
+    Lane the relay would pick. Cache hits never reach the scheduler, which shows up as
+    no `queue` entry in a successful response's Server-Timing header.
+    """
+    if status == 200 and "queue;" not in server_timing:
+        return "cache"
+    normalized = normalize_messages([ChatMessage(**m) for m in body["messages"]])
+    return "short" if len(normalized.canonical_text) <= short_max_chars else "long"
+
+
+async def fire(
+    client: httpx.AsyncClient,
+    a: Arrival,
+    *,
+    intended: float,
+    timeout_s: float,
+    short_max_chars: int,
+    run: Run,
+) -> None:
+    sent = time.perf_counter()
+    try:
+        r = await client.post(
+            "/v1/chat/completions",
+            content=orjson.dumps(a.body),
+            headers={"Content-Type": "application/json", "X-Tenant-Id": a.tenant_id},
+            timeout=timeout_s,
+        )
+        status, timing = r.status_code, r.headers.get("server-timing", "")
+    except httpx.HTTPError as e:
+        run.errors[type(e).__name__] += 1
+        status, timing = 0, ""
+    done = time.perf_counter()
+    run.samples.append(
+        Sample(
+            tenant_id=a.tenant_id,
+            lane=lane_of(a.body, status, timing, short_max_chars) if status else "error",
+            status=status,
+            latency_ms=(done - intended) * 1000.0,
+            service_ms=(done - sent) * 1000.0,
+            send_lag_ms=(sent - intended) * 1000.0,
+        )
+    )
+
+
+async def drive(arrivals: list[Arrival], args: argparse.Namespace, short_max_chars: int) -> tuple[Run, float]:
+    """
+    Open loop: every request is sent at its scheduled time whether or not earlier ones have
+    returned, and latency is measured from that scheduled time. A slow relay therefore shows
+    up in the percentiles instead of silently lowering the offered load.
+    """
+    run = Run()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.host, limits=limits) as client:
+        tasks: set[asyncio.Task[None]] = set()
+        start = time.perf_counter()
+        for a in arrivals:
+            intended = start + a.offset_s
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            t = asyncio.create_task(
+                fire(client, a, intended=intended, timeout_s=args.timeout, short_max_chars=short_max_chars, run=run)
+            )
+            tasks.add(t)
+            t.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return run, elapsed
+
+
+def summarize(samples: list[Sample]) -> dict[str, Any]:
+    lat = [s.latency_ms for s in samples]
+    svc = [s.service_ms for s in samples]
+    statuses: dict[str, int] = defaultdict(int)
+    for s in samples:
+        statuses[str(s.status)] += 1
+    return {
+        "n": len(samples),
+        "status": dict(sorted(statuses.items())),
+        "latency_ms": {f"p{p:g}": percentile(lat, p) for p in PERCENTILES} | {"max": max(lat, default=0.0)},
+        # uncorrected view for comparison with closed-loop numbers (e.g. locust)
+        "service_ms": {f"p{p:g}": percentile(svc, p) for p in PERCENTILES},
+    }
+
+
+def report(run: Run, *, offered: int, elapsed_s: float, meta: dict[str, Any]) -> dict[str, Any]:
+    by_tenant: dict[str, list[Sample]] = defaultdict(list)
+    by_lane: dict[str, list[Sample]] = defaultdict(list)
+    for s in run.samples:
+        by_tenant[s.tenant_id].append(s)
+        by_lane[s.lane].append(s)
+    lag = [s.send_lag_ms for s in run.samples]
+    return {
+        "meta": meta,
+        "offered": offered,
+        "completed": len(run.samples),
+        "elapsed_s": elapsed_s,
+        "achieved_rps": len(run.samples) / elapsed_s if elapsed_s > 0 else 0.0,
+        # if this grows the generator itself is saturated and results understate capacity
+        "send_lag_ms": {"p99": percentile(lag, 99.0), "max": max(lag, default=0.0)},
+        "client_errors": dict(run.errors),
+        "overall": summarize(run.samples),
+        "by_lane": {k: summarize(v) for k, v in sorted(by_lane.items())},
+        "by_tenant": {k: summarize(v) for k, v in sorted(by_tenant.items())},
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Open-loop load generator for the relay.")
+    ap.add_argument("--host", default="http://localhost:8000")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--replay", default="", help="NDJSON trace export with payloads")
+    src.add_argument("--model", choices=("poisson", "bursty"), default="poisson")
+    ap.add_argument("--speedup", type=float, default=1.0, help="replay: divide original gaps by this")
+    ap.add_argument("--limit", type=int, default=0, help="replay: first N requests only")
+    ap.add_argument("--rate", type=float, default=20.0, help="synthetic: mean requests/s")
+    ap.add_argument("--duration", type=float, default=60.0, help="synthetic: seconds")
+    ap.add_argument("--tenants", type=int, default=50)
+    ap.add_argument("--zipf", type=float, default=1.1, help="tenant popularity skew (0 = uniform)")
+    ap.add_argument("--long-fraction", type=float, default=0.2)
+    ap.add_argument("--burst-factor", type=float, default=4.0, help="bursty: ON-period rate multiplier")
+    ap.add_argument("--burst-on", type=float, default=5.0, help="bursty: mean ON period (s)")
+    ap.add_argument("--burst-off", type=float, default=15.0, help="bursty: mean OFF period (s)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--max-connections", type=int, default=1000)
+    ap.add_argument("--out", default="eval/loadgen.json")
+    args = ap.parse_args()
+
+    if args.replay:
+        arrivals, skipped = replay_arrivals(Path(args.replay), speedup=args.speedup, limit=args.limit)
+        meta: dict[str, Any] = {"source": "replay", "path": args.replay, "speedup": args.speedup, "skipped": skipped}
+    else:
+        arrivals = list(
+            synthetic_arrivals(
+                model=args.model,
+                rate=args.rate,
+                duration_s=args.duration,
+                tenants=args.tenants,
+                zipf_s=args.zipf,
+                long_fraction=args.long_fraction,
+                burst_factor=args.burst_factor,
+                burst_on_s=args.burst_on,
+                burst_off_s=args.burst_off,
+                seed=args.seed,
+            )
+        )
+        meta = {k: getattr(args, k) for k in ("model", "rate", "duration", "tenants", "zipf", "long_fraction", "seed")}
+        if args.model == "bursty":
+            meta |= {k: getattr(args, k) for k in ("burst_factor", "burst_on", "burst_off")}
+
+    short_max_chars = int(settings.load_policy().scheduler.short_max_prompt_chars)
+    run, elapsed = asyncio.run(drive(arrivals, args, short_max_chars))
+    out = report(run, offered=len(arrivals), elapsed_s=elapsed, meta=meta)
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(out, indent=2), encoding="utf-8")
+
+    o = out["overall"]["latency_ms"]
+    print(f"Wrote: {out_path}")
+    print(f"offered={out['offered']} completed={out['completed']} rps={out['achieved_rps']:.1f} "
+          f"p50={o['p50']:.0f}ms p99={o['p99']:.0f}ms p99.9={o['p99.9']:.0f}ms")
+    for lane, s in out["by_lane"].items():
+        print(f"  lane={lane:<6} n={s['n']:<6} p99={s['latency_ms']['p99']:.0f}ms status={s['status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+
+import uvicorn
+
+from app.core.sim_backend import SimConfig, create_sim_app
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="Simulated Ollama server (/api/generate) for scheduler and capacity testing. "
+        "Point the relay at it with BACKEND_MODE=ollama OLLAMA_BASE_URL=http://localhost:11435."
+    )
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    for f in dataclasses.fields(SimConfig):
+        flag = "--" + f.name.replace("_", "-")
+        if f.name == "seed":
+            ap.add_argument(flag, type=int, default=None)
+        else:
+            ap.add_argument(flag, type=type(f.default), default=f.default)
+    args = ap.parse_args()
+
+    cfg = SimConfig(**{f.name: getattr(args, f.name) for f in dataclasses.fields(SimConfig)})
+    print(f"sim backend on http://{args.host}:{args.port}: {cfg}")
+    uvicorn.run(create_sim_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
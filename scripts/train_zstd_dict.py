@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import orjson
+
+from app.db.traces_read import sample_responses
+from app.utils.cached_response import cacheable_body
+
+
+async def run(args: argparse.Namespace) -> tuple[int, int]:
+    import zstandard
+
+    since = datetime.now(timezone.utc) - timedelta(hours=args.hours)
+    rows = await sample_responses(since=since, limit=args.samples)
+    # the exact cache stores bodies without id/created: train on the same bytes
+    samples = [cacheable_body(orjson.loads(r)) for r in rows]
+    if len(samples) < 100:
+        raise SystemExit(f"only {len(samples)} captured responses since {since.isoformat()}; need at least 100")
+    d = zstandard.train_dictionary(args.size, samples)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(d.as_bytes())
+    return len(samples), d.dict_id()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Train a zstd dictionary for exact-cache bodies from recent traces.")
+    ap.add_argument("--hours", type=int, default=24, help="sample responses from this far back")
+    ap.add_argument("--samples", type=int, default=5000)
+    ap.add_argument("--size", type=int, default=16384, help="dictionary size in bytes")
+    ap.add_argument("--out", default="eval/exact_cache.zdict")
+    args = ap.parse_args()
+
+    n, dict_id = asyncio.run(run(args))
+    print(f"Trained dictionary {dict_id} from {n} responses: {args.out} (EXACT_CACHE_ZSTD_DICT={args.out})")
+
+
+if __name__ == "__main__":
+    main()